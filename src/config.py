@@ -23,6 +23,19 @@ REDIS_HOST = os.environ['REDIS_HOST'] if os.environ.get('REDIS_HOST') else "loca
 REDIS_PORT = os.environ['REDIS_PORT'] if os.environ.get(
     'REDIS_PORT') else 6379
 QUEUE_RETRY_DELAY = 5 # in seconds
+QUEUE_RETRY_MAX_DELAY = 300 # in seconds, backoff doubles QUEUE_RETRY_DELAY up to this value
+QUEUE_RETRY_MAX_ATTEMPTS = int(os.environ['QUEUE_RETRY_MAX_ATTEMPTS']) if os.environ.get(
+    'QUEUE_RETRY_MAX_ATTEMPTS') else 30
+QUEUE_CONNECT_RETRIES = 20
+QUEUE_CONNECT_RETRY_DELAY = 5 # in seconds
+QUEUE_PUBLISHER_POOL_SIZE = int(os.environ['QUEUE_PUBLISHER_POOL_SIZE']) if os.environ.get(
+    'QUEUE_PUBLISHER_POOL_SIZE') else 8
+# Default prefetch and concurrent dispatches per queue lane, overridden by the
+# "prefetch" and "concurrency" fields of configs/workers.json
+JOBS_PREFETCH = int(os.environ['JOBS_PREFETCH']) if os.environ.get(
+    'JOBS_PREFETCH') else 2
+JOBS_CONCURRENCY = int(os.environ['JOBS_CONCURRENCY']) if os.environ.get(
+    'JOBS_CONCURRENCY') else 1
 # Services ports
 
 IMAGE_GENERATION = os.environ['IMAGE_GENERATION'] if os.environ.get(
@@ -34,15 +47,105 @@ AUDIO_GENERATION = os.environ['AUDIO_GENERATION'] if os.environ.get(
 VIDEO_GENERATION = os.environ['VIDEO_GENERATION'] if os.environ.get(
     'VIDEO_GENERATION') else "localhost:55005"
 
+# Replicas of a service: its address may list several host:port separated by commas, and a host
+# resolving to several addresses counts one replica per address, resolved again every BALANCER_RESOLVE_INTERVAL seconds.
+# A replica failing BALANCER_MAX_FAILURES calls in a row is ejected for BALANCER_EJECTION_TIME seconds,
+# doubled at each new ejection up to BALANCER_MAX_EJECTION_TIME, then probed before being used again.
+BALANCER_RESOLVE_INTERVAL = 30
+BALANCER_MAX_FAILURES = int(os.environ['BALANCER_MAX_FAILURES']) if os.environ.get(
+    'BALANCER_MAX_FAILURES') else 3
+BALANCER_EJECTION_TIME = 10
+BALANCER_MAX_EJECTION_TIME = 300
+BALANCER_PROBE_TIMEOUT = 2
+
+# Deadlines in seconds of a job request to its service, and of the remote function calls (GPU infos...)
+SERVICE_DEADLINE = int(os.environ['SERVICE_DEADLINE']) if os.environ.get(
+    'SERVICE_DEADLINE') else 600
+SERVICE_FUNCTION_DEADLINE = 10
+
+# Threads of a service running the worker calls off its gRPC event loop, and default number of
+# calls of one worker running at the same time, overridden by the "service_concurrency" field of configs/workers.json
+SERVICE_EXECUTOR_THREADS = int(os.environ['SERVICE_EXECUTOR_THREADS']) if os.environ.get(
+    'SERVICE_EXECUTOR_THREADS') else 4
+SERVICE_WORKER_CONCURRENCY = int(os.environ['SERVICE_WORKER_CONCURRENCY']) if os.environ.get(
+    'SERVICE_WORKER_CONCURRENCY') else 1
+# Default maximum number of loaded instances of one worker, overridden by the "max_instances"
+# field of configs/workers.json: calls wait for a free instance rather than loading more
+SERVICE_WORKER_INSTANCES = int(os.environ['SERVICE_WORKER_INSTANCES']) if os.environ.get(
+    'SERVICE_WORKER_INSTANCES') else 1
+
+# Memory (GB) the workers of a service may keep loaded, on its GPUs or in RAM without GPU, 0 for
+# the total memory of the devices: least recently used idle workers are unloaded only to fit new ones
+SERVICE_MEMORY_BUDGET_GB = float(os.environ['SERVICE_MEMORY_BUDGET_GB']) if os.environ.get(
+    'SERVICE_MEMORY_BUDGET_GB') else 0
+
+# Workers a service loads at start and reloads after evictions when they fit, comma separated ids,
+# plus the SERVICE_WARM_TOP_N workers it served the most over the last SERVICE_WARM_WINDOW hours,
+# the warm set being refreshed every SERVICE_WARM_INTERVAL seconds
+SERVICE_WARM_WORKERS = [worker_id.strip() for worker_id in os.environ['SERVICE_WARM_WORKERS'].split(",") if worker_id.strip()] if os.environ.get(
+    'SERVICE_WARM_WORKERS') else []
+SERVICE_WARM_TOP_N = int(os.environ['SERVICE_WARM_TOP_N']) if os.environ.get(
+    'SERVICE_WARM_TOP_N') else 0
+SERVICE_WARM_WINDOW = 24
+SERVICE_WARM_INTERVAL = 300
+
+# gRPC transport of the services and their clients: max message size (bytes), channel compression
+# ("gzip", "deflate" or "none"), and the uploads of big attachments: requests whose attachments exceed
+# GRPC_UPLOAD_THRESHOLD bytes send them in GRPC_UPLOAD_CHUNK_SIZE chunks, spooled to disk by the
+# service beyond GRPC_UPLOAD_SPOOL_SIZE bytes
+GRPC_MAX_MESSAGE_SIZE = int(os.environ['GRPC_MAX_MESSAGE_SIZE']) if os.environ.get(
+    'GRPC_MAX_MESSAGE_SIZE') else 32 * 1024 * 1024
+GRPC_COMPRESSION = os.environ['GRPC_COMPRESSION'] if os.environ.get(
+    'GRPC_COMPRESSION') else "none"
+GRPC_UPLOAD_THRESHOLD = int(os.environ['GRPC_UPLOAD_THRESHOLD']) if os.environ.get(
+    'GRPC_UPLOAD_THRESHOLD') else 2 * 1024 * 1024
+GRPC_UPLOAD_CHUNK_SIZE = 1024 * 1024
+GRPC_UPLOAD_SPOOL_SIZE = 16 * 1024 * 1024
+
 # OLLAMA Url
 
 OLLAMA_URL = os.environ['OLLAMA_URL'] if os.environ.get(
     'OLLAMA_URL') else "http://localhost:11434"
 
-# Pooling delay in seconds for sync API requests
+# When True, x-smi-priority: HIGH jobs skip the queue and run inline in the API process,
+# otherwise they are queued with the highest AMQP priority
+PRIORITY_HIGH_BYPASS = os.environ.get('PRIORITY_HIGH_BYPASS', 'false').lower() in ('1', 'true', 'yes')
+
+# Admission control of the jobs process: max jobs in flight per service, how long a
+# GPU memory snapshot of a service is trusted (seconds) and the VRAM kept free (GB)
+ADMISSION_MAX_IN_FLIGHT = int(os.environ['ADMISSION_MAX_IN_FLIGHT']) if os.environ.get(
+    'ADMISSION_MAX_IN_FLIGHT') else 4
+ADMISSION_GPU_INFO_TTL = 5
+ADMISSION_MEMORY_MARGIN_GB = 0.5
+
+# Maximum time in seconds a sync API request waits for its job
 POLLING_TIMEOUT = 500
+# Seconds between two status checks of a waiting sync request, in case a completion notification is lost
+JOBS_RESULT_RECHECK = 30
 SERVICE_KEEP_ALIVE = 5 # in minutes
 
+# Expiry in seconds of the job keys in Redis, JOBS_TTL_<JOB TYPE> overrides it for one job type
+JOBS_TTL = int(os.environ['JOBS_TTL']) if os.environ.get(
+    'JOBS_TTL') else 3600
+JOBS_TTLS = {job_type: int(os.environ.get(f"JOBS_TTL_{job_type}", JOBS_TTL))
+             for job_type in ["IMAGE_GENERATION", "LLM_GENERATION", "AUDIO_GENERATION", "VIDEO_GENERATION"]}
+# Results bigger than this (bytes) are offloaded to the object storage, Redis only keeps a reference
+JOBS_RESULT_MAX_INLINE_SIZE = int(os.environ['JOBS_RESULT_MAX_INLINE_SIZE']) if os.environ.get(
+    'JOBS_RESULT_MAX_INLINE_SIZE') else 256 * 1024
+JOBS_RESULTS_BUCKET = "smi-jobs-results"
+
+# Attachments of a queued job bigger than this (bytes) wait for the job in the object storage, not in RabbitMQ
+JOBS_ATTACHMENT_MAX_INLINE_SIZE = int(os.environ['JOBS_ATTACHMENT_MAX_INLINE_SIZE']) if os.environ.get(
+    'JOBS_ATTACHMENT_MAX_INLINE_SIZE') else 1024 * 1024
+JOBS_ATTACHMENTS_BUCKET = "smi-jobs-attachments"
+
+# Result cache of deterministic requests: byte budget before LRU eviction, bucket of the
+# entries too big for Redis and days after which the bucket expires them anyway
+CACHE_MAX_BYTES = int(os.environ['CACHE_MAX_BYTES']) if os.environ.get(
+    'CACHE_MAX_BYTES') else 1024 * 1024 * 1024
+CACHE_BUCKET = "smi-results-cache"
+CACHE_OBJECT_DAYS = 30
+
 # Storage Location
 TEMP_PATH = os.environ['TEMP_PATH'] if os.environ.get(
     'TEMP_PATH') else f"{csd}/../temp"
@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rgeneric.proto\x12\x07generic\"\xf6\x01\n\x0eGenericRequest\x12\x14\n\x0cjson_payload\x18\x01 \x01(\x0c\x12\x14\n\x0cremote_class\x18\x02 \x01(\t\x12\x15\n\rremote_method\x18\x03 \x01(\t\x12\x1c\n\x14response_model_class\x18\x04 \x01(\t\x12\x1b\n\x13request_model_class\x18\x05 \x01(\t\x12\x17\n\x0fremote_function\x18\x06 \x01(\t\x12\x15\n\rremote_module\x18\x07 \x01(\t\x12\x11\n\tworker_id\x18\x08 \x01(\t\x12\x12\n\nkeep_alive\x18\t \x01(\x05\x12\x0f\n\x07storage\x18\n \x01(\t\"E\n\x0fGenericResponse\x12\x14\n\x0cjson_payload\x18\x01 \x01(\x0c\x12\x1c\n\x14response_model_class\x18\x02 \x01(\t2R\n\x0eGenericService\x12@\n\x0bProcessData\x12\x17.generic.GenericRequest\x1a\x18.generic.GenericResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rgeneric.proto\x12\x07generic\"\x9b\x02\n\x0eGenericRequest\x12\x14\n\x0cjson_payload\x18\x01 \x01(\x0c\x12\x14\n\x0cremote_class\x18\x02 \x01(\t\x12\x15\n\rremote_method\x18\x03 \x01(\t\x12\x1c\n\x14response_model_class\x18\x04 \x01(\t\x12\x1b\n\x13request_model_class\x18\x05 \x01(\t\x12\x17\n\x0fremote_function\x18\x06 \x01(\t\x12\x15\n\rremote_module\x18\x07 \x01(\t\x12\x11\n\tworker_id\x18\x08 \x01(\t\x12\x12\n\nkeep_alive\x18\t \x01(\x05\x12\x0f\n\x07storage\x18\n \x01(\t\x12\x0e\n\x06job_id\x18\x0b \x01(\t\x12\x13\n\x0b\x61ttachments\x18\x0c \x03(\x0c\"q\n\rGenericUpload\x12(\n\x07request\x18\x01 \x01(\x0b\x32\x17.generic.GenericRequest\x12\x13\n\x0b\x61ttachments\x18\x02 \x01(\x05\x12\x12\n\nattachment\x18\x03 \x01(\x05\x12\r\n\x05\x63hunk\x18\x04 \x01(\x0c\"d\n\x0fGenericResponse\x12\x14\n\x0cjson_payload\x18\x01 \x01(\x0c\x12\x1c\n\x14response_model_class\x18\x02 \x01(\t\x12\x0e\n\x06result\x18\x03 \x01(\x0c\x12\r\n\x05\x66inal\x18\x04 \x01(\x08\x32\xe7\x01\n\x0eGenericService\x12@\n\x0bProcessData\x12\x17.generic.GenericRequest\x1a\x18.generic.GenericResponse\x12H\n\x11ProcessDataStream\x12\x17.generic.GenericRequest\x1a\x18.generic.GenericResponse0\x01\x12I\n\x11ProcessDataUpload\x12\x16.generic.GenericUpload\x1a\x18.generic.GenericResponse(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -22,9 +22,11 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'generic_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_GENERICREQUEST']._serialized_start=27
-  _globals['_GENERICREQUEST']._serialized_end=273
-  _globals['_GENERICRESPONSE']._serialized_start=275
-  _globals['_GENERICRESPONSE']._serialized_end=344
-  _globals['_GENERICSERVICE']._serialized_start=346
-  _globals['_GENERICSERVICE']._serialized_end=428
+  _globals['_GENERICREQUEST']._serialized_end=310
+  _globals['_GENERICUPLOAD']._serialized_start=312
+  _globals['_GENERICUPLOAD']._serialized_end=425
+  _globals['_GENERICRESPONSE']._serialized_start=427
+  _globals['_GENERICRESPONSE']._serialized_end=527
+  _globals['_GENERICSERVICE']._serialized_start=530
+  _globals['_GENERICSERVICE']._serialized_end=761
 # @@protoc_insertion_point(module_scope)
@@ -45,6 +45,16 @@ class GenericServiceStub(object):
                 request_serializer=generic__pb2.GenericRequest.SerializeToString,
                 response_deserializer=generic__pb2.GenericResponse.FromString,
                 _registered_method=True)
+        self.ProcessDataStream = channel.unary_stream(
+                '/generic.GenericService/ProcessDataStream',
+                request_serializer=generic__pb2.GenericRequest.SerializeToString,
+                response_deserializer=generic__pb2.GenericResponse.FromString,
+                _registered_method=True)
+        self.ProcessDataUpload = channel.stream_stream(
+                '/generic.GenericService/ProcessDataUpload',
+                request_serializer=generic__pb2.GenericUpload.SerializeToString,
+                response_deserializer=generic__pb2.GenericResponse.FromString,
+                _registered_method=True)
 
 
 class GenericServiceServicer(object):
@@ -57,6 +67,20 @@ class GenericServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ProcessDataStream(self, request, context):
+        """Même requête, les résultats partiels du worker précèdent la réponse finale
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessDataUpload(self, request_iterator, context):
+        """Même requête, les pièces jointes volumineuses sont envoyées par morceaux avant son traitement
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_GenericServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -65,6 +89,16 @@ def add_GenericServiceServicer_to_server(servicer, server):
                     request_deserializer=generic__pb2.GenericRequest.FromString,
                     response_serializer=generic__pb2.GenericResponse.SerializeToString,
             ),
+            'ProcessDataStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcessDataStream,
+                    request_deserializer=generic__pb2.GenericRequest.FromString,
+                    response_serializer=generic__pb2.GenericResponse.SerializeToString,
+            ),
+            'ProcessDataUpload': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcessDataUpload,
+                    request_deserializer=generic__pb2.GenericUpload.FromString,
+                    response_serializer=generic__pb2.GenericResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'generic.GenericService', rpc_method_handlers)
@@ -102,3 +136,57 @@ class GenericService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ProcessDataStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/generic.GenericService/ProcessDataStream',
+            generic__pb2.GenericRequest.SerializeToString,
+            generic__pb2.GenericResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcessDataUpload(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/generic.GenericService/ProcessDataUpload',
+            generic__pb2.GenericUpload.SerializeToString,
+            generic__pb2.GenericResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
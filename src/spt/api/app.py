@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from spt.models.jobs import JobsTypes
-from spt.jobs import Jobs
+from spt.jobs import Jobs, JobsListener, close_redis
+from spt.cache import ResultCache
+from spt.queue import close_publisher_pool
 from rich.logging import RichHandler
 from rich.console import Console
 import logging
@@ -20,24 +22,38 @@ logger = logging.getLogger("API")
 
 jobs = None
 dispatcher = None
+jobs_listener = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global jobs
     global dispatcher
+    global jobs_listener
     if jobs is None:
         jobs_types = [JobsTypes.image_generation, JobsTypes.llm_generation,
                     JobsTypes.audio_generation, JobsTypes.video_generation]
         jobs = {job_type: Jobs(job_type) for job_type in jobs_types}
         app.state.jobs = jobs
+        # Open the shared publisher pool and declare the topology once
+        for job in jobs.values():
+            await job.start_publisher()
+    if jobs_listener is None:
+        jobs_listener = JobsListener()
+        await jobs_listener.start()
+        app.state.jobs_listener = jobs_listener
+    app.state.cache = ResultCache()
     if dispatcher is None:
         from spt.dispatcher import Dispatcher
         dispatcher = Dispatcher()
         app.state.dispatcher = dispatcher
     yield
     # Clean up the ML models and release the resources
-    for job in jobs:
-        job.stop()
+    for job in jobs.values():
+        await job.stop()
+    await close_publisher_pool()
+    await dispatcher.close()
+    await jobs_listener.stop()
+    await close_redis()
 
 app = FastAPI(
     lifespan=lifespan,
@@ -8,15 +8,16 @@ from spt.models.remotecalls import class_to_string
 from spt.jobs import Job, Jobs
 from spt.api.app import app
 
-async def text_to_embeddings(request_data: EmbeddingsRequest, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int):
+async def text_to_embeddings(request_data: EmbeddingsRequest, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int, idempotency_key: str = None, cache_key: str = None):
     job = await Jobs.create_job(payload=request_data.model_dump_json(), type=JobsTypes.llm_generation, 
                             worker_id=worker_id,
                     request_model_class=EmbeddingsRequest, 
                     response_model_class=EmbeddingsResponse,
                     storage=storage_key,
-                    keep_alive=keep_alive_key)
+                    keep_alive=keep_alive_key,
+                    idempotency_key=idempotency_key)
 
-    return await submit_job(job, async_key, priority_key)
+    return await submit_job(job, async_key, priority_key, cache_key=cache_key)
 
 async def text_to_embeddings_job(job_id: str, accept:Header, api_key:str):
     job = Job(id=job_id, type=JobsTypes.llm_generation,
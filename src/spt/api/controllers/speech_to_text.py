@@ -15,18 +15,19 @@ from spt.api.jobs import submit_job
 from spt.api.stream import stream
 from spt.api.workers import workers_configurations
 
-async def speech_to_text(request_data: SpeechToTextRequest, worker_id: str, storage_key: str, api_key:str, priority_key: str, keep_alive_key: str, async_key: str):
+async def speech_to_text(request_data: SpeechToTextRequest, worker_id: str, storage_key: str, api_key:str, priority_key: str, keep_alive_key: str, async_key: str, idempotency_key: str = None, cache_key: str = None):
     job = await Jobs.create_job(
-        payload=request_data.model_dump_json(),  # Assuming you serialize to JSON if needed
+        payload=request_data,  # the audio file travels as a raw attachment
         type=JobsTypes.audio_generation,
         worker_id=worker_id,
         request_model_class=SpeechToTextRequest,
         response_model_class=SpeechToTextResponse,
         storage=storage_key,
-        keep_alive=keep_alive_key
+        keep_alive=keep_alive_key,
+        idempotency_key=idempotency_key
     )
 
-    return await submit_job(job, async_key, priority_key)
+    return await submit_job(job, async_key, priority_key, cache_key=cache_key)
 
 async def speech_to_text_job(job_id: str, accept:Header, api_key:str):
     job = Job(id=job_id, type=JobsTypes.audio_generation,
@@ -76,5 +77,5 @@ async def speech_to_text_stream(websocket:WebSocket, worker_id: str, timeout:int
                                 storage=JobStorage.local,
                                 keep_alive=SERVICE_KEEP_ALIVE)
 
-    response: WorkerStreamManageResponse = await submit_job(job, 'False', JobPriority.high)
+    response: WorkerStreamManageResponse = await submit_job(job, None, JobPriority.high, inline=True)
     await stream(websocket, request=request, response=response)
\ No newline at end of file
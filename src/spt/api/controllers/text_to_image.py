@@ -10,14 +10,15 @@ import requests
 from spt.api.app import app
 from spt.api.jobs import submit_job
 
-async def text_to_image(request_data: TextToImageRequest, accept:Header, worker_id: str , api_key: str, async_key: str ,keep_alive_key: int, storage_key: str ,priority_key: str):
+async def text_to_image(request_data: TextToImageRequest, accept:Header, worker_id: str , api_key: str, async_key: str ,keep_alive_key: int, storage_key: str ,priority_key: str, idempotency_key: str = None, cache_key: str = None):
     job = await Jobs.create_job(payload=request_data.model_dump_json(), 
                         type=JobsTypes.image_generation, 
                         worker_id=worker_id,
                         storage=storage_key,
-                        keep_alive=keep_alive_key)
+                        keep_alive=keep_alive_key,
+                        idempotency_key=idempotency_key)
     
-    result = await submit_job(job, async_key, priority_key)
+    result = await submit_job(job, async_key, priority_key, cache_key=cache_key)
 
     if async_key:
         return result
@@ -25,7 +26,8 @@ async def text_to_image(request_data: TextToImageRequest, accept:Header, worker_
     if accept == "image/png" and isinstance(result, TextToImageResponse):
         image_data = None
         if storage_key == JobStorage.local:
-            image_data = base64.b64decode(result.artifacts[0].base64)
+            # raw PNG bytes, carried unencoded from the worker
+            image_data = result.artifacts[0].base64
         elif storage_key == JobStorage.s3:
             image_data = requests.get(result.artifacts[0].url).content
         return Response(content=image_data, media_type="image/png")
@@ -40,8 +42,8 @@ async def text_to_image_job(job_id: str, accept:Header, api_key:str):
         result = await app.state.jobs[JobsTypes.image_generation].get_job_result(job)
         if accept == "image/png":
             image_data = None
-            if result.artifacts[0].base64 is not None and result.artifacts[0].base64 != "":
-                image_data = base64.b64decode(result.artifacts[0].base64)
+            if result.artifacts[0].base64:
+                image_data = result.artifacts[0].base64
             else:
                 image_data = requests.get(result.artifacts[0].url).content
 
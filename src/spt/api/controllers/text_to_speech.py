@@ -11,7 +11,7 @@ import requests
 from spt.api.app import app
 from spt.api.jobs import submit_job
 
-async def text_to_speech(request_data: TextToSpeechRequest, accept:Header, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int):
+async def text_to_speech(request_data: TextToSpeechRequest, accept:Header, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int, idempotency_key: str = None, cache_key: str = None):
     job = await Jobs.create_job(
         payload=request_data.model_dump_json(),  # Assuming you serialize to JSON if needed
         type=JobsTypes.audio_generation,
@@ -19,17 +19,19 @@ async def text_to_speech(request_data: TextToSpeechRequest, accept:Header, worke
         request_model_class=TextToSpeechRequest,
         response_model_class=TextToSpeechResponse,
         storage=storage_key,
-        keep_alive=keep_alive_key
+        keep_alive=keep_alive_key,
+        idempotency_key=idempotency_key
     )
-    result: Union[JobResponse, TextToSpeechResponse] = await submit_job(job, async_key, priority_key)
+    result: Union[JobResponse, TextToSpeechResponse] = await submit_job(job, async_key, priority_key, cache_key=cache_key)
 
     if async_key:
         return result
 
     if accept == "audio/wav":
         data = None
-        if result.base64 is not None and result.base64 != "":
-            data = base64.b64decode(result.base64)
+        if result.base64:
+            # raw WAV bytes, carried unencoded from the worker
+            data = result.base64
         else:
             data = requests.get(result.url).content
         return Response(content=data, media_type="audio/wav")
@@ -38,10 +40,13 @@ async def text_to_speech(request_data: TextToSpeechRequest, accept:Header, worke
 
 async def text_to_speech_job(job_id: str, accept:Header, api_key:str):
     job = Job(id=job_id, type=JobsTypes.audio_generation,
-              response_model_class=class_to_string(ChatResponse))
+              response_model_class=class_to_string(TextToSpeechResponse))
     status = await app.state.jobs[JobsTypes.audio_generation].get_job_status(job)
 
     if status.status == JobStatuses.completed:
         result = await app.state.jobs[JobsTypes.audio_generation].get_job_result(job)
+        if accept == "audio/wav" and isinstance(result, TextToSpeechResponse):
+            data = result.base64 if result.base64 else requests.get(result.url).content
+            return Response(content=data, media_type="audio/wav")
         return result
     return JobResponse(id=job.id, status=status.status, type=status.type, message=status.message)
\ No newline at end of file
@@ -7,16 +7,18 @@ from spt.jobs import Job, Jobs
 from spt.api.app import  app
 from spt.api.jobs import submit_job
 
-async def text_to_text(request_data: ChatRequest, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int):
+async def text_to_text(request_data: ChatRequest, worker_id: str, api_key:str, storage_key: str, async_key: str, priority_key: str, keep_alive_key: int, idempotency_key: str = None, cache_key: str = None):
     job = await Jobs.create_job(payload=request_data.model_dump_json(), 
                         type=JobsTypes.llm_generation, 
                                 worker_id=worker_id,
                         request_model_class=ChatRequest,
                         response_model_class=ChatResponse,
                         storage=storage_key,
-                        keep_alive=keep_alive_key)
+                        keep_alive=keep_alive_key,
+                        idempotency_key=idempotency_key)
 
-    return await submit_job(job, async_key, priority_key)
+    # streamed chats answer with their tokens as JSON lines, see relay_job
+    return await submit_job(job, async_key, priority_key, cache_key=cache_key, stream=bool(request_data.stream))
 
 async def text_to_text_job(job_id: str, accept:Header, api_key:str):
     job = Job(id=job_id, type=JobsTypes.llm_generation,
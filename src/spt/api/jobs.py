@@ -4,25 +4,65 @@ from fastapi import FastAPI, HTTPException, Depends, Security, Request, Response
 from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
 from keys import API_KEY
-from spt.models.jobs import JobsTypes, JobStatuses, JobResponse, JobPriority
-from spt.jobs import Job
-from config import POLLING_TIMEOUT, SERVICE_KEEP_ALIVE
+from spt.models.jobs import JobsTypes, JobStatuses, JobResponse, JobPriority, JobCache
+from spt.models.envelope import pack_result, unpack_result
+from spt.cache import ResultCache
+from spt.jobs import Job, get_redis, JOBS_CHUNKS_PREFIX, JOBS_FINAL_STATUSES
+from fastapi.responses import StreamingResponse
+from config import POLLING_TIMEOUT, SERVICE_KEEP_ALIVE, PRIORITY_HIGH_BYPASS, JOBS_RESULT_RECHECK
 import asyncio
-from typing import Type, Any
+from typing import Type, Any, AsyncIterator
 from spt.utils import find_free_port, get_ip
 from spt.api.workers import validate_worker_exists
 from spt.api.app import app, logger
 
-async def submit_job(job: Job, async_key: str, priority_key: str) -> Type[BaseModel] | JobResponse:
+async def submit_job(job: Job, async_key: str, priority_key: str, inline: bool = False, cache_key: str = None, stream: bool = False) -> Type[BaseModel] | JobResponse | StreamingResponse:
     job_result = None
-    if priority_key == JobPriority.high:
+    job.priority = JobPriority(priority_key)
+    if cache_key != JobCache.bypass:
+        job.cache_id = ResultCache.key(job)
+    if job.cache_id is not None:
+        envelope = await app.state.cache.get(job.cache_id)
+        if envelope is not None:
+            logger.info(f"Job {job.id} served from the result cache")
+            if not async_key:
+                result = unpack_result(envelope)
+                if stream:
+                    # streaming clients read JSON lines, the cached result is the only one
+                    return StreamingResponse(iter([result.model_dump_json() + "\n"]), media_type="application/x-ndjson")
+                return result
+            # async clients fetch it like any completed job
+            await app.state.jobs[job.type].finish_job(job, JobStatuses.completed, envelope)
+            return JobResponse(id=job.id, status=JobStatuses.completed, type=job.type, message="")
+
+    if inline or (priority_key == JobPriority.high and PRIORITY_HIGH_BYPASS):
         job_result = await app.state.dispatcher.execute_job(job)
+        if job.cache_id is not None and not isinstance(job_result, JobResponse):
+            await app.state.cache.put(job.cache_id, pack_result(job_result))
+    elif stream and not async_key:
+        # subscribe before queuing the job so its first partial results are not missed
+        pubsub = get_redis().pubsub()
+        await pubsub.subscribe(f"{JOBS_CHUNKS_PREFIX}{job.id}")
+        job_id = job.id
+        try:
+            await app.state.jobs[job.type].add_job(job)
+            if job.id != job_id:
+                # attached to an identical in-flight job, follow it from now on
+                await pubsub.unsubscribe(f"{JOBS_CHUNKS_PREFIX}{job_id}")
+                await pubsub.subscribe(f"{JOBS_CHUNKS_PREFIX}{job.id}")
+        except BaseException:
+            # relay_job closes it otherwise
+            await pubsub.aclose()
+            raise
+        return StreamingResponse(relay_job(job, pubsub), media_type="application/x-ndjson")
     else:
         await app.state.jobs[job.type].add_job(job)
         job_result = await get_job_result(job, async_key)
 
     if isinstance(job_result, JobResponse) and job_result.status == JobStatuses.failed:
         raise HTTPException(status_code=503, detail=job_result.message)
+    if isinstance(job_result, JobResponse) and job_result.status == JobStatuses.cancelled:
+        raise HTTPException(status_code=409, detail=job_result.message)
     
     return job_result
 
@@ -31,14 +71,77 @@ async def get_job_result(job: Job, async_key: str) -> Type[BaseModel] | JobRespo
         logger.info(f"Waiting for async job {job.id} {job.status} {job.type} {job.message} to complete")
         return JobResponse(id=job.id, status=job.status, type=job.type, message=job.message)
 
-    for _ in range(POLLING_TIMEOUT):
-        await asyncio.sleep(1)  # Utilise une pause asynchrone
-        status = await app.state.jobs[JobsTypes.llm_generation].get_job_status(job)
-        if status.status == JobStatuses.completed:
-            result = await app.state.jobs[JobsTypes.llm_generation].get_job_result(job)
-            logger.info(
-                f"Job {job.id} completed with result: {result}")
-            return result
-        if status.status == JobStatuses.failed:
-            return JobResponse(id=job.id, status=status.status, type=status.type, message=status.message)
+    jobs = app.state.jobs[job.type]
+    listener = app.state.jobs_listener
+    deadline = asyncio.get_running_loop().time() + POLLING_TIMEOUT
+    while True:
+        # watch before reading the status so a completion in between is not missed
+        waiter = listener.watch(job.id)
+        try:
+            status = await jobs.get_job_status(job)
+            if status.status == JobStatuses.completed:
+                result = await jobs.get_job_result(job)
+                logger.info(
+                    f"Job {job.id} completed with result: {result}")
+                return result
+            if status.status in [JobStatuses.failed, JobStatuses.cancelled]:
+                return JobResponse(id=job.id, status=status.status, type=status.type, message=status.message)
+
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                # the periodic re-check only guards against a lost notification
+                await asyncio.wait_for(waiter, timeout=min(remaining, JOBS_RESULT_RECHECK))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            listener.unwatch(job.id, waiter)
     raise HTTPException(status_code=408, detail="Job timeout")
+
+
+async def follow_job(job: Job) -> StreamingResponse:
+    """
+    Streams the partial results of a job submitted earlier, from now on, then its final result.
+    """
+    pubsub = get_redis().pubsub()
+    await pubsub.subscribe(f"{JOBS_CHUNKS_PREFIX}{job.id}")
+    return StreamingResponse(relay_job(job, pubsub), media_type="application/x-ndjson")
+
+async def relay_job(job: Job, pubsub) -> AsyncIterator[str]:
+    """
+    Relays the partial results published by the dispatcher as JSON lines, the last line
+    being the final result, or the job status when it did not complete.
+
+    Args:
+        job (Job): the job to relay
+        pubsub: a Redis pub/sub already subscribed to the partial results of the job
+
+    Returns:
+        AsyncIterator[str]: the JSON lines
+    """
+    jobs = app.state.jobs[job.type]
+    deadline = asyncio.get_running_loop().time() + POLLING_TIMEOUT
+    try:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=JOBS_RESULT_RECHECK)
+            if message is None:
+                # the end message is lost when a job ends before being dispatched, check it
+                status = await jobs.get_job_status(job)
+                if status.status in JOBS_FINAL_STATUSES or status.status == JobStatuses.unknown:
+                    break
+                if asyncio.get_running_loop().time() > deadline:
+                    yield JobResponse(id=job.id, status=status.status, type=job.type, message="Job timeout").model_dump_json() + "\n"
+                    return
+                continue
+            if not message["data"]:
+                break
+            yield unpack_result(message["data"]).model_dump_json() + "\n"
+
+        try:
+            result = await get_job_result(job, None)
+        except HTTPException as e:
+            result = JobResponse(id=job.id, status=JobStatuses.failed, type=job.type, message=e.detail)
+        yield result.model_dump_json() + "\n"
+    finally:
+        await pubsub.aclose()
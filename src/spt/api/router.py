@@ -2,7 +2,7 @@
 from fastapi import FastAPI, HTTPException, Depends, Security, Request, Response, Header, UploadFile, Form, File, WebSocket, WebSocketDisconnect
 from fastapi.security.api_key import APIKeyHeader
 from keys import API_KEY
-from spt.models.jobs import JobsTypes, JobStatuses, JobResponse, JobPriority, JobStorage
+from spt.models.jobs import JobsTypes, JobStatuses, JobResponse, JobPriority, JobStorage, JobsMemoryReport, JobCache, CacheStats
 from spt.models.image import TextToImageRequest, TextToImageResponse 
 from spt.models.workers import WorkerConfigs
 from spt.models.llm import ChatRequest, ChatResponse, EmbeddingsRequest, EmbeddingsResponse
@@ -11,9 +11,11 @@ from spt.models.remotecalls import class_to_string, string_to_class, GPUsInfo, F
 import time
 from config import POLLING_TIMEOUT, SERVICE_KEEP_ALIVE
 from typing import Type, Any, Optional, Union
-from spt.api.app import app, logger, dispatcher
+from spt.api.app import app, logger
 import spt.api.controllers as controllers
 from spt.api.workers import validate_worker_exists, workers_configurations
+from spt.api.jobs import follow_job
+from spt.jobs import Job
 
 """
 This initializes a FastAPI instance with title, version, 
@@ -55,17 +57,38 @@ async def get_storage_key(storage_key: str = Security(storage_key_header)):
     return storage_key
 
 """
-    if x-smi-priority is "high", the underlying service is allowed to use high priority jobs.
-    it bypass the hidden queue and directly execute the job.
+    x-smi-priority ("low", "normal" or "high") is the AMQP priority of the job in its queue lane,
+    high priority jobs overtake queued low priority ones. With PRIORITY_HIGH_BYPASS enabled,
+    "high" jobs bypass the hidden queue and are directly executed.
 """
 priority_key_header = APIKeyHeader(name="x-smi-priority", auto_error=False)
 async def get_priority_key(priority_key: str = Security(priority_key_header)):
     if priority_key is None:
-        priority_key = JobPriority.low
+        priority_key = JobPriority.normal
     if priority_key not in [JobPriority.low, JobPriority.normal, JobPriority.high]:
         raise HTTPException(status_code=401, detail="Priority key invalid value")
     return priority_key
 
+"""
+    if Idempotency-Key is set, requests of the same worker sharing it while a job is in flight
+    attach to that job and get its result instead of running again.
+"""
+idempotency_key_header = APIKeyHeader(name="Idempotency-Key", auto_error=False)
+async def get_idempotency_key(idempotency_key: str = Security(idempotency_key_header)):
+    return idempotency_key
+
+"""
+    if x-smi-cache is "BYPASS", a deterministic request is computed again instead of being
+    served from the result cache, and its result is not cached.
+"""
+cache_key_header = APIKeyHeader(name="x-smi-cache", auto_error=False)
+async def get_cache_key(cache_key: str = Security(cache_key_header)):
+    if cache_key is None:
+        return JobCache.default
+    if cache_key.upper() not in [JobCache.default, JobCache.bypass]:
+        raise HTTPException(status_code=401, detail="Cache key invalid value")
+    return JobCache(cache_key.upper())
+
 """Logs requests to the logger.
 
 This middleware logs each request, the response time, 
@@ -88,7 +111,9 @@ async def text_to_image(request_data: TextToImageRequest,
                        async_key: str = Depends(get_async_key), 
                        keep_alive_key: int = Depends(get_keep_alive_key), 
                        storage_key: str = Depends(get_storage_key),
-                       priority_key: str = Depends(get_priority_key)):
+                       priority_key: str = Depends(get_priority_key),
+                       idempotency_key: str = Depends(get_idempotency_key),
+                       cache_key: str = Depends(get_cache_key)):
     return await controllers.text_to_image(request_data=request_data,
                                             worker_id=worker_id, 
                                             accept=accept, 
@@ -96,7 +121,9 @@ async def text_to_image(request_data: TextToImageRequest,
                                             async_key = async_key, 
                                             keep_alive_key = keep_alive_key,
                                             storage_key = storage_key, 
-                                            priority_key= priority_key)
+                                            priority_key=priority_key,
+                                            idempotency_key=idempotency_key,
+                                            cache_key=cache_key)
 
 @app.get("/v1/text-to-image/{job_id}", response_model=Union[JobResponse, TextToImageResponse], tags=["Text To Image Generation"])
 async def text_to_image(job_id: str, request_data: TextToImageRequest, 
@@ -111,7 +138,33 @@ async def list_worker_configurations(api_key: str = Depends(get_api_key)):
 @app.get("/v1/gpu/info", response_model=Union[GPUsInfo|FunctionCallError])
 async def gpu_infos(api_key: str = Depends(get_api_key)):
     logger.info(f"Get GPUs Infos")
-    return await dispatcher.call_remote_function(JobsTypes.llm_generation, "spt.services.gpu","gpu_infos", {}, GPUsInfo)
+    return await app.state.dispatcher.call_remote_function(JobsTypes.llm_generation, "spt.utils","gpu_infos", {}, GPUsInfo)
+
+@app.get("/v1/jobs/memory", response_model=JobsMemoryReport)
+async def jobs_memory_report(api_key: str = Depends(get_api_key)):
+    logger.info(f"Get jobs memory report")
+    return await app.state.jobs[JobsTypes.llm_generation].memory_report()
+
+@app.delete("/v1/jobs/{job_id}", response_model=JobResponse, tags=["Jobs"])
+async def cancel_job(job_id: str, api_key: str = Depends(get_api_key)):
+    logger.info(f"Cancel job {job_id}")
+    response = await app.state.jobs[JobsTypes.llm_generation].cancel_job(job_id)
+    if response.status == JobStatuses.unknown:
+        raise HTTPException(status_code=404, detail=response.message)
+    return response
+
+@app.get("/v1/jobs/{job_id}/stream", tags=["Jobs"])
+async def stream_job(job_id: str, api_key: str = Depends(get_api_key)):
+    logger.info(f"Stream job {job_id}")
+    status = await app.state.jobs[JobsTypes.llm_generation].get_job_status(Job(id=job_id))
+    if status.status == JobStatuses.unknown:
+        raise HTTPException(status_code=404, detail=status.message)
+    return await follow_job(Job(id=job_id, type=JobsTypes(status.type)))
+
+@app.get("/v1/cache/stats", response_model=CacheStats)
+async def cache_stats(api_key: str = Depends(get_api_key)):
+    logger.info(f"Get result cache stats")
+    return await app.state.cache.stats()
 
 # New endpoints calling the OLLAMA API
 
@@ -121,14 +174,18 @@ async def text_to_text(request_data: ChatRequest,
                         api_key: str = Depends(get_api_key), 
                         async_key: str = Depends(get_async_key), 
                         keep_alive_key: int = Depends(get_keep_alive_key), 
-                        storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key)):
+                        storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key),
+                       idempotency_key: str = Depends(get_idempotency_key),
+                       cache_key: str = Depends(get_cache_key)):
     return await controllers.text_to_text(request_data=request_data, 
                                           worker_id=worker_id, 
                                           api_key=api_key, 
                                           async_key=async_key, 
                                           keep_alive_key=keep_alive_key, 
                                           storage_key=storage_key, 
-                                          priority_key=priority_key)
+                                          priority_key=priority_key,
+                                          idempotency_key=idempotency_key,
+                                          cache_key=cache_key)
 
 @app.get("/v1/text-to-text/{job_id}", response_model=Union[JobResponse, ChatResponse], tags=["Text To Text Generation"])
 async def text_to_text(job_id: str, accept=Header(None), api_key: str = Depends(get_api_key)):
@@ -140,14 +197,18 @@ async def image_to_text(request_data: ChatRequest,
                        api_key: str = Depends(get_api_key),
                        async_key: str = Depends(get_async_key),
                        keep_alive_key: int = Depends(get_keep_alive_key),
-                       storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key)):
+                       storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key),
+                       idempotency_key: str = Depends(get_idempotency_key),
+                       cache_key: str = Depends(get_cache_key)):
     return await controllers.image_to_text(request_data=request_data, 
                                           worker_id=worker_id, 
                                           api_key=api_key, 
                                           async_key=async_key, 
                                           keep_alive_key=keep_alive_key, 
                                           storage_key=storage_key, 
-                                          priority_key=priority_key)
+                                          priority_key=priority_key,
+                                          idempotency_key=idempotency_key,
+                                          cache_key=cache_key)
 
 @app.get("/v1/image-to-text/{job_id}", response_model=Union[JobResponse, ChatResponse], tags=["Image To Text Generation"])
 async def image_to_text(job_id: str, accept=Header(None), api_key: str = Depends(get_api_key)):
@@ -159,14 +220,18 @@ async def text_to_embeddings(request_data: EmbeddingsRequest,
                               api_key: str = Depends(get_api_key), 
                               async_key: str = Depends(get_async_key), 
                               keep_alive_key: int = Depends(get_keep_alive_key), 
-                              storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key)):
+                              storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key),
+                       idempotency_key: str = Depends(get_idempotency_key),
+                       cache_key: str = Depends(get_cache_key)):
     return await controllers.text_to_embeddings(request_data=request_data, 
                                           worker_id=worker_id, 
                                           api_key=api_key, 
                                           async_key=async_key, 
                                           keep_alive_key=keep_alive_key, 
                                           storage_key=storage_key, 
-                                          priority_key=priority_key)
+                                          priority_key=priority_key,
+                                          idempotency_key=idempotency_key,
+                                          cache_key=cache_key)
 
 @app.get("/v1/text-to-embeddings/{job_id}", response_model=Union[JobResponse, EmbeddingsResponse], tags=["Text ToEmbeddings Generation"])
 async def image_to_text(job_id: str, accept=Header(None), api_key: str = Depends(get_api_key)):
@@ -189,13 +254,15 @@ async def speech_to_text(
     async_key: str = Depends(get_async_key),
     keep_alive_key: int = Depends(get_keep_alive_key),
     storage_key: str = Depends(get_storage_key),
-    priority_key: str = Depends(get_priority_key)
+    priority_key: str = Depends(get_priority_key),
+    idempotency_key: str = Depends(get_idempotency_key),
+    cache_key: str = Depends(get_cache_key)
 ):
     logger.info(f"Speech to text generation: {worker_id}")
-    file_content = await file.read()
+    # the spooled upload itself, the recording is streamed to the service rather than read in memory
     request_data = SpeechToTextRequest(
         worker_id=worker_id,
-        file=file_content,
+        file=file.file,
         language=language,
         temperature=temperature,
         prompt=prompt
@@ -206,7 +273,9 @@ async def speech_to_text(
                                           async_key=async_key, 
                                           keep_alive_key=keep_alive_key, 
                                           storage_key=storage_key, 
-                                          priority_key=priority_key)
+                                          priority_key=priority_key,
+                                          idempotency_key=idempotency_key,
+                                          cache_key=cache_key)
 
 @app.post("/v1/text-to-speech", response_model=Union[JobResponse, TextToSpeechResponse], tags=["Text To Speech Generation"])
 async def text_to_speech(request_data: TextToSpeechRequest, accept=Header(None),
@@ -214,7 +283,9 @@ async def text_to_speech(request_data: TextToSpeechRequest, accept=Header(None),
                               api_key: str = Depends(get_api_key), 
                               async_key: str = Depends(get_async_key), 
                               keep_alive_key: int = Depends(get_keep_alive_key), 
-                              storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key)):
+                              storage_key: str = Depends(get_storage_key), priority_key: str = Depends(get_priority_key),
+                       idempotency_key: str = Depends(get_idempotency_key),
+                       cache_key: str = Depends(get_cache_key)):
 
     return await controllers.text_to_speech(request_data=request_data, 
                                           worker_id=worker_id, 
@@ -223,4 +294,6 @@ async def text_to_speech(request_data: TextToSpeechRequest, accept=Header(None),
                                           async_key=async_key, 
                                           keep_alive_key=keep_alive_key, 
                                           storage_key=storage_key, 
-                                          priority_key=priority_key)
+                                          priority_key=priority_key,
+                                          idempotency_key=idempotency_key,
+                                          cache_key=cache_key)
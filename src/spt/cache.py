@@ -0,0 +1,174 @@
+from config import CACHE_MAX_BYTES, CACHE_BUCKET, CACHE_OBJECT_DAYS, JOBS_RESULT_MAX_INLINE_SIZE
+from spt.jobs import Job, get_redis, attachments_digest
+from spt.models.jobs import JobStorage, CacheStats
+from spt.models.workers import WorkerConfig, WorkerConfigs, WorkerType
+from rich.logging import RichHandler
+from rich.console import Console
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import msgpack
+
+console = Console()
+
+logging.basicConfig(
+    level="INFO",
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(
+        console=console, rich_tracebacks=True, show_time=False)]
+)
+
+logger = logging.getLogger("Cache")
+
+CACHE_PREFIX = "smi-cache:"
+# entries by last access time, for the LRU eviction
+CACHE_LRU = f"{CACHE_PREFIX}lru"
+CACHE_SIZES = f"{CACHE_PREFIX}sizes"
+CACHE_BYTES = f"{CACHE_PREFIX}bytes"
+CACHE_STATS = f"{CACHE_PREFIX}stats"
+
+_storage = None
+
+def get_cache_storage():
+    """
+    Returns the object storage keeping the cached results too big for Redis.
+    """
+    global _storage
+    if _storage is None:
+        from spt.storage import Storage
+        storage = Storage()
+        storage.create_expiring_bucket(CACHE_BUCKET, days=CACHE_OBJECT_DAYS)
+        _storage = storage
+    return _storage
+
+def is_deterministic(config: WorkerConfig, payload: dict) -> bool:
+    """
+    Whether the same request always gives the same result: a seed of 0 asks for a random
+    one, and chat completions are only reproducible at temperature 0 or with a seed.
+    """
+    if "seed" in payload and not payload["seed"]:
+        return False
+    if config.type == WorkerType.llm:
+        options = payload.get("options") or {}
+        return options.get("temperature") == 0 or bool(options.get("seed"))
+    return True
+
+class ResultCache:
+    """
+    Content-addressed cache of the result envelopes of deterministic requests.
+
+    Entries are indexed in Redis and evicted least recently used first once their
+    total size exceeds CACHE_MAX_BYTES. Envelopes bigger than JOBS_RESULT_MAX_INLINE_SIZE
+    are kept in the object storage, Redis only keeps their reference.
+    """
+    _workers_configuration = WorkerConfigs.get_configs()
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def key(cls, job: Job) -> Optional[str]:
+        """
+        Cache key of a job, None when its result must not be cached: worker not configured
+        as cacheable, non deterministic request, or result stored as an expiring S3 url.
+        """
+        config = cls._workers_configuration.workers_configs.get(job.worker_id)
+        if config is None or not config.cacheable or job.storage == JobStorage.s3:
+            return None
+        payload = json.loads(job.payload)
+        if not is_deterministic(config, payload):
+            return None
+        request = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        identity = f"{job.worker_id}|{config.model}|{job.remote_class}|{job.remote_method}|{request}"
+        if job.attachments:
+            identity += f"|{attachments_digest(job)}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached result envelope of a key and marks it as recently used.
+        """
+        redis = get_redis()
+        entry = await redis.get(f"{CACHE_PREFIX}entry:{key}")
+        if entry is not None:
+            entry = msgpack.unpackb(entry, raw=False)
+            if "artifact" in entry:
+                storage = await asyncio.to_thread(get_cache_storage)
+                entry = await asyncio.to_thread(storage.download_bytes, CACHE_BUCKET, entry["artifact"])
+                if entry is None:
+                    # expired from the object storage, forget it
+                    await self._remove(key)
+            else:
+                entry = entry["envelope"]
+        async with redis.pipeline(transaction=False) as pipe:
+            if entry is not None:
+                pipe.zadd(CACHE_LRU, {key: time.time()}, xx=True)
+            pipe.hincrby(CACHE_STATS, "hits" if entry is not None else "misses", 1)
+            await pipe.execute()
+        return entry
+
+    async def put(self, key: str, envelope: bytes):
+        """
+        Caches a result envelope, evicting least recently used entries beyond the byte budget.
+        """
+        if len(envelope) > self.max_bytes:
+            return
+        redis = get_redis()
+        if len(envelope) > JOBS_RESULT_MAX_INLINE_SIZE:
+            storage = await asyncio.to_thread(get_cache_storage)
+            etag = await asyncio.to_thread(storage.upload_from_bytes, CACHE_BUCKET, key, envelope, False)
+            if etag is None:
+                logger.error(f"Failed to cache result {key} ({len(envelope)} bytes)")
+                return
+            entry = msgpack.packb({"artifact": key})
+        else:
+            entry = msgpack.packb({"envelope": envelope}, use_bin_type=True)
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hget(CACHE_SIZES, key)
+            pipe.set(f"{CACHE_PREFIX}entry:{key}", entry)
+            pipe.hset(CACHE_SIZES, key, len(envelope))
+            pipe.zadd(CACHE_LRU, {key: time.time()})
+            pipe.hincrby(CACHE_STATS, "stores", 1)
+            previous, *_ = await pipe.execute()
+        total = await redis.incrby(CACHE_BYTES, len(envelope) - int(previous or 0))
+        logger.info(f"Cached result {key} ({len(envelope)} bytes, {total} bytes cached)")
+
+        while total > self.max_bytes:
+            evicted = await redis.zpopmin(CACHE_LRU)
+            if not evicted:
+                break
+            evicted_key = evicted[0][0].decode("utf-8")
+            total = await self._remove(evicted_key, zset=False)
+            await redis.hincrby(CACHE_STATS, "evictions", 1)
+            logger.info(f"Evicted cached result {evicted_key}")
+
+    async def _remove(self, key: str, zset: bool = True) -> int:
+        redis = get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.get(f"{CACHE_PREFIX}entry:{key}")
+            pipe.hget(CACHE_SIZES, key)
+            pipe.delete(f"{CACHE_PREFIX}entry:{key}")
+            pipe.hdel(CACHE_SIZES, key)
+            if zset:
+                pipe.zrem(CACHE_LRU, key)
+            entry, size, *_ = await pipe.execute()
+        total = await redis.decrby(CACHE_BYTES, int(size or 0))
+        if entry is not None and "artifact" in msgpack.unpackb(entry, raw=False):
+            storage = await asyncio.to_thread(get_cache_storage)
+            await asyncio.to_thread(storage.remove_object, CACHE_BUCKET, key)
+        return total
+
+    async def stats(self) -> CacheStats:
+        redis = get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(CACHE_STATS)
+            pipe.zcard(CACHE_LRU)
+            pipe.get(CACHE_BYTES)
+            counters, entries, size = await pipe.execute()
+        counters = {name.decode("utf-8"): int(value) for name, value in counters.items()}
+        return CacheStats(entries=entries, bytes=int(size or 0), max_bytes=self.max_bytes, **counters)
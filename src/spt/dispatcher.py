@@ -1,15 +1,23 @@
 from spt.jobs import Job
-from spt.services.client import GenericClient
+from spt.services.balancer import ServiceBalancer
 from spt.models.jobs import JobStatuses, JobsTypes, JobResponse
-from spt.models.remotecalls import MethodCallError, class_to_string, string_to_class, FunctionCallError
+from spt.models.remotecalls import MethodCallError, class_to_string, string_to_class, FunctionCallError, GPUsInfo, ResidencyInfo
+from spt.models.envelope import unpack_result
+from spt.cache import ResultCache
+from spt.models.workers import WorkerConfigs
 import logging
-from config import IMAGE_GENERATION, VIDEO_GENERATION, LLM_GENERATION, AUDIO_GENERATION
+from config import IMAGE_GENERATION, VIDEO_GENERATION, LLM_GENERATION, AUDIO_GENERATION, SERVICE_KEEP_ALIVE, ADMISSION_MAX_IN_FLIGHT, ADMISSION_GPU_INFO_TTL, ADMISSION_MEMORY_MARGIN_GB
 from spt.jobs import Jobs
 from google.protobuf.json_format import MessageToJson
 import traceback
+import grpc
+import grpc.aio
+import asyncio
+import threading
+import time
 import json
 from pydantic import BaseModel, ValidationError
-from typing import Type, Any, Union
+from typing import Type, Any, Union, Dict, Optional, Tuple, Set
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,8 +25,19 @@ logger = logging.getLogger(__name__)
 class Dispatcher:
     def __init__(self) -> None:
         self.jobs = Jobs()
+        self.cache = ResultCache()
         logger.info("Initializing dispatcher")
-        self.clients: dict[JobsTypes, GenericClient] = {}
+        self.clients: dict[JobsTypes, ServiceBalancer] = {}
+        self.workers_configs = WorkerConfigs.get_configs().workers_configs
+        # Admission bookkeeping, shared by the receivers threads of the jobs process
+        self.admission_lock = threading.Lock()
+        self.in_flight: Dict[JobsTypes, float] = {}
+        # type, worker, footprint, weight and admission time of the jobs admitted, by job id
+        self.reservations: Dict[str, Tuple[JobsTypes, str, float, float, float]] = {}
+        self.service_memory: Dict[JobsTypes, Tuple[Optional[ResidencyInfo], float]] = {}
+        # gRPC calls of the jobs being dispatched with the loop running them, by job id, so a cancellation can abort them
+        self.running: Dict[str, Tuple[asyncio.AbstractEventLoop, grpc.aio.Call]] = {}
+        self.cancelled: Set[str] = set()
         configs = {
             JobsTypes.image_generation: IMAGE_GENERATION,
             JobsTypes.llm_generation: LLM_GENERATION,
@@ -29,14 +48,14 @@ class Dispatcher:
         for job_type in [JobsTypes.image_generation, JobsTypes.llm_generation, JobsTypes.audio_generation, JobsTypes.video_generation]:
             logger.info(f"Initializing client for job type {job_type}")
             try:
-                self.clients[job_type] = GenericClient(configs[job_type])
+                self.clients[job_type] = ServiceBalancer(configs[job_type])
             except Exception as e:
                 logger.error(f"Failed to initialize client for job type {job_type}: {e} stack trace: {traceback.format_exc()}")
 
     async def call_remote_function(self, jobs_type: JobsTypes, remote_module: str, remote_function: str, payload: dict, response_model_class:Type[BaseModel]) -> Union[BaseModel|FunctionCallError]:
         logger.info(f"Calling remote function {remote_function} with payload: {payload}")
         try:
-            response = self.clients[jobs_type].call_remote_function(
+            response = await self.clients[jobs_type].call_remote_function(
                 remote_module, remote_function, payload, class_to_string(response_model_class))
             logger.info(f"Response: {response}")
             return response
@@ -45,8 +64,117 @@ class Dispatcher:
                 f"Failed to run remote function {remote_function}: {e} stack trace: {traceback.format_exc()}")
             return FunctionCallError(message=str(e), error=remote_function)
 
-    async def allow_run_job(self, job: Job):
-        logger.info(f"Allowing job {job.id} {job.type}")
+    async def get_service_memory(self, jobs_type: JobsTypes) -> Optional[ResidencyInfo]:
+        """
+        Memory of the service for its workers, cached for ADMISSION_GPU_INFO_TTL seconds.
+        Returns None when the service cannot report it.
+        """
+        infos, taken_at = self.service_memory.get(jobs_type, (None, 0.0))
+        if time.time() - taken_at < ADMISSION_GPU_INFO_TTL:
+            return infos
+
+        # jobs admitted from now on may not be loaded yet when the memory is read
+        taken_at = time.time()
+        response = await self.call_remote_function(jobs_type, "spt.services.residency", "residency_infos", {}, ResidencyInfo)
+        infos = ResidencyInfo.model_validate(response) if isinstance(response, dict) else None
+        with self.admission_lock:
+            self.service_memory[jobs_type] = (infos, taken_at)
+        return infos
+
+    def reserved_gb(self, jobs_type: JobsTypes) -> float:
+        """
+        Memory reserved by the jobs admitted since the last snapshot of the service memory, which does not account for them yet.
+        """
+        _, taken_at = self.service_memory.get(jobs_type, (None, 0.0))
+        return sum(footprint for reserved_type, _, footprint, _, admitted_at in self.reservations.values()
+                   if reserved_type == jobs_type and admitted_at >= taken_at)
+
+    async def allow_run_job(self, job: Job) -> bool:
+        """
+        Admits a job only when its service has capacity for it: a bounded number of
+        in-flight jobs per service and, for workers declaring a memory_footprint_gb,
+        enough memory once the jobs admitted since the last snapshot of the service memory
+        are accounted for. The memory held by idle workers counts as available, the service
+        unloads them to make room. A worker resident in the service needs no extra memory
+        unless it is busy. Refused jobs stay queued through the delayed retry path.
+        """
+        config = self.workers_configs.get(job.worker_id)
+        footprint = config.memory_footprint_gb if config is not None and config.memory_footprint_gb else 0.0
+        # jobs of a batching worker are coalesced by the service, a full batch costs one slot
+        weight = 1.0 / config.batch_size if config is not None and config.batch_size else 1.0
+
+        # every replica of the service takes its share of jobs
+        max_in_flight = ADMISSION_MAX_IN_FLIGHT * (self.clients[job.type].replicas if job.type in self.clients else 1)
+        with self.admission_lock:
+            if job.id in self.reservations:
+                # a redelivered message, its job keeps the reservation it holds
+                return True
+            if not self._has_slot(job, weight, max_in_flight):
+                return False
+
+        infos = await self.get_service_memory(job.type) if footprint else None
+
+        # the receivers threads admit jobs meanwhile, checked again with the reservation committed
+        with self.admission_lock:
+            if job.id in self.reservations:
+                return True
+            if not self._has_slot(job, weight, max_in_flight):
+                return False
+            busy = any(reserved_type == job.type and reserved_worker == job.worker_id
+                       for reserved_type, reserved_worker, _, _, _ in self.reservations.values())
+            if infos is not None and not busy and job.worker_id in infos.resident:
+                footprint = 0.0
+            elif infos is not None and infos.available_gb is not None:
+                available = infos.available_gb - self.reserved_gb(job.type) - ADMISSION_MEMORY_MARGIN_GB
+                if available < footprint:
+                    logger.info(f"Job {job.id} refused: {job.worker_id} needs {footprint}GB, {available:.2f}GB available on {job.type}")
+                    return False
+            self.in_flight[job.type] = self.in_flight.get(job.type, 0) + weight
+            self.reservations[job.id] = (job.type, job.worker_id, footprint, weight, time.time())
+        logger.info(f"Allowing job {job.id} {job.type} ({footprint}GB reserved)")
+        return True
+
+    def _has_slot(self, job: Job, weight: float, max_in_flight: float) -> bool:
+        # called with the admission lock held
+        in_flight = self.in_flight.get(job.type, 0)
+        if in_flight + weight > max_in_flight:
+            logger.info(f"Job {job.id} refused: {in_flight} jobs already in flight on {job.type}")
+            return False
+        return True
+
+    def release_job(self, job: Job):
+        """
+        Releases the capacity reserved by allow_run_job once the job is over.
+        """
+        with self.admission_lock:
+            reservation = self.reservations.pop(job.id, None)
+            if reservation is not None:
+                jobs_type, _, _, weight, _ = reservation
+                self.in_flight[jobs_type] = max(0, self.in_flight.get(jobs_type, 0) - weight)
+
+    async def close(self):
+        """
+        Closes the gRPC channels opened on the running event loop.
+        """
+        for client in self.clients.values():
+            await client.close()
+
+    def cancel_job(self, job_id: str) -> bool:
+        """
+        Cancels the gRPC call of a job dispatched by this process, the service stops
+        the worker at its next cancellation check.
+
+        Returns:
+            bool: whether a running call of the job was cancelled
+        """
+        running = self.running.get(job_id)
+        if running is None:
+            return False
+        loop, call = running
+        logger.info(f"Cancelling running job {job_id}")
+        self.cancelled.add(job_id)
+        # the call belongs to the loop of the receiver thread dispatching it
+        loop.call_soon_threadsafe(call.cancel)
         return True
 
     async def execute_job(self, job: Job) -> Union[BaseModel | JobResponse]:
@@ -54,19 +182,16 @@ class Dispatcher:
         try:
             job.payload = json.loads(job.payload)
 
-            response = self.clients[job.type].process_data(job)
-            
-            payload = response.json_payload.decode('utf-8')
+            response = await self.clients[job.type].process_data(job)
 
             if response.response_model_class == class_to_string(MethodCallError):
+                payload = response.json_payload.decode('utf-8')
                 logger.error(f"Job {job.id} failed: {payload}")
                 error = MethodCallError(**json.loads(payload))
-                if error.status == JobStatuses.failed:
-                    return JobResponse(id=job.id, status=JobStatuses.failed, type=job.type, message=error.message)
+                if error.status in [JobStatuses.failed, JobStatuses.cancelled]:
+                    return JobResponse(id=job.id, status=error.status, type=job.type, message=error.message)
             else:
-                response_model_class = string_to_class(job.response_model_class)
-                result = response_model_class.model_validate_json(payload)
-                return result
+                return unpack_result(response.result)
         except Exception as e:
             logger.error(f"Failed to execute job {job.id}: {e} stack trace: {traceback.format_exc()}")
             return JobResponse(id=job.id, status=JobStatuses.failed, type=job.type, message=f"Failed to execute job {job.id}: {e} stack trace: {traceback.format_exc()}")
@@ -75,30 +200,59 @@ class Dispatcher:
         logger.info(f"[**] Dispatching job {job.id} {job.type} with payload: {job.payload} keep alive {job.keep_alive} storage {job.storage}")
         try:
             await self.jobs.set_job_status(job, JobStatuses.in_progress)
-            response = self.clients[job.type].process_data(job)
-           
-            payload = response.json_payload.decode('utf-8')
+            await self.jobs.load_attachments(job)
+            call = await self.clients[job.type].process_data_stream(job)
+            self.running[job.id] = (asyncio.get_running_loop(), call)
+            response = None
+            try:
+                async for response in call:
+                    if response.final:
+                        break
+                    await self.jobs.publish_chunk(job, response.result)
+            finally:
+                self.running.pop(job.id, None)
+            if response is None or not response.final:
+                raise RuntimeError("Service stream ended without a final response")
 
             if response.response_model_class == class_to_string(MethodCallError):
+                payload = response.json_payload.decode('utf-8')
                 logger.error(f"Job {job.id} failed: {payload}")
                 error = MethodCallError(**json.loads(payload))
+                # a cancelled job already has its final status
                 if error.status == JobStatuses.failed:
-                    await self.jobs.set_job_result(job, {
-                        "payload": {},
-                    })
-                    await self.jobs.set_job_status(job, JobStatuses.failed, message=error.message)
+                    await self.jobs.finish_job(job, JobStatuses.failed, None, message=error.message)
             else:
-                await self.jobs.set_job_result(job, {
-                    "payload": payload,
-                })
-                await self.jobs.set_job_status(job, JobStatuses.completed)
+                # the result envelope is stored as is, the API unpacks it once
+                await self.jobs.finish_job(job, JobStatuses.completed, response.result)
+                if job.cache_id:
+                    try:
+                        await self.cache.put(job.cache_id, response.result)
+                    except Exception as e:
+                        logger.error(f"Failed to cache result of job {job.id}: {e}")
+                logger.info(f"Job {job.id} completed ({len(response.result)} bytes)")
 
-            logger.info(f"Job {job.id} completed {payload}")
-   
+        except asyncio.CancelledError:
+            # a cancelled grpc.aio call raises CancelledError, only swallow the ones cancel_job caused
+            if job.id not in self.cancelled:
+                raise
+            logger.info(f"Job {job.id} cancelled")
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.CANCELLED:
+                logger.info(f"Job {job.id} cancelled")
+            else:
+                logger.error(f"Failed to dispatch job {job.id}: {e}")
+                await self.jobs.finish_job(job, JobStatuses.failed, None, message=f"Failed to dispatch job: {e.details()}")
         except Exception as e:
             logger.error(f"Failed to dispatch job {job.id}: {e} stack trace: {traceback.format_exc()}")
-            await self.jobs.set_job_result(job, {
-                "payload": {},
-            })
-            await self.jobs.set_job_status(job, JobStatuses.failed, message=f"Failed to dispatch job: {str(e)}: {traceback.format_exc()}")
-  
\ No newline at end of file
+            await self.jobs.finish_job(job, JobStatuses.failed, None, message=f"Failed to dispatch job: {str(e)}: {traceback.format_exc()}")
+        finally:
+            self.cancelled.discard(job.id)
+            self.release_job(job)
+            try:
+                await self.jobs.publish_chunk(job, b"")
+            except Exception as e:
+                logger.error(f"Failed to end the partial results of job {job.id}: {e}")
+            try:
+                await self.jobs.release_attachments(job)
+            except Exception as e:
+                logger.error(f"Failed to release the attachments of job {job.id}: {e}")
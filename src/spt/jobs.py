@@ -1,12 +1,18 @@
 #import aioredis
-from config import REDIS_HOST, SERVICE_KEEP_ALIVE
+from config import REDIS_HOST, REDIS_PORT, SERVICE_KEEP_ALIVE, QUEUE_RETRY_MAX_ATTEMPTS, JOBS_PREFETCH, JOBS_CONCURRENCY, JOBS_TTL, JOBS_TTLS, JOBS_RESULT_MAX_INLINE_SIZE, JOBS_RESULTS_BUCKET, JOBS_ATTACHMENT_MAX_INLINE_SIZE, JOBS_ATTACHMENTS_BUCKET
 import redis
+import redis.asyncio
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 import uuid
+import hashlib
 import json 
-from spt.queue import QueueMessageSender, Headers, Priority, QueueMessageReceiver, sync
-from typing import List, Optional, Union
-from spt.models.jobs import JobStatuses, JobsTypes, JobResponse
+from spt.queue import Headers, Priority, AsyncQueueMessageReceiver, QueuePublisherPool, QueueLane, get_publisher_pool, declare_retry_topology, retry_delay, retry_exchange_name
+from aio_pika.abc import AbstractIncomingMessage
+from typing import BinaryIO, List, Optional, Union, Dict
+from spt.models.jobs import JobStatuses, JobsTypes, JobResponse, JobPriority, JobsKeysUsage, JobsMemoryReport
 from spt.models.remotecalls import class_to_string, string_to_class
+from spt.models.envelope import unpack_result, split_attachments, is_binary_file
 from spt.models.task import FunctionTask, MethodTask
 from spt.models.workers import WorkerConfigs
 from spt.scheduler import Scheduler
@@ -35,6 +41,186 @@ logging.basicConfig(
 logger = logging.getLogger("Jobs")
 dispatcher = None
 
+# Redis channel announcing the id of every job reaching a final status
+JOBS_DONE_CHANNEL = "smi-jobs:done"
+# Redis channel announcing the id of every cancelled job to the jobs process
+JOBS_CANCEL_CHANNEL = "smi-jobs:cancel"
+# Redis channel prefix relaying the partial results of a running job, an empty message ends them
+JOBS_CHUNKS_PREFIX = "smi-jobs:chunks:"
+JOBS_FINAL_STATUSES = [JobStatuses.completed, JobStatuses.failed, JobStatuses.cancelled]
+
+# Single-flight: a dedup key points to the in-flight job every identical submission attaches to
+JOBS_DEDUP_PREFIX = "smi-jobs:dedup:"
+
+# Attaches to the live job of a dedup key, or makes the given job its leader.
+# KEYS: dedup key, job status, job waiters, job dedup back reference
+# ARGV: job id, pending status, ttl
+_CLAIM_JOB_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    local status = redis.call('GET', existing .. ':status')
+    local cancelled = redis.call('EXISTS', existing .. ':cancelled') == 1
+    if status and not cancelled and cjson.decode(status)['status'] ~= 'FAILED' then
+        redis.call('INCR', existing .. ':waiters')
+        redis.call('EXPIRE', existing .. ':waiters', ARGV[3])
+        return existing
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[3])
+redis.call('SET', KEYS[4], KEYS[1], 'EX', ARGV[3])
+return ARGV[1]
+"""
+
+# Reads a job result and clears the job once its last waiter got it.
+# Returns the result and 1 when the job was cleared, its offloaded result can then go too.
+# KEYS: job result, job status, job waiters, job dedup back reference
+# ARGV: job id
+_FETCH_RESULT_SCRIPT = """
+local result = redis.call('GET', KEYS[1])
+if redis.call('DECR', KEYS[3]) <= 0 then
+    local dedup = redis.call('GET', KEYS[4])
+    if dedup and redis.call('GET', dedup) == ARGV[1] then
+        redis.call('DEL', dedup)
+    end
+    redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+    return {result, 1}
+end
+return {result, 0}
+"""
+
+# Sets a job status and refreshes the time to live of the other keys of the job, so a job
+# in flight for longer than its ttl keeps its waiters and its dedup key.
+# KEYS: job status, job waiters, job dedup back reference, job cancelled flag
+# ARGV: job id, status, ttl
+_SET_STATUS_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[4], ARGV[3])
+local dedup = redis.call('GET', KEYS[3])
+if dedup then
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+    if redis.call('GET', dedup) == ARGV[1] then
+        redis.call('EXPIRE', dedup, ARGV[3])
+    end
+end
+"""
+
+# Cancels a job not yet in a final status, keeping the remaining time to live of its status.
+# The cancelled flag survives the status writes racing with the cancellation.
+# KEYS: job status, job cancelled flag
+# ARGV: job id
+_CANCEL_JOB_SCRIPT = """
+local status = redis.call('GET', KEYS[1])
+if not status then
+    return false
+end
+local current = cjson.decode(status)
+if current['status'] == 'COMPLETED' or current['status'] == 'FAILED' or current['status'] == 'CANCELLED' then
+    return status
+end
+current['status'] = 'CANCELLED'
+current['message'] = 'Job cancelled'
+status = cjson.encode(current)
+local ttl = redis.call('TTL', KEYS[1])
+if ttl <= 0 then
+    ttl = 3600
+end
+redis.call('SET', KEYS[1], status, 'EX', ttl)
+redis.call('SET', KEYS[2], 1, 'EX', ttl)
+redis.call('PUBLISH', '""" + JOBS_DONE_CHANNEL + """', ARGV[1])
+redis.call('PUBLISH', '""" + JOBS_CANCEL_CHANNEL + """', ARGV[1])
+redis.call('PUBLISH', '""" + JOBS_CHUNKS_PREFIX + """' .. ARGV[1], '')
+return status
+"""
+
+# One async Redis client, and so one connection pool, per event loop
+_redis_clients: Dict[asyncio.AbstractEventLoop, redis.asyncio.Redis] = {}
+
+def get_redis() -> redis.asyncio.Redis:
+    """
+    Returns the Redis client of the running event loop, creating it on first use.
+
+    Connections are bound to the loop they were opened on, so every Jobs of a loop
+    shares the same pool. Broken connections are retried by the client itself.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _redis_clients:
+        _redis_clients[loop] = redis.asyncio.Redis(
+            host=REDIS_HOST, port=int(REDIS_PORT), db=0,
+            retry=Retry(ExponentialBackoff(), 3),
+            retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+            health_check_interval=30)
+    return _redis_clients[loop]
+
+async def close_redis():
+    client = _redis_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+_results_storage = None
+
+def get_results_storage():
+    """
+    Returns the object storage receiving the results too big to be kept in Redis.
+    Its bucket expires objects after a day, in case a result is never fetched.
+    """
+    global _results_storage
+    if _results_storage is None:
+        from spt.storage import Storage
+        storage = Storage()
+        storage.create_expiring_bucket(JOBS_RESULTS_BUCKET, days=1)
+        _results_storage = storage
+    return _results_storage
+
+_attachments_storage = None
+
+def get_attachments_storage():
+    """
+    Returns the object storage holding the attachments too big to travel through RabbitMQ.
+    Its bucket expires objects after a day, in case a job never runs.
+    """
+    global _attachments_storage
+    if _attachments_storage is None:
+        from spt.storage import Storage
+        storage = Storage()
+        storage.create_expiring_bucket(JOBS_ATTACHMENTS_BUCKET, days=1)
+        _attachments_storage = storage
+    return _attachments_storage
+
+# API priorities mapped onto AMQP message priorities (queues are declared with x-max-priority 10)
+JOBS_PRIORITIES = {
+    JobPriority.low: Priority.LOW,
+    JobPriority.normal: Priority.NORMAL,
+    JobPriority.high: Priority.HIGH,
+}
+
+async def declare_jobs_topology(channel, lanes: Optional[List[QueueLane]] = None):
+    """
+    Declares the exchange jobs are published to and one queue lane per worker,
+    bound with the lane routing key.
+    """
+    exchange = await channel.declare_exchange(name="spt", type="direct")
+    for lane in Jobs.lanes() if lanes is None else lanes:
+        queue = await channel.declare_queue(name=lane.queue_name, durable=True, arguments={"x-max-priority": 10})
+        await queue.bind(exchange, routing_key=lane.routing_key)
+    await declare_retry_topology(channel, dead_letter_exchange="spt")
+
+def attachments_digest(job: "Job") -> str:
+    """
+    Digest of the attachments of a job, for the keys identifying identical requests.
+    """
+    digest = hashlib.sha256()
+    for attachment in job.attachments:
+        if is_binary_file(attachment):
+            attachment.seek(0)
+            digest.update(hashlib.file_digest(attachment, "sha256").digest())
+            attachment.seek(0)
+        else:
+            digest.update(hashlib.sha256(attachment).digest())
+    return digest.hexdigest()
+
 class Job:
     def __init__(self, payload: Optional[str] = None, 
                  type: Optional[JobsTypes] = None, 
@@ -45,7 +231,12 @@ class Job:
                  request_model_class: Optional[str] = None, 
                  response_model_class: Optional[str] = None,
                  storage: Optional[str] = "local",
-                 keep_alive: Optional[int] = SERVICE_KEEP_ALIVE) -> None:
+                 keep_alive: Optional[int] = SERVICE_KEEP_ALIVE,
+                 attempt: int = 0,
+                 priority: Optional[JobPriority] = JobPriority.normal,
+                 dedup_key: Optional[str] = None,
+                 cache_id: Optional[str] = None,
+                 attachments: Optional[List[Union[bytes, BinaryIO, dict]]] = None) -> None:
         self.id = uuid.uuid4().hex if id is None else id
         self.payload = payload
         self.status = JobStatuses.pending
@@ -58,81 +249,228 @@ class Job:
         self.response_model_class = response_model_class
         self.keep_alive = keep_alive
         self.storage = storage
+        self.attempt = attempt
+        self.priority = priority
+        self.dedup_key = dedup_key
+        self.cache_id = cache_id
+        # raw bytes or files of the request, referenced from the payload, see spt.models.envelope.split_attachments,
+        # in the queue the big ones are references to the object storage, see Jobs.load_attachments
+        self.attachments = attachments or []
+        self.artifacts: List[str] = []
         self.thread = None
 
 class Jobs:
     _workers_configuration = WorkerConfigs.get_configs()
 
     def __init__(self, type: JobsTypes = JobsTypes.unknown):
-        self.redis = self._redis_connect()
         self.publisher = None
         self.consumer = None
+        self.type = type
         self.routing_key = f"{type.value}"
         self.thread = None
         self.dispatcher = None
 
-    def _redis_connect(self):
-        return redis.Redis(
-            host=REDIS_HOST, port=6379, db=0)
+    @property
+    def redis(self) -> redis.asyncio.Redis:
+        return get_redis()
 
-    def check_redis_connection(self):
-        try: 
-            response = self.redis.ping()
-        except redis.ConnectionError:
-            logger.error("Redis is not connected")
-            self.redis = self._redis_connect()
-    
     async def delete_job(self, job: Job):
-        self.check_redis_connection()
+        await self.redis.delete(f"{job.id}:status", f"{job.id}:result", f"{job.id}:waiters", f"{job.id}:dedup", f"{job.id}:cancelled")
 
-        self.redis.delete(f"{job.id}:status")
-        self.redis.delete(f"{job.id}:result")
+    def _ttl(self, job: Job) -> int:
+        return JOBS_TTLS.get(job.type.value, JOBS_TTL)
 
-    async def set_job_result(self, job: Job, result: Union[str, bytes]):
-        self.check_redis_connection()
+    async def _store_result(self, job: Job, result: bytes) -> bytes:
+        """
+        Returns what to store in Redis for a result envelope, offloading it to the object
+        storage when it is bigger than JOBS_RESULT_MAX_INLINE_SIZE: Redis then only keeps its reference.
+        """
+        if len(result) <= JOBS_RESULT_MAX_INLINE_SIZE:
+            return result
+        storage = await asyncio.to_thread(get_results_storage)
+        etag = await asyncio.to_thread(storage.upload_from_bytes, JOBS_RESULTS_BUCKET, job.id, result, False)
+        if etag is None:
+            logger.error(f"Failed to offload result of job {job.id} ({len(result)} bytes), keeping it in Redis")
+            return result
+        logger.info(f"Result of job {job.id} ({len(result)} bytes) offloaded to {JOBS_RESULTS_BUCKET}")
+        return msgpack.packb({"artifact": job.id})
+
+    async def _load_result(self, result: bytes, last: bool = True) -> Optional[dict]:
+        """
+        Unpacks a stored result envelope, downloading it when offloaded. The object is
+        removed once the last waiter of the job loaded it, otherwise the bucket expires it.
+        """
+        result = msgpack.unpackb(result, raw=False)
+        if "artifact" not in result:
+            return result
+        storage = await asyncio.to_thread(get_results_storage)
+        data = await asyncio.to_thread(storage.download_bytes, JOBS_RESULTS_BUCKET, result["artifact"])
+        if data is None:
+            return None
+        if last:
+            await asyncio.to_thread(storage.remove_object, JOBS_RESULTS_BUCKET, result["artifact"])
+        return msgpack.unpackb(data, raw=False)
+
+    def _encode_status(self, job: Job, status: JobStatuses, message: str) -> str:
+        return json.dumps({"status": status.value, "message": message, "type": job.type.value})
+
+    async def _write_status(self, client, job: Job, status: JobStatuses, message: str):
+        """
+        Writes a job status with the client or the pipeline given, refreshing the ttl of the job keys.
+        """
+        write_status = self.redis.register_script(_SET_STATUS_SCRIPT)
+        await write_status(
+            keys=[f"{job.id}:status", f"{job.id}:waiters", f"{job.id}:dedup", f"{job.id}:cancelled"],
+            args=[job.id, self._encode_status(job, status, message), self._ttl(job)],
+            client=client)
 
-        toStore = json.dumps(result)
-        toStore = msgpack.packb(toStore)
-        self.redis.set(f"{job.id}:result", toStore)
+    async def set_job_result(self, job: Job, result: bytes):
+        await self.redis.set(f"{job.id}:result", await self._store_result(job, result), ex=self._ttl(job))
 
-    async def get_job_result(self, job: Job) -> Type[BaseModel] | JobResponse:
-        self.check_redis_connection()
+    async def finish_job(self, job: Job, status: JobStatuses, result: Optional[bytes], message: str = ""):
+        """
+        Stores the result and the final status of a job and announces it, in one transaction.
+
+        Args:
+            job (Job): the finished job
+            status (JobStatuses): completed or failed
+            result (Optional[bytes]): the result envelope, see spt.models.envelope, None for a failed job
+            message (str): the status message
+        """
+        toStore = await self._store_result(job, result) if result is not None else None
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if toStore is not None:
+                pipe.set(f"{job.id}:result", toStore, ex=self._ttl(job))
+            await self._write_status(pipe, job, status, message)
+            pipe.publish(JOBS_DONE_CHANNEL, job.id)
+            await pipe.execute()
+
+    async def publish_chunk(self, job: Job, chunk: bytes):
+        """
+        Relays a partial result envelope of a running job to the API processes streaming it,
+        an empty chunk tells them the job is over.
+        """
+        await self.redis.publish(f"{JOBS_CHUNKS_PREFIX}{job.id}", chunk)
 
-        result = self.redis.get(f"{job.id}:result")
+    async def get_job_result(self, job: Job) -> Type[BaseModel] | JobResponse:
+        # read the job and clear it when no other submitter waits for it, in one round trip
+        fetch_result = self.redis.register_script(_FETCH_RESULT_SCRIPT)
+        result, last = await fetch_result(
+            keys=[f"{job.id}:result", f"{job.id}:status", f"{job.id}:waiters", f"{job.id}:dedup"],
+            args=[job.id])
+        if result is not None:
+            result = await self._load_result(result, last=bool(last))
         if result is None:
             return JobResponse(id=job.id, status=JobStatuses.unknown, message="Job not found", type=JobsTypes.unknown)
         
-        result = msgpack.unpackb(result)
-        result = json.loads(result)
-        
-        await self.delete_job(job)
-        logger.info(f"Job {job.id} result: {result}")
-        response_model_class = string_to_class(job.response_model_class)
-        arg = response_model_class.model_validate_json(result["payload"])
-
-        return arg
+        logger.info(f"Job {job.id} result: {result['model']}")
+        return unpack_result(result)
 
     async def set_job_status(self, job: Job, status: JobStatuses, message:str = ""):
-        self.check_redis_connection()
-
-        nextStatus = json.dumps({"status": status.value, "message": message, "type": job.type.value})
-        self.redis.set(f"{job.id}:status", nextStatus)
+        if status in JOBS_FINAL_STATUSES:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await self._write_status(pipe, job, status, message)
+                pipe.publish(JOBS_DONE_CHANNEL, job.id)
+                await pipe.execute()
+        else:
+            await self._write_status(self.redis, job, status, message)
 
     async def get_job_status(self, job: Job) -> JobResponse:
-        self.check_redis_connection()
-
-        status = self.redis.get(f"{job.id}:status")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"{job.id}:status")
+            pipe.exists(f"{job.id}:cancelled")
+            status, cancelled = await pipe.execute()
         if status is None:
             return JobResponse(id=job.id, status=JobStatuses.unknown, message="Job not found", type=JobsTypes.unknown)
         status = json.loads(status.decode('utf-8'))
+        if cancelled:
+            # a running job may still write its status after being cancelled
+            status.update(status=JobStatuses.cancelled.value, message="Job cancelled")
         logger.info(f"Job {job.id} status: {status}")
         return JobResponse(id=job.id, status=JobStatuses(status['status']), message=status['message'], type=status['type'])
 
+    async def is_cancelled(self, job: Job) -> bool:
+        return bool(await self.redis.exists(f"{job.id}:cancelled"))
+
+    async def cancel_job(self, job_id: str) -> JobResponse:
+        """
+        Cancels a queued or running job. A queued job is dropped when the jobs process receives it,
+        a running one has its gRPC call cancelled and its worker stops at the next step it checks.
+
+        Args:
+            job_id (str): the id of the job to cancel
+
+        Returns:
+            JobResponse: the job status, cancelled unless it was already final, unknown when the job does not exist
+        """
+        cancel = self.redis.register_script(_CANCEL_JOB_SCRIPT)
+        status = await cancel(keys=[f"{job_id}:status", f"{job_id}:cancelled"], args=[job_id])
+        if status is None:
+            return JobResponse(id=job_id, status=JobStatuses.unknown, message="Job not found", type=JobsTypes.unknown)
+        status = json.loads(status.decode('utf-8'))
+        logger.info(f"Job {job_id} cancellation: {status}")
+        return JobResponse(id=job_id, status=JobStatuses(status['status']), message=status['message'], type=status['type'])
+
+    async def memory_report(self) -> JobsMemoryReport:
+        """
+        Scans the job keys of Redis and sums their memory usage per kind of key.
+
+        Returns:
+            JobsMemoryReport: the Redis memory usage and the job keys usage
+        """
+        info = await self.redis.info("memory")
+        report = JobsMemoryReport(used_memory_bytes=info["used_memory"],
+                                  max_memory_bytes=info.get("maxmemory", 0))
+        for kind in ["status", "result"]:
+            usage = JobsKeysUsage(kind=kind)
+            keys = [key async for key in self.redis.scan_iter(match=f"*:{kind}", count=1000)]
+            for start in range(0, len(keys), 1000):
+                batch = keys[start:start + 1000]
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in batch:
+                        pipe.memory_usage(key)
+                        pipe.ttl(key)
+                    values = await pipe.execute()
+                for size, ttl in zip(values[0::2], values[1::2]):
+                    if size is None:
+                        continue
+                    usage.keys += 1
+                    usage.bytes += size
+                    usage.largest_bytes = max(usage.largest_bytes, size)
+                    if ttl == -1:
+                        usage.without_ttl += 1
+            report.keys.append(usage)
+        return report
+
+    async def claim_job(self, job: Job) -> str:
+        """
+        Attaches the job to the in-flight job sharing its dedup key, or registers it
+        as the one the next identical submissions attach to.
+
+        Args:
+            job (Job): a job with a dedup_key
+
+        Returns:
+            str: the id of the job to wait for, job.id when the job has to be run
+        """
+        claim = self.redis.register_script(_CLAIM_JOB_SCRIPT)
+        job_id = await claim(
+            keys=[job.dedup_key, f"{job.id}:status", f"{job.id}:waiters", f"{job.id}:dedup"],
+            args=[job.id, self._encode_status(job, JobStatuses.pending, ""), self._ttl(job)])
+        return job_id.decode("utf-8")
+
     async def add_job(self, job: Job):
-        await self.set_job_status(job, JobStatuses.pending)
+        if job.dedup_key is not None:
+            job_id = await self.claim_job(job)
+            if job_id != job.id:
+                logger.info(f"Job {job.id} attached to identical in-flight job {job_id}")
+                job.id = job_id
+                return
+        else:
+            await self.set_job_status(job, JobStatuses.pending)
         
         try:
-            self._send_job(job)
+            await self._send_job(job)
         except Exception as e:
             logger.error(f"Failed to add job {job.id} to queue: {e}")
             await self.set_job_status(job, JobStatuses.failed, message=str(e))
@@ -140,12 +478,28 @@ class Jobs:
         
         await self.set_job_status(job, JobStatuses.queued, )
 
-        logger.info(f"Job {job.id} added to queue {self.routing_key}")
+        logger.info(f"Job {job.id} added to queue lane {QueueLane.make_routing_key(job.type.value, job.worker_id)}")
 
 
+    @classmethod
+    def lanes(cls, type: Optional[JobsTypes] = None) -> List[QueueLane]:
+        """
+        Queue lanes derived from the workers configuration, optionally restricted to one job type.
+        """
+        lanes = []
+        for worker_id, config in cls._workers_configuration.workers_configs.items():
+            if config.job_type == JobsTypes.unknown or (type is not None and config.job_type != type):
+                continue
+            concurrency = config.concurrency or JOBS_CONCURRENCY
+            # prefetch at least one message per concurrent dispatch so the lane never starves
+            prefetch = max(config.prefetch or JOBS_PREFETCH, concurrency)
+            lanes.append(QueueLane(job_type=config.job_type.value, worker_id=worker_id,
+                                   prefetch=prefetch, concurrency=concurrency))
+        return lanes
+
     @classmethod
     async def create_job(cls, 
-                        payload: str,
+                        payload: Union[str, BaseModel],
                         type: JobsTypes,
                         worker_id: str,
                         request_model_class: Type[BaseModel] = None,
@@ -153,7 +507,8 @@ class Jobs:
                         keep_alive: Optional[int] = SERVICE_KEEP_ALIVE,
                         storage: Optional[str] = "local",
                         remote_method: Optional[str] = "work",
-                        remote_class: Optional[str] = "spt.services.service.Service"
+                        remote_class: Optional[str] = "spt.services.service.Service",
+                        idempotency_key: Optional[str] = None
                         ) -> Job:
         
         if request_model_class is None:
@@ -164,7 +519,13 @@ class Jobs:
             response_model_class = string_to_class(
                 Jobs._workers_configuration.workers_configs[worker_id].response_model)
 
+        attachments = []
+        if isinstance(payload, BaseModel):
+            # bytes fields travel as raw attachments instead of base64 JSON strings
+            payload, attachments = split_attachments(payload)
+
         job = Job(payload=payload,
+                    attachments=attachments,
                     type=type,
                   worker_id=worker_id,
                     remote_method=remote_method,
@@ -173,19 +534,103 @@ class Jobs:
                     storage=storage,
                     request_model_class=class_to_string(request_model_class),
                     response_model_class=class_to_string(response_model_class))
+        job.dedup_key = Jobs.dedup_key(job, idempotency_key)
         return job
 
-    def _send_job(self, job: Job):
+    @classmethod
+    def dedup_key(cls, job: Job, idempotency_key: Optional[str] = None) -> Optional[str]:
+        """
+        Single-flight key of a job: the client Idempotency-Key when given, otherwise a hash of
+        the canonical request for workers configured with deduplicate, None when the job must always run.
+        """
+        if idempotency_key:
+            identity = f"{job.worker_id}|{idempotency_key}"
+        elif job.worker_id in cls._workers_configuration.workers_configs and \
+                cls._workers_configuration.workers_configs[job.worker_id].deduplicate:
+            payload = json.dumps(json.loads(job.payload), sort_keys=True, separators=(",", ":"))
+            identity = f"{job.worker_id}|{job.remote_class}|{job.remote_method}|{job.storage}|{payload}"
+            if job.attachments:
+                identity += f"|{attachments_digest(job)}"
+        else:
+            return None
+        return JOBS_DEDUP_PREFIX + hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    async def start_publisher(self) -> QueuePublisherPool:
         if self.publisher is None:
-            self.publisher = QueueMessageSender()
+            self.publisher = get_publisher_pool()
+            await self.publisher.add_topology("jobs", declare_jobs_topology)
+            await self.publisher.check_connection()
+        return self.publisher
 
-        self.publisher.declare_exchange(exchange_name="spt", exchange_type="direct")
-        self.publisher.declare_queue(queue_name="smi-requests")
-        self.publisher.send_message(
+    async def _queue_attachment(self, job: Job, index: int, attachment: Union[bytes, BinaryIO]) -> Union[bytes, dict]:
+        """
+        Returns what to queue for an attachment, offloading it to the object storage when it is
+        bigger than JOBS_ATTACHMENT_MAX_INLINE_SIZE: the message then only carries its reference.
+        """
+        if isinstance(attachment, bytes):
+            size = len(attachment)
+        else:
+            size = attachment.seek(0, 2)
+            attachment.seek(0)
+        if size > JOBS_ATTACHMENT_MAX_INLINE_SIZE:
+            name = f"{job.id}-{index}"
+            storage = await asyncio.to_thread(get_attachments_storage)
+            if isinstance(attachment, bytes):
+                etag = await asyncio.to_thread(storage.upload_from_bytes, JOBS_ATTACHMENTS_BUCKET, name, attachment, False)
+            else:
+                etag = await asyncio.to_thread(storage.upload_from_stream, JOBS_ATTACHMENTS_BUCKET, name, attachment, size, False)
+            if etag is not None:
+                logger.info(f"Attachment {index} of job {job.id} ({size} bytes) offloaded to {JOBS_ATTACHMENTS_BUCKET}")
+                return {"artifact": name}
+            logger.error(f"Failed to offload attachment {index} of job {job.id} ({size} bytes), queueing it")
+        if isinstance(attachment, bytes):
+            return attachment
+        data = await asyncio.to_thread(attachment.read)
+        attachment.seek(0)
+        return data
+
+    async def load_attachments(self, job: Job):
+        """
+        Downloads the attachments of a received job offloaded to the object storage, each one
+        to a spooled file, on disk once big. release_attachments frees them once the job is over.
+        """
+        from spt.services.transport import spool
+        storage = None
+        for index, attachment in enumerate(job.attachments):
+            if not isinstance(attachment, dict):
+                continue
+            storage = storage or await asyncio.to_thread(get_attachments_storage)
+            file = spool()
+            job.attachments[index] = file
+            if not await asyncio.to_thread(storage.download_to_file, JOBS_ATTACHMENTS_BUCKET, attachment["artifact"], file):
+                raise RuntimeError(f"Attachment {index} of job {job.id} is missing from {JOBS_ATTACHMENTS_BUCKET}")
+            job.artifacts.append(attachment["artifact"])
+
+    async def release_attachments(self, job: Job):
+        """
+        Closes the files of the attachments of a job and removes the offloaded ones from the object storage.
+        """
+        for attachment in job.attachments:
+            if is_binary_file(attachment):
+                attachment.close()
+        if job.artifacts:
+            storage = await asyncio.to_thread(get_attachments_storage)
+            for name in job.artifacts:
+                await asyncio.to_thread(storage.remove_object, JOBS_ATTACHMENTS_BUCKET, name)
+            job.artifacts = []
+
+    async def _send_job(self, job: Job):
+        config = self._workers_configuration.workers_configs.get(job.worker_id)
+        if config is None or config.job_type != job.type:
+            # no lane of this job type is bound for the worker, the message would be dropped
+            raise ValueError(f"Worker {job.worker_id} does not run {job.type.value} jobs")
+        publisher = await self.start_publisher()
+        attachments = [await self._queue_attachment(job, index, attachment) for index, attachment in enumerate(job.attachments)]
+        await publisher.send_message(
             exchange_name="spt",
-            routing_key=self.routing_key,
-            body=job.payload,
-            priority=Priority.NORMAL,
+            routing_key=QueueLane.make_routing_key(job.type.value, job.worker_id),
+            body={"payload": job.payload, "attachments": attachments},
+            priority=JOBS_PRIORITIES[JobPriority(job.priority)],
             headers=Headers(job_id=job.id, job_type=job.type,
                             job_worker_id=job.worker_id,
                             job_remote_class=job.remote_class, 
@@ -193,52 +638,100 @@ class Jobs:
                             job_response_model_class=job.response_model_class, 
                             job_request_model_class=job.request_model_class,
                             job_storage=job.storage,
-                            job_keep_alive=job.keep_alive)
+                            job_keep_alive=job.keep_alive,
+                            job_attempt=job.attempt,
+                            job_priority=JobPriority(job.priority).value,
+                            job_cache_id=job.cache_id or "")
         )
 
-    def message_to_job(self, channel, method, properties, body):
-        body = self.consumer.decode_message(body=body)
+    def message_to_job(self, message: AbstractIncomingMessage):
+        body = self.consumer.decode_message(body=message.body)
+        headers = message.headers
         logger.debug(
-            f"  [**] JOB ID {properties.headers['job_id']} TYPE {properties.headers['job_type']} MODEL ID {properties.headers['job_worker_id']} CLASS {properties.headers['job_remote_class']} METHOD {properties.headers['job_remote_method']} Response Model Class {properties.headers['job_response_model_class']} Request Model Class {properties.headers['job_request_model_class']}")
-
-        return Job(json.loads(body), type=JobsTypes(properties.headers['job_type']),
-                id=properties.headers['job_id'],
-                   worker_id=properties.headers['job_worker_id'],
-                remote_class=properties.headers['job_remote_class'],
-                remote_method=properties.headers['job_remote_method'],
-                response_model_class=properties.headers['job_response_model_class'],
-                request_model_class=properties.headers['job_request_model_class'],
-                keep_alive=properties.headers['job_keep_alive'],
-                storage=properties.headers['job_storage'])
-
-    @sync
-    async def can_run_job(self, channel, method, properties, body) -> bool:
+            f"  [**] JOB ID {headers['job_id']} TYPE {headers['job_type']} MODEL ID {headers['job_worker_id']} CLASS {headers['job_remote_class']} METHOD {headers['job_remote_method']} Response Model Class {headers['job_response_model_class']} Request Model Class {headers['job_request_model_class']}")
+
+        attachments = []
+        if isinstance(body, dict):
+            body, attachments = body["payload"], body["attachments"]
+
+        return Job(json.loads(body), type=JobsTypes(headers['job_type']),
+                attachments=attachments,
+                id=headers['job_id'],
+                   worker_id=headers['job_worker_id'],
+                remote_class=headers['job_remote_class'],
+                remote_method=headers['job_remote_method'],
+                response_model_class=headers['job_response_model_class'],
+                request_model_class=headers['job_request_model_class'],
+                keep_alive=headers['job_keep_alive'],
+                storage=headers['job_storage'],
+                attempt=headers.get('job_attempt', 0),
+                priority=JobPriority(headers.get('job_priority', JobPriority.normal.value)),
+                cache_id=headers.get('job_cache_id') or None)
+
+    async def can_run_job(self, message: AbstractIncomingMessage) -> bool:
         global dispatcher
 
-        job = self.message_to_job(channel, method, properties, body)
-    
-        await self.set_job_status(job, JobStatuses.in_progress)
+        job = self.message_to_job(message)
 
+        if await self.is_cancelled(job):
+            # let receive_job drop it rather than retrying it
+            return True
+
+        # the job stays queued until admitted, dispatch_job marks it in progress
         if dispatcher is None:
             from spt.dispatcher import Dispatcher
             dispatcher = Dispatcher()
 
         return await dispatcher.allow_run_job(job)
 
-    @sync
-    async def receive_job(self, channel, method, properties, body):
+    async def retry_job(self, message: AbstractIncomingMessage):
+        """
+        Defers a job that cannot run yet through the delayed retry exchanges,
+        with an exponential backoff driven by the job_attempt header.
+        """
+        job = self.message_to_job(message)
+
+        if job.attempt >= QUEUE_RETRY_MAX_ATTEMPTS:
+            logger.error(f"Job {job.id} could not be scheduled after {job.attempt} attempts")
+            await self.set_job_status(job, JobStatuses.failed, message=f"Job could not be scheduled after {job.attempt} attempts")
+            return
+
+        delay = retry_delay(job.attempt)
+        headers = Headers(**message.headers)
+        headers.job_attempt = job.attempt + 1
+
+        publisher = await self.start_publisher()
+        await publisher.send_message(
+            exchange_name=retry_exchange_name(delay),
+            routing_key=message.routing_key,
+            body=self.consumer.decode_message(body=message.body),
+            priority=JOBS_PRIORITIES[job.priority],
+            headers=headers)
+
+        await self.set_job_status(job, JobStatuses.queued, message=f"Waiting for resources, retry {headers.job_attempt} in {delay} seconds")
+        logger.info(f"Job {job.id} deferred for {delay} seconds (attempt {headers.job_attempt})")
+
+    async def receive_job(self, message: AbstractIncomingMessage):
         global dispatcher
         
-        logger.info(f"[*] Receive Job {channel}, {method} {properties}")
-        
-        job = self.message_to_job(channel, method, properties, body)
-        
-        await self.set_job_status(job, JobStatuses.in_progress)
+        logger.info(f"[*] Receive Job {message.delivery_tag} {message.routing_key} {message.headers}")
         
+        job = self.message_to_job(message)
+
         if dispatcher is None:
             from spt.dispatcher import Dispatcher
             dispatcher = Dispatcher()
 
+        # can_run_job reserved the capacity of the job, dispatch_job releases it once done
+        try:
+            if await self.is_cancelled(job):
+                logger.info(f"Job {job.id} was cancelled, dropping it")
+                dispatcher.release_job(job)
+                return
+        except BaseException:
+            dispatcher.release_job(job)
+            raise
+
         await dispatcher.dispatch_job(job)
 
     def start_jobs_receiver_thread(self):
@@ -266,23 +759,110 @@ class Jobs:
                 f"Erreur lors de l'exécution de la réception des jobs: {e}")
             traceback.print_exc()
         finally:
+            if dispatcher is not None:
+                loop.run_until_complete(dispatcher.close())
+            loop.run_until_complete(close_redis())
             loop.close()
 
-    def start_jobs_receiver(self):
+    async def start_jobs_receiver(self):
         logger.info(f"Starting jobs receiver for queue {self.routing_key}")
-        self.consumer = QueueMessageReceiver()
-        self.consumer.declare_queue(queue_name="smi-requests")
-        self.consumer.declare_exchange(exchange_name="spt")
-        self.consumer.bind_queue(
-            exchange_name="spt", queue_name="smi-requests", routing_key=self.routing_key
-        )
-        self.consumer.consume_and_check_messages(
-            queue="smi-requests", process_callback=self.receive_job, auto_ack=False, condition_callback=self.can_run_job)
+        self.consumer = AsyncQueueMessageReceiver()
+        lanes = Jobs.lanes(self.type)
+        await self.consumer.check_connection()
+        await declare_jobs_topology(self.consumer.channel, lanes)
+        await asyncio.gather(self.receive_cancellations(), *[
+            self.consumer.consume_and_check_messages(
+                queue=lane.queue_name, process_callback=self.receive_job, auto_ack=False, condition_callback=self.can_run_job,
+                retry_callback=self.retry_job, prefetch=lane.prefetch, concurrency=lane.concurrency)
+            for lane in lanes])
+
+    async def receive_cancellations(self):
+        """
+        Cancels the gRPC calls of the running jobs announced on JOBS_CANCEL_CHANNEL.
+        """
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(JOBS_CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message" and dispatcher is not None:
+                        dispatcher.cancel_job(message["data"].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cancellations listener disconnected: {e}, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                # the next attempt subscribes on a new connection
+                await pubsub.aclose()
     
-    def stop(self):
-        if self.publisher is not None:
-            self.publisher.close()
-        self.redis.close()
+    async def stop(self):
+        # the publisher pool is shared by the whole process, see close_publisher_pool
+        self.publisher = None
+        if self.consumer is not None:
+            await self.consumer.close()
+
+
+class JobsListener:
+    """
+    Single Redis pub/sub subscription per API process resolving the futures of
+    the requests waiting for a job, as soon as the jobs process announces it on
+    JOBS_DONE_CHANNEL.
+    """
+    def __init__(self) -> None:
+        self.waiters: Dict[str, List[asyncio.Future]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(JOBS_DONE_CHANNEL)
+                logger.info(f"Listening to {JOBS_DONE_CHANNEL}")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._resolve(message["data"].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Jobs listener disconnected: {e}, reconnecting")
+                # notifications may have been lost, let every waiter check its job again
+                for job_id in list(self.waiters.keys()):
+                    self._resolve(job_id)
+                await asyncio.sleep(1)
+            finally:
+                # the next attempt subscribes on a new connection
+                await pubsub.aclose()
+
+    def _resolve(self, job_id: str):
+        for waiter in self.waiters.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(job_id)
+
+    def watch(self, job_id: str) -> asyncio.Future:
+        """
+        Returns a future resolved when the job reaches a final status.
+        Watch before reading the job status to not miss the notification.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(job_id, []).append(waiter)
+        return waiter
+
+    def unwatch(self, job_id: str, waiter: asyncio.Future):
+        waiters = self.waiters.get(job_id, [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            self.waiters.pop(job_id, None)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
 
 
 def monitor_and_restart_jobs(jobs: List[Jobs], executor: concurrent.futures.ThreadPoolExecutor):
@@ -0,0 +1,147 @@
+from pydantic import BaseModel, BeforeValidator, PlainSerializer, SerializationInfo, WithJsonSchema
+from typing import Annotated, Any, BinaryIO, List, Tuple, Union
+from datetime import date, datetime
+from enum import Enum
+import base64
+import json
+import msgpack
+from spt.models.remotecalls import class_to_string, string_to_class
+
+def _decode_base64(v: Any) -> Any:
+    if isinstance(v, str):  # base64 string from JSON
+        try:
+            return base64.b64decode(v)
+        except ValueError:
+            raise ValueError("Invalid Base64 encoding")
+    return v  # raw bytes from a worker or a result envelope
+
+"""
+Binary field of a model: raw bytes in Python and in the result envelope,
+a base64 string only when the model is read from or written to JSON.
+"""
+BinaryData = Annotated[bytes,
+                       BeforeValidator(_decode_base64),
+                       PlainSerializer(lambda v: base64.b64encode(v).decode('utf-8'), return_type=str, when_used="json")]
+
+def is_binary_file(value: Any) -> bool:
+    return hasattr(value, "read") and hasattr(value, "seek")
+
+def _decode_binary_input(v: Any) -> Union[bytes, BinaryIO]:
+    if isinstance(v, str):
+        return _decode_base64(v)
+    if isinstance(v, (bytes, bytearray)):
+        return bytes(v)
+    if is_binary_file(v):  # an upload spooled by the API or the service
+        return v
+    raise ValueError("Expected bytes, a base64 string or a binary file")
+
+def _encode_binary_input(v: Union[bytes, BinaryIO], info: SerializationInfo) -> Any:
+    if info.mode != "json":
+        if is_binary_file(v) and info.context and "attachments" in info.context:
+            # moved to the attachments by split_attachments, pydantic would iterate over the file
+            info.context["attachments"].append(v)
+            return {ATTACHMENT_REF: len(info.context["attachments"]) - 1}
+        return v
+    if is_binary_file(v):
+        v.seek(0)
+        data = v.read()
+        v.seek(0)
+        v = data
+    return base64.b64encode(v).decode('utf-8')
+
+"""
+Binary input of a request, big enough to be streamed: like BinaryData, or a binary
+file object when the bytes were spooled to disk, see the ProcessDataUpload RPC.
+"""
+BinaryInput = Annotated[Any,
+                        BeforeValidator(_decode_binary_input),
+                        PlainSerializer(_encode_binary_input, return_type=Any),
+                        WithJsonSchema({"type": "string", "format": "byte"})]
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot pack {type(value)} in a result envelope")
+
+def pack_result(result: BaseModel) -> bytes:
+    """
+    Packs a worker result in a msgpack envelope carrying its model class and its fields,
+    binary fields staying raw bytes instead of base64 strings.
+
+    Args:
+        result (BaseModel): the response model returned by a worker
+
+    Returns:
+        bytes: the envelope, stored as is from the service to the API
+    """
+    return msgpack.packb({"model": class_to_string(type(result)),
+                          "data": result.model_dump(mode="python")},
+                         default=_encode_value, use_bin_type=True)
+
+def unpack_result(envelope: Union[bytes, dict]) -> BaseModel:
+    """
+    Rebuilds the response model packed by pack_result.
+
+    Args:
+        envelope (Union[bytes, dict]): the msgpack envelope, or its already unpacked map
+
+    Returns:
+        BaseModel: the response model
+    """
+    if isinstance(envelope, bytes):
+        envelope = msgpack.unpackb(envelope, raw=False)
+    response_model_class = string_to_class(envelope["model"])
+    return response_model_class.model_validate(envelope["data"])
+
+# Key of the JSON object standing for an attachment in a request payload
+ATTACHMENT_REF = "$attachment"
+
+def split_attachments(request: BaseModel) -> Tuple[str, List[Union[bytes, BinaryIO]]]:
+    """
+    Serializes a request to JSON with its bytes fields moved to attachments, each
+    replaced in the JSON by a {"$attachment": index} reference, so media travel raw
+    through the queue and gRPC instead of as base64 strings.
+
+    Args:
+        request (BaseModel): the request model of a worker
+
+    Returns:
+        Tuple[str, List[Union[bytes, BinaryIO]]]: the JSON payload and its attachments, bytes or binary files
+    """
+    attachments: List[Union[bytes, BinaryIO]] = []
+
+    def extract(value: Any) -> Any:
+        if isinstance(value, bytes):
+            attachments.append(value)
+            return {ATTACHMENT_REF: len(attachments) - 1}
+        if isinstance(value, dict):
+            return {key: extract(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [extract(item) for item in value]
+        return value
+
+    payload = extract(request.model_dump(mode="python", context={"attachments": attachments}))
+    return json.dumps(payload, default=_encode_value), attachments
+
+def bind_attachments(payload: Any, attachments: List[Union[bytes, BinaryIO]]) -> Any:
+    """
+    Puts back the attachments referenced by a payload decoded from split_attachments JSON.
+
+    Args:
+        payload (Any): the decoded JSON payload
+        attachments (List[Union[bytes, BinaryIO]]): the attachments of the request
+
+    Returns:
+        Any: the payload, ready to be validated by the request model
+    """
+    if isinstance(payload, dict):
+        if len(payload) == 1 and ATTACHMENT_REF in payload:
+            return attachments[payload[ATTACHMENT_REF]]
+        return {key: bind_attachments(item, attachments) for key, item in payload.items()}
+    if isinstance(payload, list):
+        return [bind_attachments(item, attachments) for item in payload]
+    return payload
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, field_validator
 from enum import Enum
 from typing import List, Optional
 from spt.models.workers import WorkerResult, WorkerBaseRequest
+from spt.models.envelope import BinaryData
 
 class StylesPreset(str, Enum):
     threeD_model = "3d-model",
@@ -100,7 +101,7 @@ SD v1.6: must be between 320x320 and 1536x1536""")
                                        description="Pass in a style preset to guide the image model towards a particular style. This list of style presets is subject to change.")
 
 class Artifact(BaseModel):
-    base64: Optional[str] = None
+    base64: Optional[BinaryData] = None
     url: Optional[str] = None
     finishReason: WorkerResult = Field(..., example="SUCCESS")
     seed: int = Field(..., example=1050625087)
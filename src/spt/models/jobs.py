@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field, validator
+from typing import List
 from enum import Enum
 
 class JobsTypes(str, Enum):
@@ -14,6 +15,7 @@ class JobStatuses(str, Enum):
     in_progress = "IN_PROGRESS",
     completed = "COMPLETED",
     failed = "FAILED",
+    cancelled = "CANCELLED",
     unknown = "UNKNOWN"
 
 class JobPriority(str, Enum):
@@ -25,6 +27,10 @@ class JobStorage(str, Enum):
     local = "LOCAL",
     s3 = "S3"
 
+class JobCache(str, Enum):
+    default = "DEFAULT",
+    bypass = "BYPASS"
+
 class JobResponse(BaseModel):
     id: str = Field(..., example="b7b7c5a5-98b0-4a07-af27-93bfcfa38246",
                     description="Unique identifier for the job")
@@ -34,3 +40,24 @@ class JobResponse(BaseModel):
                                 description="Status of the job")
     message: str = Field(..., example="Job completed successfully",
                          description="Message of the job")
+
+class JobsKeysUsage(BaseModel):
+    kind: str = Field(..., example="result", description="Kind of job key, status or result")
+    keys: int = Field(0, description="Number of keys")
+    bytes: int = Field(0, description="Memory used by the keys in bytes")
+    largest_bytes: int = Field(0, description="Memory used by the largest key in bytes")
+    without_ttl: int = Field(0, description="Number of keys never expiring")
+
+class JobsMemoryReport(BaseModel):
+    used_memory_bytes: int = Field(..., description="Memory used by Redis in bytes")
+    max_memory_bytes: int = Field(0, description="Redis maxmemory in bytes, 0 when unbounded")
+    keys: List[JobsKeysUsage] = Field([], description="Memory used by the job keys")
+
+class CacheStats(BaseModel):
+    entries: int = Field(0, description="Number of cached results")
+    bytes: int = Field(0, description="Size of the cached results in bytes")
+    max_bytes: int = Field(0, description="Byte budget of the cache")
+    hits: int = Field(0, description="Requests served from the cache")
+    misses: int = Field(0, description="Cacheable requests not found in the cache")
+    stores: int = Field(0, description="Results added to the cache")
+    evictions: int = Field(0, description="Results evicted to stay within the byte budget")
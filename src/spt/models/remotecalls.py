@@ -68,3 +68,12 @@ class GPUInfo(BaseModel):
 class GPUsInfo(BaseModel):
     gpus: List[GPUInfo]
     error: Optional[str] = None
+
+class ResidencyInfo(BaseModel):
+    """
+    Memory of a service for its workers, see spt.services.residency.residency_infos.
+    """
+    available_gb: Optional[float] = None
+    budget_gb: float = 0.0
+    used_gb: float = 0.0
+    resident: List[str] = []
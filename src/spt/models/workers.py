@@ -1,8 +1,9 @@
 from pydantic import BaseModel, Field, validator, PrivateAttr
 from enum import Enum
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 from spt.utils import load_json
 from config import CONFIG_PATH
+from spt.models.jobs import JobsTypes
 
 class WorkerState(str, Enum):
     idle = "IDLE"
@@ -32,6 +33,13 @@ class WorkerStreamManageResponse(BaseModel):
     hostname: str = Field(..., example="localhost")
     port: int = Field(..., example=5555)
 
+class WorkerProgress(BaseModel):
+    """
+    Partial result streamed by workers with no meaningful intermediate output.
+    """
+    step: int = Field(..., example=5)
+    steps: int = Field(..., example=30)
+
 class WorkerType(str, Enum):
     audio = "AUDIO"
     classification = "CLASSIFICATION"
@@ -43,6 +51,16 @@ class WorkerType(str, Enum):
     video = "VIDEO"
     embeddings = "EMBEDDING"
 
+WORKER_JOBS_TYPES: Dict[WorkerType, JobsTypes] = {
+    WorkerType.picture: JobsTypes.image_generation,
+    WorkerType.llm: JobsTypes.llm_generation,
+    WorkerType.embeddings: JobsTypes.llm_generation,
+    WorkerType.audio: JobsTypes.audio_generation,
+    WorkerType.tts: JobsTypes.audio_generation,
+    WorkerType.stt: JobsTypes.audio_generation,
+    WorkerType.video: JobsTypes.video_generation,
+}
+
 class WorkerConfig(BaseModel):
     model: str = Field(..., example="SDXL Beta")
     description: str = Field(..., example="SDXL Beta")
@@ -52,6 +70,36 @@ class WorkerConfig(BaseModel):
                                example="spt.models.txt2img.TextToImageRequest")
     response_model: str = Field(...,
                                 example="spt.models.txt2img.TextToImageResponse")
+    prefetch: Optional[int] = Field(default=None, ge=1, example=1,
+                          description="Number of messages a jobs receiver prefetches from the worker queue lane, defaults to JOBS_PREFETCH")
+    concurrency: Optional[int] = Field(default=None, ge=1, example=1,
+                             description="Number of jobs of the worker a jobs receiver dispatches at the same time, defaults to JOBS_CONCURRENCY")
+    service_concurrency: Optional[int] = Field(default=None, ge=1, example=1,
+                                     description="Number of calls of the worker a service runs at the same time, defaults to SERVICE_WORKER_CONCURRENCY")
+    min_instances: int = Field(default=0, ge=0, example=1,
+                               description="Number of loaded instances of the worker a service never unloads to make room")
+    max_instances: Optional[int] = Field(default=None, ge=1, example=1,
+                                         description="Maximum number of loaded instances of the worker in a service, defaults to SERVICE_WORKER_INSTANCES")
+    warmup: Optional[Dict[str, Any]] = Field(default=None, example={"text": "Hello"},
+                                             description="Fields of a request run once a worker is preloaded, a dummy inference pass completing its warmup")
+
+    memory_footprint_gb: Optional[float] = Field(default=None, ge=0, example=4.5,
+                                                 description="GPU memory needed to load and run the worker, used for admission control")
+
+    batch_size: Optional[int] = Field(default=None, ge=1, example=32,
+                                      description="Maximum number of concurrent requests the service coalesces into one batched call of the worker")
+    batch_delay: int = Field(default=10, ge=0, example=10,
+                             description="Milliseconds the service waits for more requests before running an incomplete batch")
+
+    deduplicate: bool = Field(default=False, example=True,
+                              description="Identical requests submitted while a job is in flight attach to it instead of running again, for deterministic workers")
+
+    cacheable: bool = Field(default=False, example=True,
+                            description="Results of deterministic requests are cached and reused, see spt.cache")
+
+    @property
+    def job_type(self) -> JobsTypes:
+        return WORKER_JOBS_TYPES.get(self.type, JobsTypes.unknown)
 
 class WorkerConfigs(BaseModel):
     _loaded_engines: Optional[List[WorkerConfig]] = PrivateAttr(None)
@@ -2,14 +2,19 @@ from typing import Callable, Any, Optional
 from pika.exceptions import AMQPConnectionError
 from pydantic import BaseModel, validator
 import msgpack
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple, Awaitable
 from enum import Enum
 import time
 import ssl
 import functools
 import asyncio
+import heapq
+import itertools
 import pika
-from config import RABBITMQ_HOST, RABBITMQ_PASSWORD, RABBITMQ_USER, QUEUE_RETRY_DELAY
+import aio_pika
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.pool import Pool
+from config import RABBITMQ_HOST, RABBITMQ_PASSWORD, RABBITMQ_USER, QUEUE_RETRY_DELAY, QUEUE_RETRY_MAX_DELAY, QUEUE_CONNECT_RETRIES, QUEUE_CONNECT_RETRY_DELAY, QUEUE_PUBLISHER_POOL_SIZE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,6 +41,104 @@ class Headers(BaseModel):
     job_response_model_class: str
     job_storage: str
     job_keep_alive: int
+    job_attempt: int = 0
+    job_priority: str = "NORMAL"
+    job_cache_id: str = ""
+
+class PrioritySemaphore:
+    """
+    asyncio semaphore handing released slots to the waiter with the highest
+    priority first (FIFO between equal priorities).
+
+    Used by the receivers so that, among the messages already prefetched from a
+    lane, interactive jobs start before batch jobs.
+    """
+    def __init__(self, value: int = 1):
+        self._value = value
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int = 0):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # the slot may have been handed over right before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._value += 1
+
+class QueueLane(BaseModel):
+    """
+    A dedicated queue for the jobs of one worker_id, so that fast models never
+    wait behind slow ones. Each lane is consumed with its own prefetch and
+    concurrency limit.
+    """
+    exchange: str = "spt"
+    job_type: str
+    worker_id: str
+    prefetch: int = 1
+    concurrency: int = 1
+
+    @staticmethod
+    def make_routing_key(job_type: str, worker_id: str) -> str:
+        return f"{job_type}.{worker_id}"
+
+    @property
+    def routing_key(self) -> str:
+        return QueueLane.make_routing_key(self.job_type, self.worker_id)
+
+    @property
+    def queue_name(self) -> str:
+        return f"smi-requests.{self.routing_key}"
+
+def retry_delays() -> List[int]:
+    """
+    Backoff levels in seconds, QUEUE_RETRY_DELAY doubled until QUEUE_RETRY_MAX_DELAY.
+    Each level has its own delay queue, see declare_retry_topology.
+    """
+    delays = [QUEUE_RETRY_DELAY]
+    while delays[-1] * 2 < QUEUE_RETRY_MAX_DELAY:
+        delays.append(delays[-1] * 2)
+    if delays[-1] < QUEUE_RETRY_MAX_DELAY:
+        delays.append(QUEUE_RETRY_MAX_DELAY)
+    return delays
+
+def retry_delay(attempt: int) -> int:
+    delays = retry_delays()
+    return delays[min(attempt, len(delays) - 1)]
+
+def retry_exchange_name(delay: int) -> str:
+    return f"spt.retry.{delay}"
+
+async def declare_retry_topology(channel, dead_letter_exchange: str = "spt"):
+    """
+    Declares one fanout exchange and one TTL queue per backoff level.
+
+    A message published to `spt.retry.<delay>` keeps its routing key, waits
+    <delay> seconds in `smi-retry.<delay>` and is then dead-lettered back to
+    `dead_letter_exchange` with that same routing key, i.e. to its original lane.
+    Using one queue per level keeps every queue FIFO by expiration.
+    """
+    for delay in retry_delays():
+        exchange = await channel.declare_exchange(name=retry_exchange_name(delay), type="fanout", durable=True)
+        queue = await channel.declare_queue(name=f"smi-retry.{delay}", durable=True, arguments={
+            "x-message-ttl": delay * 1000,
+            "x-dead-letter-exchange": dead_letter_exchange,
+        })
+        await queue.bind(exchange)
 
 class RabbitMQConfig(BaseModel):
     host: str
@@ -359,3 +462,444 @@ class QueueMessageReceiver(QueueClient):
             self.channel_tag = None
         else:
             logger.error("Do not cancel a non-existing job")
+
+
+class AsyncQueueClient:
+    """
+    asyncio counterpart of QueueClient built on aio-pika.
+
+    Connecting, reconnecting and every channel operation are awaited, so the
+    client can be used from inside a running event loop (FastAPI handlers, jobs
+    receivers) without stalling it.
+    """
+    def __init__(self):
+        self.username = RABBITMQ_USER
+        self.password = RABBITMQ_PASSWORD
+        self.host = RABBITMQ_HOST
+        self.port = 5672
+        self.protocol = ""
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractRobustChannel] = None
+        self._lock = asyncio.Lock()
+
+    def _ssl_context(self) -> Optional[ssl.SSLContext]:
+        if self.protocol != "amqps":
+            return None
+        # SSL Context for TLS configuration of Amazon MQ for RabbitMQ
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+        ssl_context.set_ciphers("ECDHE+AESGCM:!ECDSA")
+        return ssl_context
+
+    async def _connect(self):
+        tries = 0
+        ssl_context = self._ssl_context()
+        while True:
+            try:
+                # connect_robust transparently restores the connection, channels
+                # and declared topology when the broker goes away
+                self.connection = await aio_pika.connect_robust(
+                    host=self.host,
+                    port=int(self.port),
+                    login=self.username,
+                    password=self.password,
+                    ssl=ssl_context is not None,
+                    ssl_context=ssl_context,
+                )
+                self.channel = await self.connection.channel()
+                return
+            except Exception as e:
+                tries += 1
+                if tries >= QUEUE_CONNECT_RETRIES:
+                    raise AMQPConnectionError(e)
+                logger.warning(f"RabbitMQ connection failed ({e}), retrying in {QUEUE_CONNECT_RETRY_DELAY} seconds")
+                await asyncio.sleep(QUEUE_CONNECT_RETRY_DELAY)
+
+    async def check_connection(self):
+        """
+        Opens the connection if it has never been opened or has been closed.
+
+        Concurrent callers share the same connection attempt.
+        """
+        async with self._lock:
+            if self.connection is None or self.connection.is_closed:
+                await self._connect()
+
+    async def close(self):
+        """
+        Closes the channel and the connection.
+        """
+        if self.channel is not None and not self.channel.is_closed:
+            await self.channel.close()
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+
+    async def declare_queue(
+        self, queue_name, exclusive: bool = False, max_priority: int = 10
+    ) -> aio_pika.abc.AbstractQueue:
+        """
+        Declares a queue with the specified name.
+
+        Args:
+            queue_name (str): The name of the queue.
+            exclusive (bool, optional): Whether the queue should be exclusive. Defaults to False.
+            max_priority (int, optional): The maximum priority for the queue. Defaults to 10.
+
+        Returns:
+            AbstractQueue: The declared queue.
+        """
+        await self.check_connection()
+        logger.debug(f"Trying to declare queue({queue_name})...")
+        return await self.channel.declare_queue(
+            name=queue_name,
+            exclusive=exclusive,
+            durable=True,
+            arguments={"x-max-priority": max_priority},
+        )
+
+    async def declare_exchange(self, exchange_name: str, exchange_type: str = "direct") -> aio_pika.abc.AbstractExchange:
+        """
+        Declares an exchange with the specified name and type.
+
+        Args:
+            exchange_name (str): The name of the exchange.
+            exchange_type (str, optional): The type of the exchange. Defaults to "direct".
+
+        Returns:
+            AbstractExchange: The declared exchange.
+        """
+        await self.check_connection()
+        return await self.channel.declare_exchange(
+            name=exchange_name, type=exchange_type
+        )
+
+    async def bind_queue(self, exchange_name: str, queue_name: str, routing_key: str):
+        """
+        Binds a queue to an exchange with the specified routing key.
+
+        Args:
+            exchange_name (str): The name of the exchange to bind the queue to.
+            queue_name (str): The name of the queue to bind.
+            routing_key (str): The routing key to use for the binding.
+
+        Returns:
+            None
+        """
+        await self.check_connection()
+        queue = await self.channel.get_queue(queue_name, ensure=False)
+        await queue.bind(exchange_name, routing_key=routing_key)
+
+    async def unbind_queue(self, exchange_name: str, queue_name: str, routing_key: str):
+        """
+        Unbinds a queue from an exchange with the specified routing key.
+
+        Args:
+            exchange_name (str): The name of the exchange to unbind the queue from.
+            queue_name (str): The name of the queue to unbind.
+            routing_key (str): The routing key used for the binding.
+
+        Returns:
+            None
+        """
+        await self.check_connection()
+        queue = await self.channel.get_queue(queue_name, ensure=False)
+        await queue.unbind(exchange_name, routing_key=routing_key)
+
+class AsyncQueueMessageSender(AsyncQueueClient):
+    def encode_message(self, body: Dict, encoding_type: str = "bytes"):
+        """
+        Encodes a dictionary into a message using the specified encoding type.
+
+        Args:
+            body (Dict): The dictionary to be encoded.
+            encoding_type (str, optional): The encoding type to use. Defaults to "bytes".
+
+        Returns:
+            bytes: The encoded message if the encoding type is "bytes".
+
+        Raises:
+            NotImplementedError: If the encoding type is not "bytes".
+        """
+        if encoding_type == "bytes":
+            return msgpack.packb(body)
+        else:
+            raise NotImplementedError
+
+    async def send_message(
+        self,
+        exchange_name: str,
+        routing_key: str,
+        body: Dict,
+        priority: Priority,
+        headers: Optional[Headers],
+    ):
+        """
+        Sends a message to the specified exchange with the given routing key, body, priority, and headers.
+
+        Args:
+            exchange_name (str): The name of the exchange to send the message to.
+            routing_key (str): The routing key for the message.
+            body (Dict): The body of the message as a dictionary.
+            priority (Priority): The priority of the message.
+            headers (Optional[Headers]): The headers for the message.
+
+        Returns:
+            None
+        """
+        await self.check_connection()
+        body = self.encode_message(body=body)
+        exchange = await self.channel.get_exchange(exchange_name, ensure=False)
+        await exchange.publish(
+            aio_pika.Message(
+                body=body,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                priority=priority.value,
+                headers=headers.model_dump() if headers is not None else None,
+            ),
+            routing_key=routing_key,
+        )
+        logger.debug(
+            f"Sent message. Exchange: {exchange_name}, Routing Key: {routing_key}, Body: {body[:128]}"
+        )
+
+class QueuePublisherPool(AsyncQueueMessageSender):
+    """
+    Process wide publisher sharing one robust connection between a pool of
+    channels opened with publisher confirms.
+
+    Topology (exchanges, queues) is registered once with `add_topology` and declared
+    when the connection is opened, the robust connection restoring it after a
+    reconnection, so a publish costs a single round trip: the message and its
+    confirmation. Each publish borrows its own channel from
+    the pool, which makes the pool safe to share between concurrent requests.
+    """
+    def __init__(self, size: int = QUEUE_PUBLISHER_POOL_SIZE):
+        super().__init__()
+        self.size = size
+        self.channels: Optional[Pool] = None
+        self.topologies: Dict[str, Callable[[aio_pika.abc.AbstractChannel], Awaitable[None]]] = {}
+
+    async def _connect(self):
+        await super()._connect()
+        self.channels = Pool(self._open_channel, max_size=self.size)
+        await self.declare_topology()
+
+    async def _open_channel(self) -> aio_pika.abc.AbstractChannel:
+        # a message routed to no queue fails its publish instead of being dropped
+        return await self.connection.channel(publisher_confirms=True, on_return_raises=True)
+
+    async def add_topology(self, name: str, declare: Callable[[aio_pika.abc.AbstractChannel], Awaitable[None]]):
+        """
+        Registers a topology declaration and runs it right away if the pool is already connected.
+
+        Args:
+            name (str): Unique name of the topology, registering the same name twice is a no-op.
+            declare (Callable): Coroutine declaring exchanges/queues on the given channel.
+
+        Returns:
+            None
+        """
+        if name in self.topologies:
+            return
+        self.topologies[name] = declare
+        if self.connection is not None and not self.connection.is_closed:
+            await declare(self.channel)
+
+    async def declare_topology(self):
+        """
+        Declares every registered topology on the pool control channel.
+        """
+        for name, declare in self.topologies.items():
+            logger.debug(f"Declaring topology {name}")
+            await declare(self.channel)
+
+    def build_message(self, body: Dict, priority: Priority, headers: Optional[Headers]) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=self.encode_message(body=body),
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            priority=priority.value,
+            headers=headers.model_dump() if headers is not None else None,
+        )
+
+    async def send_message(
+        self,
+        exchange_name: str,
+        routing_key: str,
+        body: Dict,
+        priority: Priority,
+        headers: Optional[Headers],
+    ):
+        """
+        Publishes a message and waits for the broker confirmation.
+
+        Args:
+            exchange_name (str): The name of the exchange to send the message to.
+            routing_key (str): The routing key for the message.
+            body (Dict): The body of the message as a dictionary.
+            priority (Priority): The priority of the message.
+            headers (Optional[Headers]): The headers for the message.
+
+        Returns:
+            None
+        """
+        await self.check_connection()
+        async with self.channels.acquire() as channel:
+            exchange = await channel.get_exchange(exchange_name, ensure=False)
+            await exchange.publish(self.build_message(body, priority, headers), routing_key=routing_key)
+        logger.debug(
+            f"Sent message. Exchange: {exchange_name}, Routing Key: {routing_key}")
+
+    async def close(self):
+        if self.channels is not None:
+            await self.channels.close()
+            self.channels = None
+        await super().close()
+
+_publisher_pools: Dict[asyncio.AbstractEventLoop, QueuePublisherPool] = {}
+
+def get_publisher_pool() -> QueuePublisherPool:
+    """
+    Returns the publisher pool of the running event loop, creating it on first use.
+
+    aio-pika connections are bound to the loop they were opened on, so there is
+    one pool per loop: a single one in the API process.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _publisher_pools:
+        _publisher_pools[loop] = QueuePublisherPool()
+    return _publisher_pools[loop]
+
+async def close_publisher_pool():
+    pool = _publisher_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+class AsyncQueueMessageReceiver(AsyncQueueClient):
+    def __init__(self):
+        super().__init__()
+        self.consumers: List[Tuple[aio_pika.abc.AbstractQueue, str]] = []
+        self._stopped: Optional[asyncio.Future] = None
+
+    def decode_message(self, body):
+        """
+        Decode the given message body.
+
+        Args:
+            body (bytes): The message body to decode.
+
+        Returns:
+            The decoded message.
+
+        Raises:
+            NotImplementedError: If the message body is not of type bytes.
+        """
+        if type(body) == bytes:
+            return msgpack.unpackb(body)
+        else:
+            raise NotImplementedError
+
+    async def consume_and_check_messages(self, queue: str, process_callback: Callable[[AbstractIncomingMessage], Any], condition_callback: Optional[Callable[[AbstractIncomingMessage], Any]] = None, auto_ack: bool = True, prefetch: Optional[int] = None, concurrency: Optional[int] = None, retry_callback: Optional[Callable[[AbstractIncomingMessage], Any]] = None) -> None:
+        """
+        Consumes messages from a queue until the consumer is cancelled.
+
+        Both callbacks are coroutines receiving the incoming message; they run on
+        the caller's event loop, so other coroutines keep running while a message
+        is being checked or processed. Several queues can be consumed at the same
+        time by awaiting this method once per queue (see asyncio.gather).
+
+        Parameters:
+            queue (str): The name of the queue to consume messages from.
+            process_callback (Callable): The coroutine to be called when a message is received.
+            condition_callback (Optional[Callable]): The coroutine to check if the message can be processed.
+            auto_ack (bool): Whether to automatically acknowledge messages.
+            prefetch (Optional[int]): Unacknowledged messages delivered at once, consumes on a dedicated channel when set.
+            concurrency (Optional[int]): Maximum number of messages processed at the same time.
+            retry_callback (Optional[Callable]): The coroutine deferring a message refused by condition_callback,
+                the message is acknowledged once it returns. Without it the message is requeued after QUEUE_RETRY_DELAY.
+
+        Returns:
+            None
+        """
+        await self.check_connection()
+
+        channel = self.channel
+        if prefetch is not None:
+            channel = await self.connection.channel()
+            await channel.set_qos(prefetch_count=prefetch)
+
+        limit = PrioritySemaphore(concurrency) if concurrency else None
+
+        async def handle(message: AbstractIncomingMessage) -> None:
+            # Check the condition if condition_callback is provided
+            if condition_callback and not await condition_callback(message):
+                if auto_ack:
+                    logger.info("Message does not meet the condition and is dropped")
+                elif retry_callback is not None:
+                    # Hand the message over to the delayed retry path and keep consuming
+                    await retry_callback(message)
+                    await message.ack()
+                else:
+                    logger.info(f"Message does not meet the condition and will not be acknowledged, trying again in {QUEUE_RETRY_DELAY} seconds")
+                    # Delay before rejecting and requeuing, without blocking the loop
+                    await asyncio.sleep(QUEUE_RETRY_DELAY)
+                    await message.reject(requeue=True)
+                return
+
+            # Process the message if condition passes or no condition is provided
+            try:
+                await process_callback(message)
+            except Exception as e:
+                logger.error(f"Failed to process message {message.delivery_tag} from {queue}: {e}")
+                if not auto_ack:
+                    await message.reject(requeue=False)
+                return
+            # Acknowledge on completion so the prefetch window bounds in-flight work
+            if not auto_ack:
+                await message.ack()
+
+        async def callback(message: AbstractIncomingMessage) -> None:
+            if limit is None:
+                await handle(message)
+                return
+            await limit.acquire(message.priority or 0)
+            try:
+                await handle(message)
+            finally:
+                limit.release()
+
+        consumed = await channel.get_queue(queue, ensure=False)
+        tag = await consumed.consume(callback, no_ack=auto_ack)
+        self.consumers.append((consumed, tag))
+        logger.debug(f" [*] Waiting for messages on {queue}. To exit press CTRL+C")
+        if self._stopped is None or self._stopped.done():
+            self._stopped = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._stopped)
+
+    async def consume_messages(self, queue, callback):
+        """
+        Consumes messages from a queue with automatic acknowledgement until the consumer is cancelled.
+
+        Parameters:
+            queue (str): The name of the queue to consume messages from.
+            callback (function): The coroutine to be called when a message is received.
+
+        Returns:
+            None
+        """
+        await self.consume_and_check_messages(queue=queue, process_callback=callback, auto_ack=True)
+
+    async def cancel_consumer(self):
+        """
+        Cancels every running consumer and releases the coroutines waiting in
+        consume_and_check_messages.
+
+        Returns:
+            None
+        """
+        if self.consumers:
+            for consumed, tag in self.consumers:
+                await consumed.cancel(tag)
+            self.consumers = []
+            if self._stopped is not None and not self._stopped.done():
+                self._stopped.set_result(None)
+        else:
+            logger.error("Do not cancel a non-existing job")
@@ -0,0 +1,203 @@
+import grpc
+import grpc.aio
+import asyncio
+import logging
+import random
+import socket
+import threading
+import time
+import generic_pb2
+from spt.jobs import Job
+from spt.services.client import GenericClient
+from config import BALANCER_RESOLVE_INTERVAL, BALANCER_MAX_FAILURES, BALANCER_EJECTION_TIME, BALANCER_MAX_EJECTION_TIME, BALANCER_PROBE_TIMEOUT
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+from rich.logging import RichHandler
+from rich.console import Console
+
+console = Console()
+
+logging.basicConfig(
+    level="INFO",
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(
+        console=console, rich_tracebacks=True, show_time=False)]
+)
+
+logger = logging.getLogger(__name__)
+
+# Status codes telling a replica is failing, rather than the request
+FAILURE_CODES = [grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.INTERNAL]
+
+T = TypeVar("T")
+
+class Endpoint:
+    """
+    One replica of a service with its load and its health.
+    """
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.client = GenericClient(address)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def suspect(self) -> bool:
+        """Ejected once and not proven healthy since."""
+        return self.failures >= BALANCER_MAX_FAILURES
+
+class ServiceBalancer:
+    """
+    Client of the replicas of a service, with the GenericClient interface.
+
+    Every call goes to the available replica with the least outstanding requests.
+    Replicas failing in a row are ejected for a growing time, then probed for a
+    connection before receiving requests again. When every replica is ejected
+    they are all used anyway rather than failing every request.
+    """
+    def __init__(self, addresses: str) -> None:
+        self.targets = [address.strip() for address in addresses.split(",") if address.strip()]
+        self.resolved: Dict[str, List[str]] = {target: [target] for target in self.targets}
+        self.endpoints: Dict[str, Endpoint] = {target: Endpoint(target) for target in self.targets}
+        self.resolved_at = 0.0
+        # endpoints are shared by the receivers threads of the jobs process
+        self.lock = threading.Lock()
+
+    @property
+    def replicas(self) -> int:
+        """Number of replicas not ejected, at least 1."""
+        now = time.time()
+        with self.lock:
+            return max(1, sum(1 for endpoint in self.endpoints.values() if endpoint.ejected_until <= now))
+
+    async def resolve(self):
+        """
+        Resolves the targets to one endpoint per address, keeping the load and health of the known ones.
+        A target failing to resolve keeps its previous addresses.
+        """
+        loop = asyncio.get_running_loop()
+        for target in self.targets:
+            host, port = target.rsplit(":", 1)
+            try:
+                infos = await loop.getaddrinfo(host, int(port), type=socket.SOCK_STREAM)
+            except OSError as e:
+                logger.error(f"Failed to resolve {target}: {e}")
+                continue
+            # one replica per address, IPv4 first so a dual stack host is not counted twice
+            ips = [info[4][0] for info in infos if info[0] == socket.AF_INET] or \
+                [f"[{info[4][0]}]" for info in infos if info[0] == socket.AF_INET6]
+            if ips:
+                self.resolved[target] = [f"{ip}:{port}" for ip in dict.fromkeys(ips)]
+
+        addresses = [address for target in self.targets for address in self.resolved[target]]
+        with self.lock:
+            if set(addresses) != set(self.endpoints.keys()):
+                logger.info(f"Replicas of {','.join(self.targets)}: {addresses}")
+            self.endpoints = {address: self.endpoints.get(address) or Endpoint(address) for address in addresses}
+
+    async def pick(self, exclude: Optional[List[str]] = None) -> Endpoint:
+        """
+        Reserves the available replica with the least outstanding requests.
+
+        Args:
+            exclude (List[str]): addresses of the replicas already tried for this request
+
+        Returns:
+            Endpoint: the replica, to be given back with release
+        """
+        exclude = exclude or []
+        if time.time() - self.resolved_at > BALANCER_RESOLVE_INTERVAL:
+            self.resolved_at = time.time()
+            await self.resolve()
+
+        while True:
+            now = time.time()
+            with self.lock:
+                endpoints = [endpoint for endpoint in self.endpoints.values() if endpoint.address not in exclude]
+                if not endpoints:
+                    raise RuntimeError(f"No replica of {','.join(self.targets)} left to try")
+                available = [endpoint for endpoint in endpoints if endpoint.ejected_until <= now] or endpoints
+                least = min(endpoint.outstanding for endpoint in available)
+                endpoint = random.choice([endpoint for endpoint in available if endpoint.outstanding == least])
+                endpoint.outstanding += 1
+
+            if not endpoint.suspect or endpoint.ejected_until > now:
+                return endpoint
+            # back from an ejection: probe it before trusting it with a request
+            if await endpoint.client.ready(BALANCER_PROBE_TIMEOUT):
+                return endpoint
+            self.release(endpoint, grpc.StatusCode.UNAVAILABLE)
+            exclude = exclude + [endpoint.address]
+
+    def release(self, endpoint: Endpoint, code: Optional[grpc.StatusCode]):
+        """
+        Gives back a replica reserved by pick, with the status code of its call,
+        None when the call did not complete.
+        """
+        with self.lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if code in FAILURE_CODES:
+                endpoint.failures += 1
+                if endpoint.failures >= BALANCER_MAX_FAILURES:
+                    endpoint.ejections += 1
+                    ejection = min(BALANCER_EJECTION_TIME * 2 ** (endpoint.ejections - 1), BALANCER_MAX_EJECTION_TIME)
+                    endpoint.ejected_until = time.time() + ejection
+                    logger.warning(f"Replica {endpoint.address} ejected for {ejection} seconds after {endpoint.failures} failures")
+            elif code == grpc.StatusCode.OK:
+                endpoint.failures = 0
+                endpoint.ejections = 0
+
+    async def _unary(self, call: Callable[[GenericClient], Awaitable[T]]) -> T:
+        tried: List[str] = []
+        while True:
+            endpoint = await self.pick(exclude=tried)
+            try:
+                result = await call(endpoint.client)
+            except grpc.RpcError as e:
+                self.release(endpoint, e.code())
+                tried.append(endpoint.address)
+                # the replica could not be reached, try another one
+                if e.code() == grpc.StatusCode.UNAVAILABLE and len(tried) < len(self.endpoints):
+                    logger.warning(f"Replica {endpoint.address} unavailable, retrying on another one")
+                    continue
+                raise
+            except BaseException:
+                self.release(endpoint, None)
+                raise
+            self.release(endpoint, grpc.StatusCode.OK)
+            return result
+
+    async def call_remote_function(self, remote_module: str, remote_function: str, payload: dict, response_model_class: str) -> dict:
+        return await self._unary(lambda client: client.call_remote_function(
+            remote_module, remote_function, payload, response_model_class))
+
+    async def process_data(self, job: Job, timeout: Optional[float] = None) -> generic_pb2.GenericResponse:
+        return await self._unary(lambda client: client.process_data(job, timeout))
+
+    async def process_data_stream(self, job: Job, timeout: Optional[float] = None) -> grpc.aio.UnaryStreamCall:
+        """
+        Starts the ProcessDataStream call of a job on a replica, released once the call is done.
+        Streams are not retried: the replica may already have sent partial results.
+        """
+        endpoint = await self.pick()
+        try:
+            call = await endpoint.client.process_data_stream(job, timeout)
+        except BaseException:
+            self.release(endpoint, None)
+            raise
+        call.add_done_callback(lambda call: asyncio.ensure_future(self._release_call(endpoint, call)))
+        return call
+
+    async def _release_call(self, endpoint: Endpoint, call: grpc.aio.Call):
+        self.release(endpoint, None if call.cancelled() else await call.code())
+
+    async def close(self):
+        """
+        Closes the channels of every replica opened on the running event loop.
+        """
+        with self.lock:
+            endpoints = list(self.endpoints.values())
+        for endpoint in endpoints:
+            await endpoint.client.close()
@@ -0,0 +1,56 @@
+from config import REDIS_HOST, REDIS_PORT
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import redis
+
+# Minimum seconds between two Redis checks of the same job
+CANCELLATION_CHECK_INTERVAL = 0.5
+
+# Id of the job served by the current gRPC request, set by GenericServiceServicer.
+# Context variables follow the request into tasks and asyncio.to_thread calls.
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+class JobCancelled(Exception):
+    """
+    Raised inside a worker when the job it runs was cancelled through the API.
+    """
+    def __init__(self, job_id: str) -> None:
+        super().__init__(f"Job {job_id} cancelled")
+        self.job_id = job_id
+
+_redis: Optional[redis.Redis] = None
+_checks: Dict[str, Tuple[float, bool]] = {}
+_lock = threading.Lock()
+
+def is_cancelled(job_id: str) -> bool:
+    """
+    Whether the job was cancelled, read from the {job_id}:cancelled flag set by
+    Jobs.cancel_job. Called at worker step boundaries, possibly from a thread
+    blocking the event loop, hence the blocking client and the rate limit.
+    """
+    global _redis
+    checked_at, cancelled = _checks.get(job_id, (0.0, False))
+    if cancelled or time.time() - checked_at < CANCELLATION_CHECK_INTERVAL:
+        return cancelled
+    with _lock:
+        if _redis is None:
+            _redis = redis.Redis(host=REDIS_HOST, port=int(REDIS_PORT), db=0)
+    try:
+        cancelled = bool(_redis.exists(f"{job_id}:cancelled"))
+    except redis.RedisError:
+        cancelled = False
+    _checks[job_id] = (time.time(), cancelled)
+    return cancelled
+
+def check_cancelled():
+    """
+    Raises JobCancelled when the job of the current request was cancelled.
+    """
+    job_id = current_job_id.get()
+    if job_id and is_cancelled(job_id):
+        raise JobCancelled(job_id)
+
+def forget(job_id: str):
+    _checks.pop(job_id, None)
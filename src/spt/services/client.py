@@ -1,9 +1,14 @@
 import grpc
+import grpc.aio
+import asyncio
 import logging
 import generic_pb2
 import generic_pb2_grpc
 from spt.jobs import Job
+from spt.services.transport import GRPC_OPTIONS, compression, should_upload, read_chunks
 import json
+from config import SERVICE_DEADLINE, SERVICE_FUNCTION_DEADLINE
+from typing import AsyncIterator, Dict, Optional
 from rich.logging import RichHandler
 from rich.console import Console
 
@@ -20,12 +25,49 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class GenericClient:
-    def __init__(self, host) -> None:
+    """
+    Asynchronous client of a GenericService, every call carries a deadline.
 
-        self.channel = grpc.insecure_channel(f'{host}')
-        self.stub = generic_pb2_grpc.GenericServiceStub(self.channel)
+    grpc.aio channels are bound to the event loop they are opened on, so like the
+    Redis clients there is one channel per event loop: the jobs process shares
+    its dispatcher between the receivers threads, each running its own loop.
+    """
+    def __init__(self, host: str, deadline: float = SERVICE_DEADLINE) -> None:
+        self.host = host
+        self.deadline = deadline
+        self.stubs: Dict[asyncio.AbstractEventLoop, generic_pb2_grpc.GenericServiceStub] = {}
+        self.channels: Dict[asyncio.AbstractEventLoop, grpc.aio.Channel] = {}
 
-    def call_remote_function(self, remote_module: str, remote_function: str, payload: dict, response_model_class:str)-> generic_pb2.GenericResponse:
+    @property
+    def stub(self) -> generic_pb2_grpc.GenericServiceStub:
+        loop = asyncio.get_running_loop()
+        if loop not in self.stubs:
+            self.channels[loop] = grpc.aio.insecure_channel(f'{self.host}', options=GRPC_OPTIONS, compression=compression())
+            self.stubs[loop] = generic_pb2_grpc.GenericServiceStub(self.channels[loop])
+        return self.stubs[loop]
+
+    async def close(self):
+        """
+        Closes the channel of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        self.stubs.pop(loop, None)
+        channel = self.channels.pop(loop, None)
+        if channel is not None:
+            await channel.close()
+
+    async def ready(self, timeout: float) -> bool:
+        """
+        Whether the channel of the running event loop connects to the service within timeout seconds.
+        """
+        self.stub
+        try:
+            await asyncio.wait_for(self.channels[asyncio.get_running_loop()].channel_ready(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def call_remote_function(self, remote_module: str, remote_function: str, payload: dict, response_model_class:str)-> dict:
         logger.info(
             f"[**] Execute remote function {remote_function} with payload: {payload}")
         request = generic_pb2.GenericRequest(
@@ -34,17 +76,68 @@ class GenericClient:
             remote_module = remote_module,
             response_model_class=response_model_class
         )
-        response = self.stub.ProcessData(request)
+        response = await self.stub.ProcessData(request, timeout=SERVICE_FUNCTION_DEADLINE)
         logger.info(f"Response with payload: {response.json_payload}")
         return json.loads(response.json_payload)
 
-    def process_data(self, job: Job) -> generic_pb2.GenericResponse:
+    async def process_data(self, job: Job, timeout: Optional[float] = None) -> generic_pb2.GenericResponse:
+        """
+        Runs the service request of a job.
+
+        Args:
+            job (Job): the job to run
+            timeout (Optional[float]): deadline of the call in seconds, the client deadline by default
+
+        Returns:
+            generic_pb2.GenericResponse: the service response
+        """
+        if should_upload(job.attachments):
+            response = None
+            async for response in await self.process_data_stream(job, timeout):
+                if response.final:
+                    break
+            if response is None or not response.final:
+                raise RuntimeError(f"Service ended the upload of job {job.id} without a final response")
+        else:
+            response = await self.stub.ProcessData(self._job_request(job), timeout=timeout or self.deadline)
+        logger.info(f"[**] Service response {response.response_model_class} ({len(response.result) or len(response.json_payload)} bytes)")
+        return response
+
+    async def process_data_stream(self, job: Job, timeout: Optional[float] = None) -> grpc.aio.UnaryStreamCall:
+        """
+        Starts the service request of a job through ProcessDataStream, or through ProcessDataUpload
+        when its attachments are files or too big for a single message.
+
+        Args:
+            job (Job): the job to run
+            timeout (Optional[float]): deadline of the whole call in seconds, the client deadline by default
+
+        Returns:
+            Union[grpc.aio.UnaryStreamCall, grpc.aio.StreamStreamCall]: the call, iterating the partial responses then the final one, and cancellable
+        """
+        if should_upload(job.attachments):
+            return self.stub.ProcessDataUpload(self._upload_requests(job), timeout=timeout or self.deadline)
+        return self.stub.ProcessDataStream(self._job_request(job), timeout=timeout or self.deadline)
+
+    async def _upload_requests(self, job: Job) -> AsyncIterator[generic_pb2.GenericUpload]:
+        """
+        The request of a job without its attachments, then their chunks one attachment after the other.
+        Files are read in a thread, so the loop keeps serving the other jobs meanwhile.
+        """
+        request = self._job_request(job, attachments=False)
+        yield generic_pb2.GenericUpload(request=request, attachments=len(job.attachments))
+        for index, attachment in enumerate(job.attachments):
+            chunks = read_chunks(attachment)
+            while chunk := await asyncio.to_thread(next, chunks, None):
+                yield generic_pb2.GenericUpload(attachment=index, chunk=chunk)
+
+    def _job_request(self, job: Job, attachments: bool = True) -> generic_pb2.GenericRequest:
         string_payload = json.dumps(job.payload)
         json_payload = string_payload.encode('utf-8')
         logger.info(
             f"[**] Execute service request Class {job.remote_class} Method {job.remote_method} keep_alive {job.keep_alive}  storage {job.storage} with payload: {json_payload}")
         
-        request = generic_pb2.GenericRequest(
+        return generic_pb2.GenericRequest(
             json_payload=json_payload, 
             remote_class=job.remote_class, 
             remote_method=job.remote_method, 
@@ -52,8 +145,6 @@ class GenericClient:
             response_model_class=job.response_model_class,
             worker_id=job.worker_id,
             storage=job.storage,
-            keep_alive=job.keep_alive)
-        
-        response = self.stub.ProcessData(request)
-        logger.info(f"[**] Service response with payload: {response.json_payload}")
-        return response
+            keep_alive=job.keep_alive,
+            job_id=job.id,
+            attachments=job.attachments if attachments else [])
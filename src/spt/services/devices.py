@@ -0,0 +1,232 @@
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+# Device of the worker being loaded or called, read by spt.utils.get_available_device
+current_device: ContextVar[Optional[str]] = ContextVar("current_device", default=None)
+
+class NvmlBackend:
+    """
+    Memory of the GPUs as reported by NVML, for every process using them.
+
+    Devices are indexed like CUDA numbers them, so index i is cuda:i: NVML enumerates
+    every GPU of the machine by PCI bus, CUDA only the CUDA_VISIBLE_DEVICES ones, in
+    the CUDA_DEVICE_ORDER set, fastest first by default. The GPUs are matched by the
+    UUIDs CUDA reports, or else by CUDA_VISIBLE_DEVICES when CUDA numbers them by PCI
+    bus too. Several GPUs that cannot be matched are not placed on.
+    """
+    def __init__(self) -> None:
+        self.handles: List = []
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            self.nvml = pynvml
+            self.handles = self.visible_handles()
+        except Exception as e:
+            logger.info(f"NVML unavailable, no GPU placement: {e}")
+
+    def visible_handles(self) -> List:
+        """
+        The NVML handles of the GPUs visible to CUDA, in the CUDA order.
+        """
+        handles = [self.nvml.nvmlDeviceGetHandleByIndex(i) for i in range(self.nvml.nvmlDeviceGetCount())]
+        uuids = [self.uuid(handle) for handle in handles]
+        cuda_uuids = self.cuda_uuids()
+        if cuda_uuids is not None and all(uuid in uuids for uuid in cuda_uuids):
+            return [handles[uuids.index(uuid)] for uuid in cuda_uuids]
+
+        selected = self.selected_handles(handles, uuids)
+        order = os.environ.get("CUDA_DEVICE_ORDER", "FASTEST_FIRST")
+        if order != "PCI_BUS_ID" and len(selected) > 1:
+            logger.error(f"Cannot match the GPUs numbered by CUDA_DEVICE_ORDER={order} with NVML, no GPU placement: "
+                         f"set CUDA_DEVICE_ORDER=PCI_BUS_ID")
+            return []
+        return selected
+
+    def cuda_uuids(self) -> Optional[List[str]]:
+        """
+        The UUIDs of the GPUs in the CUDA order, None when CUDA does not report them.
+        """
+        try:
+            import torch
+            if not torch.cuda.is_available():
+                return None
+            uuids = [str(torch.cuda.get_device_properties(i).uuid) for i in range(torch.cuda.device_count())]
+            return [uuid if uuid.startswith("GPU-") else f"GPU-{uuid}" for uuid in uuids]
+        except Exception as e:
+            logger.info(f"GPU UUIDs unavailable from CUDA: {e}")
+            return None
+
+    def selected_handles(self, handles: List, uuids: List[str]) -> List:
+        """
+        The handles CUDA_VISIBLE_DEVICES selects, in its order.
+        """
+        visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+        if visible is None:
+            return handles
+        selected = []
+        for entry in visible.split(","):
+            entry = entry.strip()
+            if not entry:
+                break
+            if entry.isdigit() and int(entry) < len(handles):
+                index = int(entry)
+            else:
+                # a UUID, possibly abbreviated, with or without its GPU- prefix
+                uuid = entry if entry.startswith("GPU-") else f"GPU-{entry}"
+                matches = [i for i, candidate in enumerate(uuids) if candidate.startswith(uuid)]
+                if len(matches) != 1:
+                    # CUDA ignores the devices after an invalid one
+                    logger.warning(f"Unknown device {entry!r} in CUDA_VISIBLE_DEVICES, ignoring it and the next ones")
+                    break
+                index = matches[0]
+            if handles[index] not in selected:
+                selected.append(handles[index])
+        return selected
+
+    def uuid(self, handle) -> str:
+        uuid = self.nvml.nvmlDeviceGetUUID(handle)
+        return uuid.decode("utf-8") if isinstance(uuid, bytes) else uuid
+
+    def device_count(self) -> int:
+        return len(self.handles)
+
+    def memory_gb(self, index: int) -> Tuple[float, float]:
+        """
+        Returns the free and the total memory of a GPU, in GB.
+        """
+        info = self.nvml.nvmlDeviceGetMemoryInfo(self.handles[index])
+        return info.free / GB, info.total / GB
+
+class FakeBackend:
+    """
+    GPUs with the given free and total memory, in GB, for tests and machines without NVML.
+    """
+    def __init__(self, devices: List[Tuple[float, float]]) -> None:
+        self.devices = list(devices)
+
+    def device_count(self) -> int:
+        return len(self.devices)
+
+    def memory_gb(self, index: int) -> Tuple[float, float]:
+        return self.devices[index]
+
+    def set_free(self, index: int, free_gb: float):
+        self.devices[index] = (free_gb, self.devices[index][1])
+
+class Placement:
+    """
+    A worker instance pinned to a GPU with the memory it is expected to hold there.
+    """
+    def __init__(self, worker_id: str, index: int, footprint_gb: float) -> None:
+        self.worker_id = worker_id
+        self.index = index
+        self.footprint_gb = footprint_gb
+        self.loaded = False
+
+    @property
+    def device(self) -> str:
+        return f"cuda:{self.index}"
+
+class DeviceAllocator:
+    """
+    Places the workers of a service on its GPUs.
+
+    A worker goes to the GPU with the most memory available that fits its footprint, or
+    the most available one when none fits. The memory available is the least of what NVML
+    reports free, which counts other processes, and of the total minus the footprints of
+    the workers placed there, which counts models loaded lazily on first call. Placements
+    still loading are not in the NVML figures yet and are subtracted from both, so
+    concurrent placements do not all pick the same GPU.
+    """
+    def __init__(self, backend=None) -> None:
+        self.backend = backend if backend is not None else NvmlBackend()
+        self.placements: List[Placement] = []
+        self.lock = threading.Lock()
+
+    def available_gb(self) -> Dict[int, float]:
+        """
+        Memory available for new workers on each GPU, in GB.
+        """
+        available = {}
+        for index in range(self.backend.device_count()):
+            free, total = self.backend.memory_gb(index)
+            placed = [placement for placement in self.placements if placement.index == index]
+            pending = sum(placement.footprint_gb for placement in placed if not placement.loaded)
+            reserved = sum(placement.footprint_gb for placement in placed)
+            available[index] = min(free - pending, total - reserved)
+        return available
+
+    def place(self, worker_id: str, footprint_gb: float) -> Optional[Placement]:
+        """
+        Pins a worker about to be loaded to a GPU.
+
+        Args:
+            worker_id (str): the worker
+            footprint_gb (float): the memory it is expected to hold, 0 when unknown
+
+        Returns:
+            Optional[Placement]: the placement, to be marked loaded then released, None without GPU
+        """
+        with self.lock:
+            available = self.available_gb()
+            if not available:
+                return None
+            fitting = [index for index, memory in available.items() if memory >= footprint_gb]
+            index = max(fitting or available.keys(), key=lambda index: available[index])
+            if not fitting:
+                logger.warning(f"No GPU has {footprint_gb:.2f}GB available for {worker_id}, placing it on the least loaded one")
+            placement = Placement(worker_id, index, footprint_gb)
+            self.placements.append(placement)
+            logger.info(f"Worker {worker_id} placed on {placement.device} ({available[index]:.2f}GB available, {footprint_gb:.2f}GB expected)")
+            return placement
+
+    def loaded(self, placement: Optional[Placement], footprint_gb: Optional[float] = None):
+        """
+        Marks a placed worker as loaded, NVML now reporting its memory, with its measured footprint.
+        """
+        if placement is None:
+            return
+        with self.lock:
+            placement.loaded = True
+            if footprint_gb is not None:
+                placement.footprint_gb = footprint_gb
+
+    def release(self, placement: Optional[Placement]):
+        """
+        Forgets a placement once its worker is unloaded or failed to load.
+        """
+        if placement is None:
+            return
+        with self.lock:
+            if placement in self.placements:
+                self.placements.remove(placement)
+
+    def best_device(self) -> Optional[str]:
+        """
+        The GPU with the most memory available, without placing anything, None without GPU.
+        """
+        with self.lock:
+            available = self.available_gb()
+        if not available:
+            return None
+        return f"cuda:{max(available.keys(), key=lambda index: available[index])}"
+
+_allocator: Optional[DeviceAllocator] = None
+_allocator_lock = threading.Lock()
+
+def get_allocator() -> DeviceAllocator:
+    """
+    Returns the device allocator of the process, shared by its services.
+    """
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = DeviceAllocator()
+        return _allocator
@@ -0,0 +1,73 @@
+from config import SERVICE_EXECUTOR_THREADS, SERVICE_WORKER_CONCURRENCY
+from spt.models.workers import WorkerConfigs
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, TypeVar, Union
+import asyncio
+import contextvars
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class WorkerExecutor:
+    """
+    Runs the worker calls of a service on dedicated threads, so inference blocking a
+    worker does not block the gRPC event loop: other requests, the instances cleanup
+    and the partial results keep being served meanwhile.
+
+    Each thread runs the worker coroutines on its own event loop. The calls of one
+    worker are limited to its service_concurrency, while other workers run in parallel.
+    """
+    def __init__(self, threads: int = SERVICE_EXECUTOR_THREADS) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="worker")
+        self.limits: Dict[str, asyncio.Semaphore] = {}
+        self.local = threading.local()
+        self.worker_configs = WorkerConfigs.get_configs().workers_configs
+
+    def concurrency(self, worker_id: str) -> int:
+        config = self.worker_configs.get(worker_id)
+        if config is not None and config.service_concurrency:
+            return config.service_concurrency
+        return SERVICE_WORKER_CONCURRENCY
+
+    async def run(self, worker_id: str, func: Callable[..., Union[Awaitable[T], T]], *args: Any) -> T:
+        """
+        Runs a worker call on the executor once the worker is below its concurrency limit.
+
+        Args:
+            worker_id (str): the worker the call belongs to
+            func (Callable): the call, a coroutine function or a blocking function
+            *args: the arguments of the call
+
+        Returns:
+            T: the result of the call
+        """
+        if worker_id not in self.limits:
+            self.limits[worker_id] = asyncio.Semaphore(self.concurrency(worker_id))
+        limit = self.limits[worker_id]
+        await limit.acquire()
+
+        loop = asyncio.get_running_loop()
+        # the job id and the result stream of the request follow the call into the thread
+        context = contextvars.copy_context()
+        try:
+            future = self.pool.submit(context.run, self._call, func, *args)
+        except BaseException:
+            limit.release()
+            raise
+        # a cancelled request does not stop a running call: the worker holds
+        # its slot until it notices the cancellation and returns
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(limit.release))
+        return await asyncio.wrap_future(future)
+
+    def _call(self, func: Callable[..., Union[Awaitable[T], T]], *args: Any) -> T:
+        if not asyncio.iscoroutinefunction(func):
+            return func(*args)
+        if getattr(self.local, "loop", None) is None:
+            self.local.loop = asyncio.new_event_loop()
+        return self.local.loop.run_until_complete(func(*args))
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
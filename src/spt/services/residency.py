@@ -0,0 +1,293 @@
+from config import SERVICE_MEMORY_BUDGET_GB, SERVICE_WORKER_INSTANCES
+from spt.models.workers import WorkerConfigs
+from spt.models.remotecalls import ResidencyInfo
+from spt.services.devices import DeviceAllocator, Placement, current_device, get_allocator
+from typing import Callable, Dict, List, Optional
+import gc
+import logging
+import os
+import threading
+import time
+import torch
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+def gpu_available() -> bool:
+    return torch.cuda.is_available()
+
+def memory_used_gb() -> float:
+    """
+    Memory held by this process: allocated on its GPUs, or resident in RAM without GPU.
+    """
+    if gpu_available():
+        return sum(torch.cuda.memory_allocated(i) for i in range(torch.cuda.device_count())) / GB
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / GB
+
+def memory_total_gb() -> float:
+    """
+    Memory of the devices of this process: its GPUs, or the RAM without GPU.
+    """
+    if gpu_available():
+        return sum(torch.cuda.get_device_properties(i).total_memory for i in range(torch.cuda.device_count())) / GB
+    return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / GB
+
+class Resident:
+    """
+    A loaded instance of a worker with its measured footprint and its use.
+    """
+    def __init__(self, worker_id: str, worker, footprint_gb: float, placement: Optional[Placement] = None) -> None:
+        self.worker_id = worker_id
+        self.worker = worker
+        self.footprint_gb = footprint_gb
+        self.placement = placement
+        self.in_use = False
+        self.last_used = time.time()
+
+class ResidencyManager:
+    """
+    Keeps the workers of a service loaded within a memory budget.
+
+    Each worker has a pool of instances, used by one call at a time. A call takes a free
+    instance, or loads one more while the pool is below max_instances and no load of the
+    worker is in progress, or else waits for an instance to be free: a burst of first
+    calls loads the worker once. Instances stay resident for as long as the budget
+    allows, whatever their idle time. Loading one that does not fit unloads the least
+    recently used idle instances first, only as many as needed and never below the
+    min_instances of their worker.
+
+    Footprints are measured: the memory grown by the loading, then the memory held once
+    no call runs, for workers loading their models lazily on first call. A worker
+    declaring a memory_footprint_gb is never estimated below it.
+    """
+    def __init__(self, budget_gb: float = SERVICE_MEMORY_BUDGET_GB, devices: Optional[DeviceAllocator] = None) -> None:
+        # pins each instance to a GPU, see spt.services.devices
+        self.devices = devices if devices is not None else get_allocator()
+        self.budget_gb = budget_gb or memory_total_gb()
+        self.baseline_gb = memory_used_gb()
+        self.residents: List[Resident] = []
+        self.loading: Dict[str, int] = {}
+        self.footprints: Dict[str, float] = {}
+        self.worker_configs = WorkerConfigs.get_configs().workers_configs
+        # called with the id of every unloaded worker, from the thread unloading it
+        self.on_evict: List[Callable[[str], None]] = []
+        # workers are acquired from the executor threads, waiting for a free instance
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        # one load at a time, so the memory it grows is its own
+        self.load_lock = threading.Lock()
+        logger.info(f"[*] Workers memory budget {self.budget_gb:.2f}GB ({'GPU' if gpu_available() else 'RAM'})")
+
+    @property
+    def used_gb(self) -> float:
+        return sum(resident.footprint_gb for resident in self.residents)
+
+    def pool(self, worker_id: str) -> List[Resident]:
+        return [resident for resident in self.residents if resident.worker_id == worker_id]
+
+    def min_instances(self, worker_id: str) -> int:
+        config = self.worker_configs.get(worker_id)
+        return config.min_instances if config is not None else 0
+
+    def is_resident(self, worker_id: str) -> bool:
+        with self.lock:
+            return bool(self.pool(worker_id)) or bool(self.loading.get(worker_id))
+
+    def evictable(self) -> List[Resident]:
+        """
+        The idle instances make_room may unload, those beyond the min_instances of their worker.
+        """
+        evictable = []
+        for worker_id in {resident.worker_id for resident in self.residents}:
+            pool = self.pool(worker_id)
+            idle = sorted((resident for resident in pool if not resident.in_use), key=lambda resident: resident.last_used)
+            evictable += idle[:max(0, len(pool) - self.min_instances(worker_id))]
+        return evictable
+
+    def available_gb(self) -> Optional[float]:
+        """
+        Memory a worker can be loaded in once the idle instances are unloaded, on the GPU
+        offering the most and within the budget, None without GPU.
+        """
+        with self.lock:
+            with self.devices.lock:
+                devices = self.devices.available_gb()
+            if not devices:
+                return None
+            evictable = self.evictable()
+            for resident in evictable:
+                if resident.placement is not None and resident.placement.index in devices:
+                    devices[resident.placement.index] += resident.footprint_gb
+            budget = self.budget_gb - self.used_gb + sum(resident.footprint_gb for resident in evictable)
+            return min(max(devices.values()), budget)
+
+    def fits(self, worker_id: str) -> bool:
+        """
+        Whether a worker can be loaded now without unloading any other.
+        """
+        with self.lock:
+            return not self.loading and self.used_gb + self.estimate(worker_id) <= self.budget_gb
+
+    def max_instances(self, worker_id: str) -> int:
+        config = self.worker_configs.get(worker_id)
+        if config is not None and config.max_instances:
+            return config.max_instances
+        return SERVICE_WORKER_INSTANCES
+
+    def estimate(self, worker_id: str) -> float:
+        """
+        Footprint expected of a worker before loading it: measured by a previous load, at least the configured one.
+        """
+        config = self.worker_configs.get(worker_id)
+        configured = config.memory_footprint_gb if config is not None and config.memory_footprint_gb else 0.0
+        return max(self.footprints.get(worker_id, 0.0), configured)
+
+    def acquire(self, worker_id: str, load: Callable[[], object]):
+        """
+        Returns a free instance of a worker, loading it when needed, in use until release.
+
+        Args:
+            worker_id (str): the worker to use
+            load (Callable): creates an instance of the worker
+
+        Returns:
+            Worker: the instance
+        """
+        with self.available:
+            while True:
+                free = [resident for resident in self.pool(worker_id) if not resident.in_use]
+                if free:
+                    resident = max(free, key=lambda resident: resident.last_used)
+                    resident.in_use = True
+                    resident.last_used = time.time()
+                    return resident.worker
+                loading = self.loading.get(worker_id, 0)
+                if not loading and len(self.pool(worker_id)) < self.max_instances(worker_id):
+                    self.loading[worker_id] = 1
+                    break
+                # an instance is loading or busy, use it once available
+                self.available.wait()
+
+        try:
+            with self.load_lock:
+                self.make_room(self.estimate(worker_id))
+                placement = self.devices.place(worker_id, self.estimate(worker_id))
+                # the worker loads on the device of its placement
+                token = current_device.set(placement.device if placement is not None else None)
+                try:
+                    before = memory_used_gb()
+                    worker = load()
+                    footprint = max(memory_used_gb() - before, self.estimate(worker_id))
+                except BaseException:
+                    self.devices.release(placement)
+                    raise
+                finally:
+                    current_device.reset(token)
+                self.devices.loaded(placement, footprint)
+            with self.lock:
+                resident = Resident(worker_id, worker, footprint, placement)
+                resident.in_use = True
+                self.residents.append(resident)
+                self.footprints[worker_id] = footprint
+                instances = len(self.pool(worker_id))
+            logger.info(f"  [-] Worker {worker_id} instance {instances} resident ({footprint:.2f}GB, {self.used_gb:.2f}/{self.budget_gb:.2f}GB used)")
+            # it may have grown beyond its estimate
+            self.make_room(0.0)
+            return worker
+        finally:
+            with self.available:
+                self.loading.pop(worker_id, None)
+                self.available.notify_all()
+
+    def release(self, worker):
+        """
+        Gives back an instance acquired with acquire once its call is done.
+        """
+        with self.available:
+            resident = next((resident for resident in self.residents if resident.worker is worker), None)
+            if resident is None:
+                return
+            resident.in_use = False
+            resident.last_used = time.time()
+            self.available.notify_all()
+            if any(other.in_use for other in self.residents) or self.loading:
+                return
+            # nothing runs: what the residents hold beyond the others is this one's, models loaded lazily included
+            others = sum(other.footprint_gb for other in self.residents if other is not resident)
+            measured = memory_used_gb() - self.baseline_gb - others
+            if measured > resident.footprint_gb + 0.01:
+                logger.info(f"  [-] Worker {resident.worker_id} footprint measured at {measured:.2f}GB")
+                resident.footprint_gb = measured
+                self.footprints[resident.worker_id] = measured
+                self.devices.loaded(resident.placement, measured)
+
+    def make_room(self, needed_gb: float):
+        """
+        Unloads the least recently used idle instances until needed_gb more fit in the budget.
+        """
+        while True:
+            with self.lock:
+                if self.used_gb + needed_gb <= self.budget_gb:
+                    return
+                idle = self.evictable()
+                if not idle:
+                    logger.warning(f"  [-] {needed_gb:.2f}GB needed over the {self.budget_gb:.2f}GB budget, {self.used_gb:.2f}GB held by busy or minimum instances")
+                    return
+                victim = min(idle, key=lambda resident: resident.last_used)
+                self.residents.remove(victim)
+            self.unload(victim)
+
+    def unload(self, resident: Resident):
+        logger.info(f"  [-] Unloading worker {resident.worker_id} ({resident.footprint_gb:.2f}GB, idle since {time.time() - resident.last_used:.0f} seconds)")
+        try:
+            resident.worker.stop()
+            resident.worker.cleanup()
+        except Exception as e:
+            logger.error(f"  [-] Failed to clean up worker {resident.worker_id}: {e}")
+        del resident.worker
+        self.devices.release(resident.placement)
+        gc.collect()
+        if gpu_available():
+            torch.cuda.empty_cache()
+        for callback in self.on_evict:
+            callback(resident.worker_id)
+
+    def unload_all(self):
+        with self.lock:
+            residents = [resident for resident in self.residents if not resident.in_use]
+            for resident in residents:
+                self.residents.remove(resident)
+        for resident in residents:
+            self.unload(resident)
+
+    def report(self) -> str:
+        with self.lock:
+            residents = ", ".join(f"{resident.worker_id} {resident.footprint_gb:.2f}GB{' busy' if resident.in_use else ''}"
+                                  for resident in self.residents)
+            return f"{self.used_gb:.2f}/{self.budget_gb:.2f}GB used by {len(self.residents)} workers: {residents}"
+
+_residency: Optional[ResidencyManager] = None
+_residency_lock = threading.Lock()
+
+def get_residency() -> ResidencyManager:
+    """
+    Returns the residency manager of the process, shared by its services.
+    """
+    global _residency
+    with _residency_lock:
+        if _residency is None:
+            _residency = ResidencyManager()
+        return _residency
+
+def residency_infos() -> ResidencyInfo:
+    """
+    Remote function reporting the memory of the service to the dispatcher admitting its jobs.
+    """
+    residency = get_residency()
+    with residency.lock:
+        resident = sorted({resident.worker_id for resident in residency.residents})
+        used_gb = residency.used_gb
+    return ResidencyInfo(available_gb=residency.available_gb(), budget_gb=residency.budget_gb,
+                         used_gb=used_gb, resident=resident)
@@ -1,4 +1,11 @@
-from spt.models.remotecalls import MethodCallRequest, string_to_class, MethodCallError, string_to_module
+from spt.models.remotecalls import MethodCallRequest, string_to_class, class_to_string, MethodCallError, string_to_module
+from spt.models.envelope import pack_result, bind_attachments
+from spt.services.cancellation import current_job_id, JobCancelled, forget
+from spt.services.streaming import ResultStream, current_stream
+from spt.services.transport import GRPC_OPTIONS, compression, spool
+from spt.services.executor import WorkerExecutor
+from spt.services.residency import get_residency
+from spt.services.warmup import WarmPool
 from spt.models.jobs import JobStatuses
 from spt.jobs import JobsTypes
 import asyncio
@@ -13,7 +20,7 @@ import argparse
 import traceback
 from rich.logging import RichHandler
 from rich.console import Console
-from typing import Dict, Tuple, Any
+from typing import AsyncIterator, BinaryIO, Dict, List, Set, Tuple, Any, Union
 
 console = Console()
 logging.basicConfig(
@@ -29,14 +36,26 @@ class GenericServiceServicer(generic_pb2_grpc.GenericServiceServicer):
     def __init__(self, type: JobsTypes) -> None:
         super().__init__()
         self.type: JobsTypes = type
-        # Stores instances with their expiration time
-        self.instances: Dict[Tuple[str, str, str], Tuple[Any, float]] = {}
+        # Stores instances, they keep no model: workers are resident in the servicer
+        self.instances: Dict[Tuple[str, str, str], Any] = {}
+        # runs the worker calls and keeps the workers loaded, shared by the instances
+        # so the limits and the memory budget apply per worker and per service
+        self.executor = WorkerExecutor()
+        self.residency = get_residency()
+        # preloads the warm set, reloading it after evictions
+        self.warm_pool = WarmPool(self)
         logger.info("[*] Initialized Stateless Servicer")
 
     async def ProcessData(self, request: generic_pb2.GenericRequest, context: grpc.aio.ServicerContext) -> generic_pb2.GenericResponse:
+        return await self.process(request, list(request.attachments))
+
+    async def process(self, request: generic_pb2.GenericRequest, attachments: List[Union[bytes, BinaryIO]]) -> generic_pb2.GenericResponse:
+        """
+        Serves a request whose attachments are given apart, bytes or files of an upload.
+        """
         await asyncio.sleep(0)  # Yield control to support concurrency
         try:
-            payload: dict = json.loads(request.json_payload.decode('utf-8'))
+            payload: dict = bind_attachments(json.loads(request.json_payload.decode('utf-8')), attachments)
             remote_class: str = request.remote_class
             remote_method: str = request.remote_method
             request_model_class: str = request.request_model_class
@@ -46,6 +65,7 @@ class GenericServiceServicer(generic_pb2_grpc.GenericServiceServicer):
             storage: str = request.storage
             keep_alive: int = request.keep_alive
             worker_id: str = request.worker_id
+            current_job_id.set(request.job_id or None)
             payload = {
                 'payload': payload,
                 'remote_class': remote_class,
@@ -65,39 +85,103 @@ class GenericServiceServicer(generic_pb2_grpc.GenericServiceServicer):
 
             if 'remote_function' in payload and payload['remote_function']:
                 response = await self.execute_function(payload)
+                response = response.model_dump_json().encode('utf-8')
+                return generic_pb2.GenericResponse(json_payload=response, response_model_class=payload['response_model_class'])
             else:
-                if instance_key not in self.instances or self.instances[instance_key][1] < asyncio.get_event_loop().time():
-                    class_ = string_to_class(payload['remote_class'])
-                    instance = class_(self)
-                    self.instances[instance_key] = (
-                        instance, asyncio.get_event_loop().time() + keep_alive * 60)
-                    if hasattr(instance, 'set_storage'):
-                        instance.set_storage(storage)
-                    if hasattr(instance, 'set_keep_alive'):
-                        instance.set_keep_alive(keep_alive)
-                    if hasattr(instance, 'set_logger'):
-                        instance.set_logger(logger)
-                else:
-                    instance, expiration = self.instances[instance_key]
-                    self.instances[instance_key] = (
-                        instance, asyncio.get_event_loop().time() + keep_alive * 60)  # Reset expiration
-                    if hasattr(instance, 'set_keep_alive'):
-                        instance.set_keep_alive(keep_alive)
+                instance = self.get_instance(instance_key, keep_alive)
 
                 response = await self.execute_method(instance, payload)
 
-            response = response.model_dump_json().encode('utf-8')
-            return generic_pb2.GenericResponse(json_payload=response, response_model_class=payload['response_model_class'])
+            # binary fields travel as raw bytes in the envelope, not as base64 JSON
+            return generic_pb2.GenericResponse(result=pack_result(response), response_model_class=payload['response_model_class'])
 
+        except JobCancelled as e:
+            logger.info(f"[*] {str(e)}")
+            error = MethodCallError(message=str(e), status=JobStatuses.cancelled, error="")
+            return generic_pb2.GenericResponse(json_payload=error.model_dump_json().encode("utf-8"), response_model_class=class_to_string(MethodCallError))
         except (ValidationError, ValueError) as e:
             logger.error(f"Validation error processing data: {str(e)}")
             error = MethodCallError(message=f"Failed to process request due to validation error: {str(e)}", status=JobStatuses.failed, error=traceback.format_exc())
-            return generic_pb2.GenericResponse(json_payload=error.model_dump_json().encode("utf-8"), response_model_class="MethodCallError")
+            return generic_pb2.GenericResponse(json_payload=error.model_dump_json().encode("utf-8"), response_model_class=class_to_string(MethodCallError))
         except Exception as e:
             logger.error(f"Error processing data: {traceback.format_exc()}")
             error = MethodCallError(
                 message=f"Failed to process request due to: {str(e)}", status=JobStatuses.failed, error=traceback.format_exc())
-            return generic_pb2.GenericResponse(json_payload=error.model_dump_json().encode("utf-8"), response_model_class="MethodCallError")
+            return generic_pb2.GenericResponse(json_payload=error.model_dump_json().encode("utf-8"), response_model_class=class_to_string(MethodCallError))
+        finally:
+            if request.job_id:
+                forget(request.job_id)
+
+    async def ProcessDataStream(self, request: generic_pb2.GenericRequest, context: grpc.aio.ServicerContext):
+        """
+        Serves the request like ProcessData, yielding the partial results the worker
+        emits while it runs before the final response, the only one with final set.
+        """
+        async for response in self.stream(request, list(request.attachments)):
+            yield response
+
+    async def ProcessDataUpload(self, request_iterator: AsyncIterator[generic_pb2.GenericUpload], context: grpc.aio.ServicerContext):
+        """
+        Serves a request uploaded in chunks like ProcessDataStream. Each attachment is
+        assembled in a spooled file, on disk once big, handed to the worker as a file.
+        """
+        request = None
+        files: List[BinaryIO] = []
+        try:
+            async for upload in request_iterator:
+                if request is None:
+                    request = upload.request
+                    files = [spool() for _ in range(upload.attachments)]
+                    continue
+                if not 0 <= upload.attachment < len(files):
+                    await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"Unknown attachment {upload.attachment} of {len(files)}")
+                files[upload.attachment].write(upload.chunk)
+            if request is None:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Upload without a request")
+            for file in files:
+                file.seek(0)
+            logger.info(f"[*] Received upload of job {request.job_id} with {len(files)} attachments")
+            async for response in self.stream(request, files):
+                yield response
+        finally:
+            for file in files:
+                file.close()
+
+    async def stream(self, request: generic_pb2.GenericRequest, attachments: List[Union[bytes, BinaryIO]]) -> AsyncIterator[generic_pb2.GenericResponse]:
+        stream = ResultStream()
+        current_stream.set(stream)
+        # the task copies the context, so the worker emits into this stream
+        task = asyncio.create_task(self.process(request, attachments))
+        task.add_done_callback(lambda _: stream.close())
+        try:
+            async for chunk in stream:
+                yield generic_pb2.GenericResponse(result=pack_result(chunk), response_model_class=class_to_string(type(chunk)), final=False)
+            response = await task
+            response.final = True
+            yield response
+        finally:
+            # the client went away, stop serving it
+            if not task.done():
+                task.cancel()
+
+    def get_instance(self, instance_key: Tuple[str, str, str], keep_alive: int) -> Any:
+        """
+        Returns the instance of a remote class serving a method with a storage, created on first use.
+        """
+        remote_class, _, storage = instance_key
+        if instance_key not in self.instances:
+            class_ = string_to_class(remote_class)
+            instance = class_(self)
+            self.instances[instance_key] = instance
+            if hasattr(instance, 'set_storage'):
+                instance.set_storage(storage)
+            if hasattr(instance, 'set_logger'):
+                instance.set_logger(logger)
+        else:
+            instance = self.instances[instance_key]
+        if hasattr(instance, 'set_keep_alive'):
+            instance.set_keep_alive(keep_alive)
+        return instance
 
     async def execute_function(self, payload: dict) -> BaseModel:
         module = string_to_module(payload['remote_module'])
@@ -113,42 +197,35 @@ class GenericServiceServicer(generic_pb2_grpc.GenericServiceServicer):
         result = await method(arg) if asyncio.iscoroutinefunction(method) else method(arg)
         return result
 
-    async def cleanup_expired_instances(self) -> None:
-        """ Cleanup expired instances periodically """
+    async def report_workers(self) -> None:
+        """ Reports the resident workers periodically """
         while True:
-            logger.info("  [*] Checking up expired instances...")
-            current_time = asyncio.get_event_loop().time()
-            expired_keys = [
-                key for key, (inst, exp) in self.instances.items() if exp < current_time]
-            logger.info(f"    [*] Found {len(expired_keys)} expired instances:")
-            for key in expired_keys:
-                inst, _ = self.instances.pop(key)
-                logger.info(f"  [*] Cleaning up expired instance: {key}")
-                if hasattr(inst, 'cleanup'):
-                    inst.cleanup()
-
-            running_keys = [
-                key for key, (inst, exp) in self.instances.items() if exp > current_time]
-            logger.info(f"    [*] Found {len(running_keys)} running instances:")
-
-            for key in running_keys:
-                inst, _ = self.instances[key]
-                if hasattr(inst, 'decrease_keep_alive'):
-                    inst.decrease_keep_alive()
-                if hasattr(inst, 'check_workers'):
-                    inst.check_workers()
-            await asyncio.sleep(60)  # Cleanup every minute
+            for instance in list(self.instances.values()):
+                if hasattr(instance, 'check_workers'):
+                    instance.check_workers()
+                    break
+            await asyncio.sleep(60)  # Report every minute
 
 async def serve(max_workers: int = 10, host: str = "localhost", port: int = 50051, type: JobsTypes = JobsTypes.unknown):
-    server = grpc.aio.server(ThreadPoolExecutor(max_workers=max_workers))
+    server = grpc.aio.server(ThreadPoolExecutor(max_workers=max_workers), options=GRPC_OPTIONS, compression=compression())
     service = GenericServiceServicer(type)
     generic_pb2_grpc.add_GenericServiceServicer_to_server(service, server)
     server.add_insecure_port(f"{host}:{port}")
     await server.start()
     logger.info(f"Service started. Listening on {host}:{port} type {type}")
-    # Start cleanup task for expired instances
-    asyncio.create_task(service.cleanup_expired_instances())
-    await server.wait_for_termination()
+    # Start reporting the resident workers and warming up the warm set
+    tasks: Set[asyncio.Task] = set()
+    for coroutine in [service.report_workers(), service.warm_pool.run()]:
+        task = asyncio.create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    try:
+        await server.wait_for_termination()
+    finally:
+        for task in list(tasks):
+            task.cancel()
+        service.executor.shutdown()
+        service.residency.unload_all()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
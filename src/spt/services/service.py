@@ -6,13 +6,62 @@ from spt.storage import Storage
 from spt.models.workers import WorkerConfigs, WorkerConfig
 from spt.services.worker import Worker
 from spt.services.server import GenericServiceServicer
+from spt.services.streaming import emit_chunk
+from spt.services.devices import current_device
+from spt.models.remotecalls import string_to_class
 import asyncio
 from pydantic import BaseModel, ValidationError
 import importlib
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Awaitable
 from spt.utils import find_free_port, get_ip
 
+class RequestBatcher:
+    """
+    Coalesces the requests submitted for one worker within a small window
+    (batch_delay milliseconds or batch_size requests, whichever comes first)
+    into a single call of `handler`, then fans the results back out to the callers.
+    """
+    def __init__(self, handler: Callable[[List[BaseModel]], Awaitable[List[BaseModel]]], batch_size: int, batch_delay: int) -> None:
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay / 1000
+        self.pending: List[Tuple[BaseModel, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # the batches running, referenced until done so they are not collected
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, request: BaseModel) -> BaseModel:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((request, future))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.batch_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: List[Tuple[BaseModel, asyncio.Future]]):
+        try:
+            results = await self.handler([request for request, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
 class Service:
     def __init__(self, servicer: GenericServiceServicer) -> None:
         self.servicer: GenericServiceServicer = servicer
@@ -21,78 +70,101 @@ class Service:
         self.storage: Optional[Storage] = None
         self.workers: Dict[str, Worker] = {}
         self.worker_configs: WorkerConfig = WorkerConfigs.get_configs().workers_configs
-        self.instances: List[Worker] = []
+        self.batchers: Dict[str, RequestBatcher] = {}
         self.logger: logging.Logger = None
     
     def set_logger(self, logger: logging.Logger):
         self.logger = logger
 
     def check_workers(self):
-        self.logger.info(f"  [-] Service Check {len(self.instances)}# Workers...")
-        for worker in self.instances[:]:  # Iterate over a copy of the list
-            if worker.get_status() == WorkerState.idle:
-                self.logger.info(f"    [-] Garbaging worker idle {worker.id}")
-                worker.stop()
-                worker.cleanup()
-                self.instances.remove(worker)
-            else:
-                self.logger.info(f"    [-] Worker {worker.id} with status {worker.get_status()} is still alive since {worker.get_duration()} seconds")
-                if worker.get_duration() > self.keep_alive * 60:
-                    self.logger.info(f"    [-] Stopping worker {worker.id} due to long run time")
-                    worker.stop()
-                    worker.cleanup()
-                    self.instances.remove(worker)
+        self.logger.info(f"  [-] Service workers {self.servicer.residency.report()}")
 
     def cleanup(self):
-        self.logger.info(f"  [-] Service Cleanup {self.keep_alive} minutes left")
-        for worker in self.instances[:]:  # Iterate over a copy of the list
-            if worker.get_status() == WorkerState.idle:
-                self.logger.info(f"    [-] Cleaning up IDLE worker: {worker.id}")
-                worker.cleanup()
-                self.instances.remove(worker)
-            elif worker.get_status() == WorkerState.working or worker.get_status() == WorkerState.streaming:
-                self.logger.info(f"    [-] Stopping worker {worker.id} due to long run time")
-                worker.stop()
-                worker.cleanup()
-                self.instances.remove(worker)
+        # workers are resident in the servicer, unloaded only to make room, see spt.services.residency
+        self.logger.info(f"  [-] Service Cleanup, workers stay resident")
 
     def chunked_request(self, request: Any):
-        self.logger.info(f"Chunked request: {request}")
+        if not emit_chunk(request):
+            self.logger.debug(f"Chunked request not streamed: {request}")
 
     async def get_worker(self, worker_id: str) -> Worker:
+        """
+        Returns a free instance of the worker from its pool, loaded when needed, in use until release_worker.
+        """
         try:
             if (worker_id not in self.worker_configs):
                 raise ValueError(
                     f'  [-] Worker class for model {worker_id} not found')
-
-            worker_info:WorkerConfig = self.worker_configs[worker_id]
-
-            # Check if an instance already exists and is IDLE
-            for worker in self.instances:
-                if worker.get_status() == WorkerState.idle and worker.id == worker_id:
-                    self.logger.info(f"  [-] Reusing worker {worker_id}")
-                    worker.stop()
-                    return worker
-
-            module_path, class_name = worker_info.worker.rsplit('.', 1)
-            module = importlib.import_module(module_path)
-            worker_class = getattr(module, class_name)
-            self.logger.info(f"  [-] Creating new worker {worker_id}")
-            worker = worker_class(id=worker_id,
-                name=class_name, service=self, model=worker_info.model, logger=self.logger)
-            self.instances.append(worker)
-
+            # loading blocks, and so does waiting for an instance loading or busy
+            worker = await asyncio.to_thread(self.servicer.residency.acquire, worker_id, lambda: self.create_worker(worker_id))
+            # workers are shared by the services of the servicer, each with its storage
+            worker.set_service(self)
+            # models loaded lazily by the call go to the device of the worker
+            current_device.set(worker.device)
             return worker
 
         except Exception as e:
             self.logger.error(f"  [-] Error in get_worker: {e}")
             raise
 
+    def create_worker(self, worker_id: str) -> Worker:
+        worker_info: WorkerConfig = self.worker_configs[worker_id]
+        module_path, class_name = worker_info.worker.rsplit('.', 1)
+        module = importlib.import_module(module_path)
+        worker_class = getattr(module, class_name)
+        self.logger.info(f"  [-] Creating new worker {worker_id}")
+        return worker_class(id=worker_id,
+            name=class_name, service=self, model=worker_info.model, logger=self.logger)
+
+    def release_worker(self, worker: Worker):
+        worker.stop()
+        self.servicer.residency.release(worker)
+
     async def work(self, request: WorkerBaseRequest) -> BaseModel:
+        self.servicer.warm_pool.record(request.worker_id)
+        worker_info = self.worker_configs.get(request.worker_id)
+        if worker_info is not None and worker_info.batch_size and worker_info.batch_size > 1:
+            if request.worker_id not in self.batchers:
+                self.batchers[request.worker_id] = RequestBatcher(
+                    self.work_batch, worker_info.batch_size, worker_info.batch_delay)
+            return await self.batchers[request.worker_id].submit(request)
+
+        # loading and inference block, they run off the gRPC event loop
+        return await self.servicer.executor.run(request.worker_id, self._work, request)
+
+    async def _work(self, request: WorkerBaseRequest) -> BaseModel:
         worker = await self.get_worker(request.worker_id)
-        result = await worker.work(request)
-        worker.stop()
-        return result
+        try:
+            return await worker.work(request)
+        finally:
+            self.release_worker(worker)
+
+    async def work_batch(self, requests: List[WorkerBaseRequest]) -> List[BaseModel]:
+        self.logger.info(f"  [-] Batch of {len(requests)} requests for worker {requests[0].worker_id}")
+        return await self.servicer.executor.run(requests[0].worker_id, self._work_batch, requests)
+
+    async def _work_batch(self, requests: List[WorkerBaseRequest]) -> List[BaseModel]:
+        worker = await self.get_worker(requests[0].worker_id)
+        try:
+            return await worker.work_batch(requests)
+        finally:
+            self.release_worker(worker)
+
+    async def warm(self, worker_id: str):
+        """
+        Loads an instance of a worker ahead of its requests, running its warmup request when configured.
+        """
+        await self.servicer.executor.run(worker_id, self._warm, worker_id)
+
+    async def _warm(self, worker_id: str):
+        worker = await self.get_worker(worker_id)
+        try:
+            warmup = self.worker_configs[worker_id].warmup
+            if warmup:
+                request_model = string_to_class(self.worker_configs[worker_id].request_model)
+                await worker.work(request_model.model_validate({**warmup, "worker_id": worker_id}))
+        finally:
+            self.release_worker(worker)
 
     async def stream(self, request: WorkerStreamManageRequest) -> WorkerStreamManageResponse:
             # Get the hostname of the current machine
@@ -120,6 +192,7 @@ class Service:
                                     outtype=request.outtype,
                                     timeout=request.timeout)
                                     )
+            worker.stream_task.add_done_callback(lambda _: self.servicer.residency.release(worker))
             
             # Return a response with the stream details
             return WorkerStreamManageResponse(hostname=hostname,
@@ -143,9 +216,5 @@ class Service:
     def set_keep_alive(self, keep_alive: int):
         self.keep_alive = keep_alive
 
-    def decrease_keep_alive(self):
-        self.keep_alive -= 1
-        self.logger.info(f"[-] Keep alive decreased to {self.keep_alive}")
-
     def get_keep_alive(self) -> int:
         return self.keep_alive
\ No newline at end of file
@@ -0,0 +1,48 @@
+from contextvars import ContextVar
+from pydantic import BaseModel
+from typing import AsyncIterator, Optional
+import asyncio
+
+class ResultStream:
+    """
+    Partial results of the request served by ProcessDataStream, in the order workers emit them.
+    Workers may emit from the event loop or from a thread, e.g. a blocking generator run
+    with asyncio.to_thread, so every chunk is handed over to the loop of the request.
+    """
+    _closed = object()
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(self, chunk: BaseModel):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, chunk)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, ResultStream._closed)
+
+    async def __aiter__(self) -> AsyncIterator[BaseModel]:
+        while True:
+            chunk = await self.queue.get()
+            if chunk is ResultStream._closed:
+                return
+            yield chunk
+
+# Stream of the gRPC request being served, None for unary ProcessData calls
+current_stream: ContextVar[Optional[ResultStream]] = ContextVar("current_stream", default=None)
+
+def emit_chunk(chunk: BaseModel) -> bool:
+    """
+    Sends a partial result to the client of the current request when it streams.
+
+    Args:
+        chunk (BaseModel): the partial result, tokens, an audio piece or a progress report
+
+    Returns:
+        bool: whether the chunk was sent, False when the request is unary
+    """
+    stream = current_stream.get()
+    if stream is None:
+        return False
+    stream.emit(chunk)
+    return True
@@ -0,0 +1,62 @@
+from config import GRPC_MAX_MESSAGE_SIZE, GRPC_COMPRESSION, GRPC_UPLOAD_THRESHOLD, GRPC_UPLOAD_CHUNK_SIZE, GRPC_UPLOAD_SPOOL_SIZE, TEMP_PATH
+from spt.models.envelope import is_binary_file
+from typing import BinaryIO, Iterator, List, Tuple, Union
+import grpc
+import os
+import tempfile
+
+# Options of the services and of their client channels
+GRPC_OPTIONS: List[Tuple[str, int]] = [
+    ("grpc.max_send_message_length", GRPC_MAX_MESSAGE_SIZE),
+    ("grpc.max_receive_message_length", GRPC_MAX_MESSAGE_SIZE),
+]
+
+COMPRESSIONS = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+
+def compression() -> grpc.Compression:
+    """
+    Compression of the gRPC messages, set by GRPC_COMPRESSION.
+    """
+    if GRPC_COMPRESSION.lower() not in COMPRESSIONS:
+        raise ValueError(f"Unknown GRPC_COMPRESSION {GRPC_COMPRESSION}, expected one of {', '.join(COMPRESSIONS)}")
+    return COMPRESSIONS[GRPC_COMPRESSION.lower()]
+
+def attachment_size(attachment: Union[bytes, BinaryIO]) -> int:
+    if isinstance(attachment, bytes):
+        return len(attachment)
+    # seeking rather than fstat, fileno would roll a spooled file over to disk
+    position = attachment.tell()
+    size = attachment.seek(0, os.SEEK_END)
+    attachment.seek(position)
+    return size
+
+def should_upload(attachments: List[Union[bytes, BinaryIO]]) -> bool:
+    """
+    Whether the attachments of a request are sent in chunks through ProcessDataUpload
+    rather than in the request: files, or more than GRPC_UPLOAD_THRESHOLD bytes.
+    """
+    return any(is_binary_file(attachment) for attachment in attachments) or \
+        sum(attachment_size(attachment) for attachment in attachments) > GRPC_UPLOAD_THRESHOLD
+
+def read_chunks(attachment: Union[bytes, BinaryIO]) -> Iterator[bytes]:
+    """
+    Chunks of GRPC_UPLOAD_CHUNK_SIZE bytes of an attachment, a file being read from its start.
+    """
+    if isinstance(attachment, bytes):
+        view = memoryview(attachment)
+        for start in range(0, len(view), GRPC_UPLOAD_CHUNK_SIZE):
+            yield bytes(view[start:start + GRPC_UPLOAD_CHUNK_SIZE])
+        return
+    attachment.seek(0)
+    while chunk := attachment.read(GRPC_UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+def spool() -> BinaryIO:
+    """
+    Buffer receiving an uploaded attachment, kept in memory up to GRPC_UPLOAD_SPOOL_SIZE bytes then written to TEMP_PATH.
+    """
+    return tempfile.SpooledTemporaryFile(max_size=GRPC_UPLOAD_SPOOL_SIZE, dir=TEMP_PATH)
@@ -0,0 +1,125 @@
+from config import SERVICE_WARM_WORKERS, SERVICE_WARM_TOP_N, SERVICE_WARM_WINDOW, SERVICE_WARM_INTERVAL, SERVICE_KEEP_ALIVE
+from spt.jobs import get_redis
+from spt.models.workers import WorkerConfigs
+from typing import List, Optional, Set
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sorted sets of the requests a service type received per worker, one per hour
+DEMAND_PREFIX = "smi-demand:"
+
+# Instance of the service warming up its workers, with the local storage of the warmup results
+WARM_INSTANCE_KEY = ("spt.services.service.Service", "work", "local")
+
+class WarmPool:
+    """
+    Keeps the warm set of a service loaded: the workers declared in SERVICE_WARM_WORKERS,
+    then the SERVICE_WARM_TOP_N workers with the most requests over the last
+    SERVICE_WARM_WINDOW hours, counted in Redis so the replicas of a service and its
+    restarts share them.
+
+    The warm set is loaded at start, so the first requests do not pay the downloads and
+    the loading, then again after evictions and periodically. Warming only loads workers
+    fitting in the memory budget as is: it never unloads another worker.
+    """
+    def __init__(self, servicer) -> None:
+        self.servicer = servicer
+        self.declared: List[str] = list(SERVICE_WARM_WORKERS)
+        self.top_n = SERVICE_WARM_TOP_N
+        self.worker_configs = WorkerConfigs.get_configs().workers_configs
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.evicted: Optional[asyncio.Event] = None
+        # the pending demand records, referenced until done so they are not collected
+        self.tasks: Set[asyncio.Task] = set()
+
+    def demand_key(self, hour: int) -> str:
+        return f"{DEMAND_PREFIX}{self.servicer.type}:{hour}"
+
+    def record(self, worker_id: str):
+        """
+        Counts a request of a worker, without delaying it.
+        """
+        if self.top_n > 0:
+            task = asyncio.create_task(self._record(worker_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _record(self, worker_id: str):
+        key = self.demand_key(int(time.time() // 3600))
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.zincrby(key, 1, worker_id)
+                pipe.expire(key, (SERVICE_WARM_WINDOW + 1) * 3600)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to record a request of {worker_id}: {e}")
+
+    async def demanded(self) -> List[str]:
+        """
+        The top_n workers with the most requests over the window, most requested first.
+        """
+        if self.top_n <= 0:
+            return []
+        hour = int(time.time() // 3600)
+        keys = [self.demand_key(hour - i) for i in range(SERVICE_WARM_WINDOW)]
+        try:
+            counts = await get_redis().zunion(keys, withscores=True)
+        except Exception as e:
+            logger.error(f"Failed to read the requests of the workers: {e}")
+            return []
+        ranked = sorted(counts, key=lambda count: count[1], reverse=True)
+        return [worker_id.decode("utf-8") for worker_id, _ in ranked[:self.top_n]]
+
+    async def warm_set(self) -> List[str]:
+        worker_ids = self.declared + [worker_id for worker_id in await self.demanded() if worker_id not in self.declared]
+        unknown = [worker_id for worker_id in worker_ids if worker_id not in self.worker_configs]
+        if unknown:
+            logger.warning(f"Unknown workers in the warm set: {unknown}")
+        return [worker_id for worker_id in worker_ids if worker_id in self.worker_configs]
+
+    async def refill(self):
+        """
+        Loads the workers of the warm set not resident, as long as they fit.
+        """
+        residency = self.servicer.residency
+        service = self.servicer.get_instance(WARM_INSTANCE_KEY, SERVICE_KEEP_ALIVE)
+        for worker_id in await self.warm_set():
+            if residency.is_resident(worker_id):
+                continue
+            if not residency.fits(worker_id):
+                logger.info(f"[*] Not warming {worker_id}, it does not fit: {residency.report()}")
+                continue
+            logger.info(f"[*] Warming {worker_id}")
+            start = time.time()
+            try:
+                await service.warm(worker_id)
+                logger.info(f"[*] Worker {worker_id} warm in {time.time() - start:.1f} seconds")
+            except Exception as e:
+                logger.error(f"[*] Failed to warm {worker_id}: {e}")
+
+    def _on_evict(self, worker_id: str):
+        # called from the thread unloading the worker
+        self.loop.call_soon_threadsafe(self.evicted.set)
+
+    async def run(self):
+        """
+        Warms the warm set at start, then after evictions and every SERVICE_WARM_INTERVAL seconds.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.evicted = asyncio.Event()
+        self.servicer.residency.on_evict.append(self._on_evict)
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"[*] Failed to warm the workers: {e}")
+            try:
+                await asyncio.wait_for(self.evicted.wait(), SERVICE_WARM_INTERVAL)
+                # let the load that evicted complete first
+                await asyncio.sleep(1)
+            except asyncio.TimeoutError:
+                pass
+            self.evicted.clear()
@@ -1,11 +1,14 @@
 from spt.models.workers import WorkerState, WorkerStreamType 
+from spt.services.cancellation import check_cancelled
+from spt.services.streaming import emit_chunk
+from spt.services.devices import current_device
 import asyncio
 from pydantic import BaseModel, ValidationError
 import time
 import logging
 import zmq
 from zmq.asyncio import Context, Poller
-from typing import Dict, Tuple, Any, Optional, Union
+from typing import Dict, Tuple, Any, Optional, Union, List
 import traceback
 
 class Worker:
@@ -21,6 +24,8 @@ class Worker:
         self.stop_event: asyncio.Event = asyncio.Event()
         self.stream_task: Optional[asyncio.Task] = None
         self.id = id
+        # GPU the service placed the worker on, None without placement
+        self.device: Optional[str] = current_device.get()
 
     def set_service(self, service: 'Service'):
         self.service = service
@@ -29,6 +34,23 @@ class Worker:
         self.status = WorkerState.working
         self.start_time = time.time()
 
+    def check_cancelled(self):
+        """
+        Raises JobCancelled when the job being served was cancelled, to be called
+        by workers between steps, segments or sentences to free the GPU early.
+        """
+        check_cancelled()
+
+    def emit_chunk(self, chunk: BaseModel) -> bool:
+        """
+        Sends a partial result to the client when the request streams, see spt.services.streaming.
+        """
+        return emit_chunk(chunk)
+
+    async def work_batch(self, requests: List[BaseModel]) -> List[BaseModel]:
+        # Workers able to run several requests in one model call override this
+        return [await self.work(request) for request in requests]
+
     async def stream(self, data: Union[bytes | str | Dict[str, Any]]) -> Union[bytes | str | Dict[str, Any]]:
         return data
 
@@ -38,6 +60,8 @@ class Worker:
         
         self.status = WorkerState.streaming
         self.start_time = time.time()
+        # a resident worker may have been stopped after a previous call
+        self.stop_event.clear()
 
         # Setting up ZeroMQ sockets
 
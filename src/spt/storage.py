@@ -2,12 +2,14 @@ import re
 from config import MINIO_ROOT_PASSWORD, MINIO_ROOT_USER, MINIO_SERVER_ENDPOINT, MINIO_SERVER_URL, MINIO_FILE_DURATION
 from minio import Minio
 from minio.error import S3Error
+from minio.commonconfig import ENABLED, Filter
+from minio.lifecycleconfig import LifecycleConfig, Rule, Expiration
 from rich.logging import RichHandler
 from rich.console import Console
 import logging
 import base64
 import io
-from typing import Optional
+from typing import BinaryIO, Optional
 from datetime import datetime, timedelta
 import unicodedata
 
@@ -121,7 +123,7 @@ class Storage:
             logging.error(f"Error uploading from base64: {str(exc)}")
             return None
 
-    def upload_from_bytes(self, bucket_name: str, object_name: str, byte_array: bytes) -> Optional[str]:
+    def upload_from_bytes(self, bucket_name: str, object_name: str, byte_array: bytes, public: bool = True) -> Optional[str]:
         """
         Uploads bytes to a specified bucket and object name.
 
@@ -129,6 +131,7 @@ class Storage:
             bucket_name (str): The name of the bucket to upload the bytes to.
             object_name (str): The name of the object in the bucket.
             byte_array (bytes): The bytes data to upload.
+            public (bool): Whether to create the bucket as public, False for an already created private bucket.
 
         Returns:
             Optional[str]: The ETag of the uploaded object if successful, None otherwise.
@@ -140,7 +143,7 @@ class Storage:
 
         if not self.check_connection():
             self.reset_connection()
-        if not self.create_public_bucket(bucket_name):
+        if public and not self.create_public_bucket(bucket_name):
             return None
         try:
             data_stream = io.BytesIO(byte_array)
@@ -152,6 +155,141 @@ class Storage:
             logging.error(f"Error uploading bytes: {str(exc)}")
             return None
 
+    def upload_from_stream(self, bucket_name: str, object_name: str, stream: BinaryIO, length: int, public: bool = True) -> Optional[str]:
+        """
+        Uploads a binary stream, e.g. a spooled file, to a specified bucket and object name without loading it in memory.
+
+        Args:
+            bucket_name (str): The name of the bucket to upload the stream to.
+            object_name (str): The name of the object in the bucket.
+            stream (BinaryIO): The stream to upload, read from its start.
+            length (int): The number of bytes of the stream.
+            public (bool): Whether to create the bucket as public, False for an already created private bucket.
+
+        Returns:
+            Optional[str]: The ETag of the uploaded object if successful, None otherwise.
+        """
+        bucket_name = self.sanitize_bucket_name(bucket_name)
+
+        if not self.check_connection():
+            self.reset_connection()
+        if public and not self.create_public_bucket(bucket_name):
+            return None
+        try:
+            stream.seek(0)
+            result = self.client.put_object(
+                bucket_name, object_name, stream, length)
+            logging.info(f"Uploaded {object_name} from stream to {bucket_name}")
+            return result.etag
+        except S3Error as exc:
+            logging.error(f"Error uploading stream: {str(exc)}")
+            return None
+        finally:
+            stream.seek(0)
+
+    def download_to_file(self, bucket_name: str, object_name: str, file: BinaryIO) -> bool:
+        """
+        Downloads an object of a bucket into a file, chunk by chunk.
+
+        Args:
+            bucket_name (str): The name of the bucket.
+            object_name (str): The name of the object in the bucket.
+            file (BinaryIO): The file receiving the object, rewound once written.
+
+        Returns:
+            bool: True if the object was downloaded, False otherwise.
+        """
+        bucket_name = self.sanitize_bucket_name(bucket_name)
+
+        if not self.check_connection():
+            self.reset_connection()
+        response = None
+        try:
+            response = self.client.get_object(bucket_name, object_name)
+            for chunk in response.stream(1024 * 1024):
+                file.write(chunk)
+            file.seek(0)
+            return True
+        except S3Error as exc:
+            logging.error(f"Error downloading {object_name} from {bucket_name}: {str(exc)}")
+            return False
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def download_bytes(self, bucket_name: str, object_name: str) -> Optional[bytes]:
+        """
+        Downloads an object of a bucket as bytes.
+
+        Args:
+            bucket_name (str): The name of the bucket.
+            object_name (str): The name of the object in the bucket.
+
+        Returns:
+            Optional[bytes]: The content of the object if successful, None otherwise.
+        """
+        bucket_name = self.sanitize_bucket_name(bucket_name)
+
+        if not self.check_connection():
+            self.reset_connection()
+        response = None
+        try:
+            response = self.client.get_object(bucket_name, object_name)
+            return response.read()
+        except S3Error as exc:
+            logging.error(f"Error downloading {object_name} from {bucket_name}: {str(exc)}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def remove_object(self, bucket_name: str, object_name: str) -> bool:
+        """
+        Removes an object from a bucket.
+
+        Args:
+            bucket_name (str): The name of the bucket.
+            object_name (str): The name of the object in the bucket.
+
+        Returns:
+            bool: True if the object was removed, False otherwise.
+        """
+        bucket_name = self.sanitize_bucket_name(bucket_name)
+        try:
+            self.client.remove_object(bucket_name, object_name)
+            return True
+        except S3Error as exc:
+            logging.error(f"Error removing {object_name} from {bucket_name}: {str(exc)}")
+            return False
+
+    def create_expiring_bucket(self, bucket_name: str, days: int = 1) -> bool:
+        """
+        Creates a private bucket whose objects are expired by the server after the given number of days.
+
+        Args:
+            bucket_name (str): The name of the bucket to create.
+            days (int): The number of days objects are kept.
+
+        Returns:
+            bool: True if the bucket exists with its lifecycle rule, False otherwise.
+        """
+        bucket_name = self.sanitize_bucket_name(bucket_name)
+        if not self.check_connection():
+            self.reset_connection()
+        try:
+            if not self.client.bucket_exists(bucket_name):
+                self.client.make_bucket(bucket_name)
+                logger.info(f"Bucket '{bucket_name}' created.")
+            self.client.set_bucket_lifecycle(bucket_name, LifecycleConfig([
+                Rule(ENABLED, rule_filter=Filter(prefix=""), rule_id="expire",
+                     expiration=Expiration(days=days))]))
+        except S3Error as exc:
+            logger.error(f"Error creating expiring bucket {bucket_name}: {str(exc)}")
+            return False
+        return True
+
     def create_signed_url(self, bucket_name: str, object_name: str, duration: int = MINIO_FILE_DURATION) -> Optional[str]:
         """
         Creates a signed URL for accessing an object in an S3 bucket.
@@ -1,12 +1,15 @@
 import torch
 from pynvml import nvmlInit, nvmlDeviceGetCount, nvmlDeviceGetHandleByIndex, nvmlDeviceGetName, nvmlDeviceGetMemoryInfo, nvmlDeviceGetUtilizationRates, NVMLError, nvmlShutdown, NVMLError
 from spt.models.remotecalls import GPUsInfo, GPUInfo
+from spt.services.devices import current_device, get_allocator
 import os
 import json
 import tempfile
+import shutil
 import logging
 from config import TEMP_PATH, STREAMING_PORTS_RANGE, SERVICES_NETWORK
 import socket
+from typing import BinaryIO, Union
 logger = logging.getLogger(__name__)
 import socket
 import docker
@@ -70,9 +73,14 @@ def load_json(file, dir="./"):
         logger.error(f"{jsonFile} does not exist")
         return None
     
-def create_temp_file(content: bytes) -> str:
+def create_temp_file(content: Union[bytes, BinaryIO]) -> str:
     temp_file = tempfile.NamedTemporaryFile(delete=False, dir=TEMP_PATH)
-    temp_file.write(content)
+    if isinstance(content, bytes):
+        temp_file.write(content)
+    else:
+        # an uploaded input spooled by the service, copied without loading it in memory
+        content.seek(0)
+        shutil.copyfileobj(content, temp_file)
     temp_file.close()
     return temp_file.name
 
@@ -81,28 +89,17 @@ def remove_temp_file(file_path: str) -> None:
         os.remove(file_path)
 
 def get_available_device():
+    # the device the service placed the worker on, see spt.services.devices
+    device = current_device.get()
+    if device is not None:
+        return torch.device(device)
+
     if torch.backends.mps.is_available():
         return torch.device('mps')
 
     if torch.cuda.is_available():
-        # Get the number of available CUDA devices
-        device_count = torch.cuda.device_count()
-        
-        if device_count == 1:
-            return torch.device('cuda:0')
-        
-        # If there are multiple CUDA devices, find the one with the most free memory
-        max_free_memory = 0
-        best_device = 0
-        
-        for i in range(device_count):
-            torch.cuda.set_device(i)
-            free_memory = torch.cuda.memory_allocated(i)
-            if free_memory > max_free_memory:
-                max_free_memory = free_memory
-                best_device = i
-        
-        return torch.device(f'cuda:{best_device}')
+        # the GPU with the most memory available according to NVML
+        return torch.device(get_allocator().best_device() or 'cuda:0')
     else:
         return torch.device('cpu')
 
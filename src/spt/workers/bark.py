@@ -66,6 +66,7 @@ class Bark(Worker):
         sentences = nltk.sent_tokenize(request.text, language="french")
         pieces = []
         for sentence in sentences:
+            self.check_cancelled()
             semantic_tokens = generate_text_semantic(
                 sentence,
                 history_prompt=voice_preset,
@@ -90,7 +91,7 @@ class Bark(Worker):
                 bytes=wav_file, name=request.text, extension="wav")
             return TextToSpeechResponse(url=url)
         else:
-            return TextToSpeechResponse(base64=self.encode_audio_common(wav_file))
+            return TextToSpeechResponse(base64=wav_file)
 
     def encode_audio_common(self, frame_input, encode_base64=True, sample_rate=24000, sample_width=2, channels=1):
         """Return base64 encoded audio"""
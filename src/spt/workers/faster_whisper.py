@@ -49,13 +49,20 @@ class FasterWhisper(Worker):
         segments, info = self.model_instance.transcribe(
             file, beam_size=1)
 
+        # segments are decoded lazily, a cancelled job stops at the next one
+        texts = []
+        try:
+            for segment in segments:
+                self.check_cancelled()
+                texts.append(segment.text)
+        finally:
+            remove_temp_file(file)
+
         response = SpeechToTextResponse(
-            language=request.language, text=segments["text"])
+            language=request.language or info.language, text="".join(texts))
 
         self.logger.info(f"Result: {response}")
 
-        remove_temp_file(file)
-
         return response
 
     def receive_audio_chunk(self, raw_bytes: bytes):
@@ -4,6 +4,7 @@ from spt.models.llm import ChatRequest, ChatResponse, ChatMessage, EmbeddingsReq
 from ollama import Client, ResponseError
 from config import OLLAMA_URL
 import inspect
+import asyncio
 import requests
 
 
@@ -23,6 +24,10 @@ class OllamaChat(Worker):
 
         self.logger.info(
             f"Generate Chat with {request.messages} model {self.model}")
+        # the Ollama client blocks, streamed chunks are emitted from its thread
+        return await asyncio.to_thread(self.chat, request)
+
+    def chat(self, request: ChatRequest) -> ChatResponse:
         result = None
         try:
             result = self.client.chat(model=self.model,
@@ -49,15 +54,19 @@ class OllamaChat(Worker):
 
         if request.stream and inspect.isgenerator(result):
             self.logger.info(f"Stream detected...")
+            content = []
             for item in result:
-                self.logger.info(item)
-
+                self.check_cancelled()
                 response = ChatResponse(**item)
+                content.append(response.message.content)
                 lastItem = response
                 self.service.chunked_request(response)
+            # the final response carries the whole answer, the chunks only their tokens
+            if lastItem is not None:
+                lastItem = lastItem.model_copy(update={"message": ChatMessage(role=lastItem.message.role, content="".join(content))})
         else:
             lastItem = ChatResponse(**result)
-        self.logger.info(f"Result: {result}")
+        self.logger.info(f"Result: {lastItem}")
 
         return lastItem
 
@@ -3,8 +3,10 @@ from spt.utils import create_temp_file, remove_temp_file, get_available_device
 from spt.models.llm import ChatRequest, ChatResponse, ChatMessage, EmbeddingsRequest, EmbeddingsResponse
 from ollama import Client, ResponseError
 from config import OLLAMA_URL
+import asyncio
 import inspect
 import requests
+from typing import List
 
 
 class OllamaEmbeddings(Worker):
@@ -30,6 +32,24 @@ class OllamaEmbeddings(Worker):
         self.logger.info(f"Result: {result}")
         return EmbeddingsResponse(**result)
 
+    async def work_batch(self, requests: List[EmbeddingsRequest]) -> List[EmbeddingsResponse]:
+        await super().work(requests[0])
+        self.logger.info(f"Generate {len(requests)} embeddings in batch")
+
+        # ollama==0.1.9 has no /api/embed, the prompts are embedded by concurrent
+        # /api/embeddings calls, which keep the vectors unnormalised like work does
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self.client.embeddings,
+                              model=self.model,
+                              prompt=request.prompt,
+                              options=request.options.model_dump() if request.options is not None else None)
+            for request in requests])
+        responses = [EmbeddingsResponse(**result) for result in results]
+
+        if self.model not in self.models:
+            self.models.append(self.model)
+        return responses
+
     def cleanup(self):
         super().cleanup()
         for model in self.models:
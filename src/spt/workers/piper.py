@@ -49,8 +49,11 @@ class Piper(Worker):
 
         audio_pieces = []
         for sentence in sentences:
+            self.check_cancelled()
             audio_array = self.tts_model.synthesize(sentence)
             audio_pieces.append(audio_array)
+            # streaming clients can play each sentence as soon as it is synthesized
+            self.emit_chunk(TextToSpeechResponse(base64=self.encode_audio_common(audio_array.tobytes(), encode_base64=False)))
 
             # Add a short silence between sentences
             silence = np.zeros(int(0.25 * self.sample_rate), dtype=np.int16)
@@ -66,7 +69,7 @@ class Piper(Worker):
                 bytes=wav_file, name=request.text, extension="wav")
             return TextToSpeechResponse(url=url)
         else:
-            return TextToSpeechResponse(base64=self.encode_audio_common(wav_file))
+            return TextToSpeechResponse(base64=wav_file)
 
     def encode_audio_common(self, frame_input, encode_base64=True, sample_width=2, channels=1):
         """Return base64 encoded audio"""
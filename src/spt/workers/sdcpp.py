@@ -115,9 +115,8 @@ class StableDiffusionCpp(Worker):
                         bytes=bytes_image, name=prompt.text, extension="png")
                     images.append({"url": url, "seed": seed, "finishReason": "SUCCESS"})
                 else:
-                    image_base64 = base64.b64encode(bytes_image).decode('utf-8')
                     images.append(
-                        {"base64": image_base64, "seed": seed, "finishReason": "SUCCESS"})
+                        {"base64": bytes_image, "seed": seed, "finishReason": "SUCCESS"})
 
             except Exception as e:
                 self.logger.error(f"Error generating image: {str(e)}")
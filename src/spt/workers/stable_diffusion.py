@@ -5,6 +5,7 @@ import torch
 from huggingface_hub import hf_hub_download
 from safetensors.torch import load_file
 from spt.models.image import TextToImageResponse, TextToImageRequest
+from spt.models.workers import WorkerProgress
 import base64
 import PIL
 import io
@@ -47,9 +48,11 @@ class StableDiffusion(Worker):
                 )
                 self.num_inference_steps = 30
                 torch.backends.cuda.matmul.allow_tf32 = True
-                pipe = pipe.to("cuda")
+                # the GPU the service placed the worker on
+                device = self.device or "cuda"
+                pipe = pipe.to(device)
                 # pipe.enable_model_cpu_offload()
-                generator = torch.Generator(device='cuda')
+                generator = torch.Generator(device=device)
 
             else:
                 self.logger.info("CUDA is **not** available")
@@ -77,6 +80,7 @@ class StableDiffusion(Worker):
         super().__init__(id=id, name=name, service=service, model=model, logger=logger)
         self.pipe = None
         self.num_inference_steps = 20
+        self.steps = 0
         self.generator = None
 
     async def work(self, request: TextToImageRequest) -> TextToImageResponse:
@@ -90,12 +94,15 @@ class StableDiffusion(Worker):
             self.generator.manual_seed(request.seed)
 
         prompts = list(request.text_prompts)
+        self.steps = request.steps
         images = []
         for prompt in prompts:
+            self.check_cancelled()
             image = self.pipe(
                 prompt=prompt.text,
                 generator=self.generator,
                 num_inference_steps=request.steps,
+                callback_on_step_end=self.on_step_end,
             ).images[0]
             tampon_bytes = io.BytesIO()
             image.save(tampon_bytes, format='PNG')
@@ -108,12 +115,17 @@ class StableDiffusion(Worker):
                 images.append({"url": url,
                               "seed": 42, "finishReason": "SUCCESS"})
             else:
-                image_base64 = base64.b64encode(bytes_image)
                 images.append(
-                    {"base64": image_base64, "seed": request.seed, "finishReason": "SUCCESS"})
+                    {"base64": bytes_image, "seed": request.seed, "finishReason": "SUCCESS"})
 
         return TextToImageResponse(artifacts=images)
 
+    def on_step_end(self, pipe, step: int, timestep, callback_kwargs: dict) -> dict:
+        # abort the denoising loop of a cancelled job
+        self.check_cancelled()
+        self.emit_chunk(WorkerProgress(step=step + 1, steps=self.steps))
+        return callback_kwargs
+
     def cleanup(self):
         super().cleanup()
         self.close_diffusion_pipe()
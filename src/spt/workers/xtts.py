@@ -5,14 +5,28 @@ from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 from TTS.utils.generic_utils import get_user_data_dir
 from TTS.utils.manage import ModelManager
+from typing import List
 import base64
 import numpy as np
+import nltk
 import torch
 from spt.utils import create_temp_file, remove_temp_file, get_available_device
+from config import NLTK_PATH
 import os
 import io
 import wave
 
+os.environ["NLTK_DATA"] = NLTK_PATH
+# nltk reads NLTK_DATA when imported, which may have happened before
+if NLTK_PATH not in nltk.data.path:
+    nltk.data.path.append(NLTK_PATH)
+
+# Punkt models of the XTTS languages, the others are spoken in one piece
+PUNKT_LANGUAGES = {
+    "cs": "czech", "de": "german", "en": "english", "es": "spanish", "fr": "french", "it": "italian",
+    "nl": "dutch", "pl": "polish", "pt": "portuguese", "ru": "russian", "tr": "turkish",
+}
+
 class XTTS(Worker):
     def __init__(self, id:str, name: str, service: Service, model: str, logger):
         super().__init__(id=id, name=name, service=service, model=model, logger=logger)
@@ -65,14 +79,19 @@ class XTTS(Worker):
         text = request.text
         language = request.language
 
-        out = self.tts_model.inference(
-            text,
-            language,
-            gpt_cond_latent,
-            speaker_embedding,
-        )
+        # one inference per sentence, so a cancelled job stops at the next sentence
+        pieces = []
+        for sentence in self.split_sentences(text, language):
+            self.check_cancelled()
+            out = self.tts_model.inference(
+                sentence,
+                language,
+                gpt_cond_latent,
+                speaker_embedding,
+            )
+            pieces.append(out["wav"])
 
-        wav = self.postprocess(torch.tensor(out["wav"]))
+        wav = self.postprocess(torch.tensor(np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)))
 
         wav_file = self.encode_audio_common(wav.tobytes(), encode_base64=False)
 
@@ -81,16 +100,30 @@ class XTTS(Worker):
                 bytes=wav_file, name=request.text, extension="wav")
             return TextToSpeechResponse(url=url)
         else:
-            return TextToSpeechResponse(base64=self.encode_audio_common(wav_file))
+            return TextToSpeechResponse(base64=wav_file)
+
+    def split_sentences(self, text: str, language: str) -> List[str]:
+        punkt_language = PUNKT_LANGUAGES.get((language or "").split("-")[0])
+        if punkt_language is not None:
+            try:
+                sentences = nltk.sent_tokenize(text, language=punkt_language)
+            except LookupError:
+                self.logger.warning(f"No punkt model for {punkt_language} in {NLTK_PATH}, speaking the text in one piece")
+                sentences = [text]
+        else:
+            sentences = [text]
+        return [sentence for sentence in sentences if sentence.strip()]
 
     def add_speakers(self, request: TextToSpeechSpeakerRequest):
         """Compute conditioning inputs from reference audio file."""
-        temp_audio_name = next(tempfile._get_candidate_names())
-        with open(temp_audio_name, "wb") as temp, torch.inference_mode():
-            temp.write(io.BytesIO(wav_file.file.read()).getbuffer())
-            gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
-                temp_audio_name
-            )
+        temp_audio_name = create_temp_file(request.sample)
+        try:
+            with torch.inference_mode():
+                gpt_cond_latent, speaker_embedding = self.tts_model.get_conditioning_latents(
+                    temp_audio_name
+                )
+        finally:
+            remove_temp_file(temp_audio_name)
         return {
             "gpt_cond_latent": gpt_cond_latent.cpu().squeeze().half().tolist(),
             "speaker_embedding": speaker_embedding.cpu().squeeze().half().tolist(),
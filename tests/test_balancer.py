@@ -0,0 +1,78 @@
+import unittest
+import time
+import grpc
+from unittest.mock import AsyncMock
+from config import BALANCER_MAX_FAILURES, BALANCER_EJECTION_TIME
+from spt.services.balancer import ServiceBalancer
+
+
+class RpcError(grpc.RpcError):
+    def __init__(self, code: grpc.StatusCode) -> None:
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def make_balancer(addresses: str = "10.0.0.1:50051,10.0.0.2:50051") -> ServiceBalancer:
+    balancer = ServiceBalancer(addresses)
+    # the addresses are already resolved
+    balancer.resolved_at = time.time()
+    return balancer
+
+
+class TestServiceBalancer(unittest.IsolatedAsyncioTestCase):
+    async def test_least_outstanding_replica_picked(self):
+        balancer = make_balancer()
+        first = await balancer.pick()
+        second = await balancer.pick()
+        self.assertNotEqual(first.address, second.address)
+        balancer.release(first, grpc.StatusCode.OK)
+        self.assertIs(await balancer.pick(), first)
+
+    async def test_replica_ejected_after_failures(self):
+        balancer = make_balancer()
+        failing = balancer.endpoints["10.0.0.1:50051"]
+        for _ in range(BALANCER_MAX_FAILURES):
+            failing.outstanding += 1
+            balancer.release(failing, grpc.StatusCode.UNAVAILABLE)
+        self.assertGreater(failing.ejected_until, time.time() + BALANCER_EJECTION_TIME - 1)
+        self.assertEqual(balancer.replicas, 1)
+        picked = [await balancer.pick() for _ in range(3)]
+        self.assertTrue(all(endpoint.address == "10.0.0.2:50051" for endpoint in picked))
+
+    async def test_request_errors_do_not_eject(self):
+        balancer = make_balancer()
+        endpoint = balancer.endpoints["10.0.0.1:50051"]
+        for _ in range(BALANCER_MAX_FAILURES):
+            balancer.release(endpoint, grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(endpoint.failures, 0)
+        self.assertEqual(endpoint.ejected_until, 0.0)
+
+    async def test_ejected_replica_probed_before_use(self):
+        balancer = make_balancer("10.0.0.1:50051")
+        endpoint = balancer.endpoints["10.0.0.1:50051"]
+        endpoint.failures = BALANCER_MAX_FAILURES
+        endpoint.client.ready = AsyncMock(return_value=False)
+        with self.assertRaises(RuntimeError):
+            await balancer.pick()
+        endpoint.client.ready.assert_awaited_once()
+        self.assertEqual(endpoint.outstanding, 0)
+
+    async def test_unavailable_call_retried_on_another_replica(self):
+        balancer = make_balancer()
+        calls = []
+
+        async def call(client):
+            calls.append(client.host)
+            if len(calls) == 1:
+                raise RpcError(grpc.StatusCode.UNAVAILABLE)
+            return "done"
+
+        self.assertEqual(await balancer._unary(call), "done")
+        self.assertEqual(len(set(calls)), 2)
+        self.assertTrue(all(endpoint.outstanding == 0 for endpoint in balancer.endpoints.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
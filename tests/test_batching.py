@@ -0,0 +1,65 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock
+from spt.services.service import RequestBatcher
+from spt.models.llm import EmbeddingsRequest, LLMOptions
+from spt.workers.ollama_embeddings import OllamaEmbeddings
+
+
+class TestRequestBatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_full_batch_runs_at_once(self):
+        batches = []
+
+        async def handler(requests):
+            batches.append(requests)
+            return [request * 2 for request in requests]
+
+        batcher = RequestBatcher(handler, batch_size=3, batch_delay=60000)
+        results = await asyncio.wait_for(asyncio.gather(*[batcher.submit(i) for i in range(3)]), 1)
+        self.assertEqual(results, [0, 2, 4])
+        self.assertEqual(batches, [[0, 1, 2]])
+
+    async def test_partial_batch_runs_after_the_delay(self):
+        batches = []
+
+        async def handler(requests):
+            batches.append(requests)
+            return requests
+
+        batcher = RequestBatcher(handler, batch_size=8, batch_delay=10)
+        results = await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1)
+        self.assertEqual(results, ["a", "b"])
+        self.assertEqual(batches, [["a", "b"]])
+        self.assertEqual(batcher.tasks, set())
+
+    async def test_failure_reaches_every_caller(self):
+        async def handler(requests):
+            raise RuntimeError("boom")
+
+        batcher = RequestBatcher(handler, batch_size=2, batch_delay=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+
+class TestOllamaEmbeddingsBatch(unittest.IsolatedAsyncioTestCase):
+    async def test_one_embeddings_call_per_prompt(self):
+        worker = OllamaEmbeddings.__new__(OllamaEmbeddings)
+        worker.model = "mistral"
+        worker.models = []
+        worker.logger = MagicMock()
+        worker.client = MagicMock()
+        worker.client.embeddings.side_effect = lambda model, prompt, options: {"embedding": [float(len(prompt))]}
+        worker.check_cancelled = MagicMock()
+        requests = [EmbeddingsRequest(worker_id="ollama_mistral_embeddings", prompt="Hello"),
+                    EmbeddingsRequest(worker_id="ollama_mistral_embeddings", prompt="Hi", options=LLMOptions(seed=1))]
+        with unittest.mock.patch("spt.services.worker.Worker.work"):
+            responses = await worker.work_batch(requests)
+        self.assertEqual([response.embedding for response in responses], [[5.0], [2.0]])
+        self.assertEqual(worker.client.embeddings.call_count, 2)
+        self.assertIsNone(worker.client.embeddings.call_args_list[0].kwargs["options"])
+        self.assertEqual(worker.client.embeddings.call_args_list[1].kwargs["options"]["seed"], 1)
+        self.assertFalse(hasattr(worker.client, "embed") and worker.client.embed.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
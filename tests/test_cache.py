@@ -0,0 +1,79 @@
+import unittest
+import json
+from unittest.mock import patch
+from spt.cache import ResultCache, CACHE_LRU
+from spt.jobs import Jobs
+from spt.models.jobs import JobsTypes, JobStorage
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+async def make_job(worker_id: str = "realisticVision", type: JobsTypes = JobsTypes.image_generation, **payload):
+    payload = payload or {"text_prompts": [{"text": "A lighthouse"}], "seed": 42}
+    return await Jobs.create_job(json.dumps(payload), type, worker_id)
+
+
+class TestCacheKey(unittest.IsolatedAsyncioTestCase):
+    async def test_same_request_same_key(self):
+        first = await make_job(seed=42, text_prompts=[{"text": "A lighthouse"}])
+        second = await make_job(text_prompts=[{"text": "A lighthouse"}], seed=42)
+        self.assertIsNotNone(ResultCache.key(first))
+        self.assertEqual(ResultCache.key(first), ResultCache.key(second))
+        self.assertNotEqual(ResultCache.key(first), ResultCache.key(await make_job(seed=43)))
+
+    async def test_random_seed_is_not_cached(self):
+        self.assertIsNone(ResultCache.key(await make_job(seed=0, text_prompts=[{"text": "A lighthouse"}])))
+
+    async def test_chat_needs_temperature_zero_or_a_seed(self):
+        messages = [{"role": "user", "content": "Hello"}]
+        self.assertIsNone(ResultCache.key(await make_job("ollama_mistral", JobsTypes.llm_generation, messages=messages)))
+        self.assertIsNotNone(ResultCache.key(await make_job("ollama_mistral", JobsTypes.llm_generation,
+                                                            messages=messages, options={"temperature": 0})))
+
+    async def test_s3_storage_is_not_cached(self):
+        job = await make_job()
+        job.storage = JobStorage.s3
+        self.assertIsNone(ResultCache.key(job))
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestResultCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis()
+        patcher = patch("spt.cache.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResultCache(max_bytes=10)
+
+    async def test_put_then_get(self):
+        self.assertIsNone(await self.cache.get("a"))
+        await self.cache.put("a", b"1234")
+        self.assertEqual(await self.cache.get("a"), b"1234")
+        stats = await self.cache.stats()
+        self.assertEqual((stats.entries, stats.bytes, stats.hits, stats.misses), (1, 4, 1, 1))
+
+    async def test_least_recently_used_evicted(self):
+        await self.cache.put("a", b"1234")
+        await self.cache.put("b", b"1234")
+        # a is used again, b is now the least recently used
+        await self.redis.zadd(CACHE_LRU, {"a": 1e10})
+        await self.cache.put("c", b"1234")
+        self.assertEqual(await self.cache.get("a"), b"1234")
+        self.assertIsNone(await self.cache.get("b"))
+        self.assertEqual((await self.cache.stats()).bytes, 8)
+
+    async def test_put_again_counts_the_size_once(self):
+        await self.cache.put("a", b"1234")
+        await self.cache.put("a", b"123456")
+        self.assertEqual((await self.cache.stats()).bytes, 6)
+
+    async def test_envelope_over_the_budget_is_not_cached(self):
+        await self.cache.put("a", b"12345678901")
+        self.assertIsNone(await self.cache.get("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+import generic_pb2
+from spt.jobs import Jobs
+from spt.models.jobs import JobsTypes
+from spt.services.client import GenericClient
+
+
+class TestGenericClient(unittest.IsolatedAsyncioTestCase):
+    def mock_stub(self, client: GenericClient) -> MagicMock:
+        stub = MagicMock()
+        client.stubs[asyncio.get_running_loop()] = stub
+        return stub
+
+    async def test_one_channel_per_event_loop(self):
+        client = GenericClient("localhost:50051")
+        self.assertIs(client.stub, client.stub)
+        self.assertEqual(len(client.channels), 1)
+        await client.close()
+        self.assertEqual((client.stubs, client.channels), ({}, {}))
+
+    async def test_process_data_with_the_deadline(self):
+        client = GenericClient("localhost:50051", deadline=30)
+        stub = self.mock_stub(client)
+        stub.ProcessData = AsyncMock(return_value=generic_pb2.GenericResponse(result=b"envelope"))
+        job = await Jobs.create_job('{"text": "Bonjour.", "speaker_id": "default"}', JobsTypes.audio_generation, "piper")
+        response = await client.process_data(job)
+        self.assertEqual(response.result, b"envelope")
+        request = stub.ProcessData.await_args.args[0]
+        self.assertEqual((request.worker_id, request.job_id), ("piper", job.id))
+        self.assertEqual(stub.ProcessData.await_args.kwargs["timeout"], 30)
+        await client.process_data(job, timeout=5)
+        self.assertEqual(stub.ProcessData.await_args.kwargs["timeout"], 5)
+
+    async def test_call_remote_function(self):
+        client = GenericClient("localhost:50051")
+        stub = self.mock_stub(client)
+        stub.ProcessData = AsyncMock(return_value=generic_pb2.GenericResponse(json_payload=json.dumps({"used_gb": 4.0}).encode("utf-8")))
+        result = await client.call_remote_function("spt.services.residency", "residency_infos", {},
+                                                   "spt.models.remotecalls.ResidencyInfo")
+        self.assertEqual(result, {"used_gb": 4.0})
+        self.assertEqual(stub.ProcessData.await_args.args[0].remote_function, "residency_infos")
+
+
+if __name__ == '__main__':
+    unittest.main()
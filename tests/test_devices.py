@@ -0,0 +1,115 @@
+import unittest
+import threading
+from unittest.mock import patch
+from spt.services.devices import DeviceAllocator, FakeBackend, NvmlBackend
+
+
+class TestDeviceAllocator(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend([(10.0, 24.0), (20.0, 24.0)])
+        self.allocator = DeviceAllocator(backend=self.backend)
+
+    def test_place_on_most_free_device(self):
+        placement = self.allocator.place("sdxl", 6.0)
+        self.assertEqual(placement.device, "cuda:1")
+
+    def test_pending_placements_are_reserved(self):
+        first = self.allocator.place("sdxl", 12.0)
+        second = self.allocator.place("xtts", 4.0)
+        self.assertEqual(first.index, 1)
+        # NVML does not report the first load yet, 8GB are left on cuda:1
+        self.assertEqual(second.index, 0)
+
+    def test_loaded_placement_counts_nvml_and_footprint(self):
+        placement = self.allocator.place("sdxl", 0.0)
+        self.backend.set_free(1, 15.0)
+        self.allocator.loaded(placement, 5.0)
+        self.assertEqual(self.allocator.available_gb()[1], 15.0)
+        # the model loaded lazily, NVML still reports the memory free
+        self.backend.set_free(1, 20.0)
+        self.allocator.loaded(placement, 12.0)
+        self.assertEqual(self.allocator.available_gb()[1], 12.0)
+
+    def test_release_frees_the_reservation(self):
+        placement = self.allocator.place("sdxl", 12.0)
+        self.allocator.release(placement)
+        self.assertEqual(self.allocator.available_gb(), {0: 10.0, 1: 20.0})
+
+    def test_no_device_fits(self):
+        placement = self.allocator.place("flux", 30.0)
+        self.assertEqual(placement.index, 1)
+
+    def test_no_gpu(self):
+        allocator = DeviceAllocator(backend=FakeBackend([]))
+        self.assertIsNone(allocator.place("piper", 1.0))
+        self.assertIsNone(allocator.best_device())
+
+    def test_concurrent_placements(self):
+        allocator = DeviceAllocator(backend=FakeBackend([(8.0, 8.0), (8.0, 8.0)]))
+        placements = []
+        threads = [threading.Thread(target=lambda: placements.append(allocator.place("whisper", 2.0)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(placement.index for placement in placements), [0] * 4 + [1] * 4)
+        self.assertEqual(allocator.available_gb(), {0: 0.0, 1: 0.0})
+
+
+class FakeNvml:
+    """
+    NVML of a machine with three GPUs, listed by PCI bus.
+    """
+    uuids = ["GPU-1111-aaaa", "GPU-2222-bbbb", "GPU-3333-cccc"]
+
+    def nvmlDeviceGetCount(self):
+        return len(self.uuids)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        return index
+
+    def nvmlDeviceGetUUID(self, handle):
+        return self.uuids[handle].encode("utf-8")
+
+
+class TestNvmlBackend(unittest.TestCase):
+    def visible_handles(self, visible=None, order="PCI_BUS_ID", cuda_uuids=None):
+        backend = NvmlBackend.__new__(NvmlBackend)
+        backend.nvml = FakeNvml()
+        backend.cuda_uuids = lambda: cuda_uuids
+        environ = {} if visible is None else {"CUDA_VISIBLE_DEVICES": visible}
+        if order is not None:
+            environ["CUDA_DEVICE_ORDER"] = order
+        with patch.dict("os.environ", environ, clear=True):
+            return backend.visible_handles()
+
+    def test_every_device_without_cuda_visible_devices(self):
+        self.assertEqual(self.visible_handles(), [0, 1, 2])
+
+    def test_cuda_visible_devices_indexes(self):
+        # cuda:0 is the third GPU of the machine
+        self.assertEqual(self.visible_handles("2,0"), [2, 0])
+
+    def test_cuda_visible_devices_uuids(self):
+        self.assertEqual(self.visible_handles("GPU-3333,2222-bbbb"), [2, 1])
+
+    def test_devices_after_an_invalid_one_are_ignored(self):
+        self.assertEqual(self.visible_handles("1,7,0"), [1])
+
+    def test_no_visible_device(self):
+        self.assertEqual(self.visible_handles(""), [])
+
+    def test_matched_by_the_cuda_uuids(self):
+        # fastest first, cuda:0 is the second GPU of the machine
+        self.assertEqual(self.visible_handles(order=None, cuda_uuids=["GPU-2222-bbbb", "GPU-1111-aaaa"]), [1, 0])
+
+    def test_not_placed_without_the_order_of_cuda(self):
+        self.assertEqual(self.visible_handles("2,0", order="FASTEST_FIRST"), [])
+        self.assertEqual(self.visible_handles(order=None), [])
+        # a single GPU is the same in any order
+        self.assertEqual(self.visible_handles("2", order=None), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+from spt.dispatcher import Dispatcher
+from spt.jobs import Job
+from spt.models.jobs import JobsTypes
+from spt.models.remotecalls import ResidencyInfo
+
+
+def make_job(worker_id: str = "realisticVision") -> Job:
+    return Job(payload="{}", type=JobsTypes.image_generation, worker_id=worker_id)
+
+
+class TestAdmission(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher()
+        self.memory(available_gb=24.0)
+
+    def memory(self, **infos):
+        self.dispatcher.call_remote_function = AsyncMock(return_value=ResidencyInfo(**infos).model_dump())
+        # take a new snapshot at the next admission
+        self.dispatcher.service_memory.clear()
+
+    async def test_in_flight_jobs_are_bounded(self):
+        jobs = [make_job("piper") for _ in range(5)]
+        allowed = [await self.dispatcher.allow_run_job(job) for job in jobs]
+        self.assertEqual(allowed, [True] * 4 + [False])
+        self.dispatcher.release_job(jobs[0])
+        self.assertTrue(await self.dispatcher.allow_run_job(jobs[4]))
+
+    async def test_footprint_needs_available_memory(self):
+        self.memory(available_gb=4.0)
+        self.assertFalse(await self.dispatcher.allow_run_job(make_job()))
+        self.memory(available_gb=5.0)
+        self.assertTrue(await self.dispatcher.allow_run_job(make_job()))
+
+    async def test_jobs_admitted_since_the_snapshot_are_reserved(self):
+        self.memory(available_gb=9.0)
+        self.assertTrue(await self.dispatcher.allow_run_job(make_job("realisticVision")))
+        # the 4.5GB of realisticVision are not in the snapshot yet
+        self.assertFalse(await self.dispatcher.allow_run_job(make_job("disneyPixar")))
+
+    async def test_new_snapshot_keeps_the_reservations_made_while_taken(self):
+        self.memory(available_gb=10.0)
+        first = make_job("realisticVision")
+        self.assertTrue(await self.dispatcher.allow_run_job(first))
+        # a snapshot older than the admission does not account for it
+        self.dispatcher.service_memory[JobsTypes.image_generation] = (ResidencyInfo(available_gb=10.0), time.time() - 1)
+        self.assertEqual(self.dispatcher.reserved_gb(JobsTypes.image_generation), 4.5)
+        # a newer one does
+        self.dispatcher.service_memory[JobsTypes.image_generation] = (ResidencyInfo(available_gb=5.5), time.time() + 1)
+        self.assertEqual(self.dispatcher.reserved_gb(JobsTypes.image_generation), 0.0)
+
+    async def test_release_frees_the_reservation(self):
+        self.memory(available_gb=5.0)
+        job = make_job()
+        self.assertTrue(await self.dispatcher.allow_run_job(job))
+        self.dispatcher.release_job(job)
+        self.assertEqual(self.dispatcher.reservations, {})
+        self.assertEqual(self.dispatcher.in_flight[JobsTypes.image_generation], 0)
+        self.assertTrue(await self.dispatcher.allow_run_job(make_job()))
+
+    async def test_idle_resident_worker_needs_no_memory(self):
+        self.memory(available_gb=0.0, resident=["realisticVision"])
+        self.assertTrue(await self.dispatcher.allow_run_job(make_job()))
+        # busy, a second job may need another instance
+        self.assertFalse(await self.dispatcher.allow_run_job(make_job()))
+
+    async def test_service_without_gpu(self):
+        self.memory(available_gb=None)
+        self.assertTrue(await self.dispatcher.allow_run_job(make_job("fluxDevQ8Cpp")))
+
+    async def test_redelivered_job_admitted_once(self):
+        job = make_job("piper")
+        self.assertTrue(await self.dispatcher.allow_run_job(job))
+        self.assertTrue(await self.dispatcher.allow_run_job(job))
+        self.assertEqual(self.dispatcher.in_flight[JobsTypes.image_generation], 1)
+        self.dispatcher.release_job(job)
+        self.assertEqual(self.dispatcher.in_flight[JobsTypes.image_generation], 0)
+
+    async def test_concurrent_admissions_bounded(self):
+        async def residency_infos(*args):
+            # the other admissions run while the service memory is read
+            await asyncio.sleep(0.01)
+            return ResidencyInfo(available_gb=24.0).model_dump()
+
+        self.dispatcher.call_remote_function = residency_infos
+        with patch("spt.dispatcher.ADMISSION_MAX_IN_FLIGHT", 1):
+            allowed = await asyncio.gather(*[self.dispatcher.allow_run_job(make_job()) for _ in range(3)])
+        self.assertEqual(sorted(allowed), [False, False, True])
+        self.assertEqual(self.dispatcher.in_flight[JobsTypes.image_generation], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import io
+import json
+import msgpack
+from spt.models.audio import TextToSpeechResponse, SpeechToTextRequest, TextToSpeechSpeakerRequest
+from spt.models.image import TextToImageResponse
+from spt.models.workers import WorkerResult
+from spt.models.envelope import pack_result, unpack_result, split_attachments, bind_attachments, ATTACHMENT_REF
+
+WAV = b"RIFF\x00\x01\x02\xffWAVE"
+
+
+class TestResultEnvelope(unittest.TestCase):
+    def test_round_trip(self):
+        result = TextToImageResponse(artifacts=[{"base64": WAV, "finishReason": WorkerResult.success, "seed": 42}])
+        self.assertEqual(unpack_result(pack_result(result)), result)
+
+    def test_bytes_stay_raw(self):
+        envelope = msgpack.unpackb(pack_result(TextToSpeechResponse(base64=WAV)), raw=False)
+        self.assertEqual(envelope["model"], "spt.models.audio.TextToSpeechResponse")
+        self.assertEqual(envelope["data"]["base64"], WAV)
+
+    def test_unpacked_map(self):
+        envelope = msgpack.unpackb(pack_result(TextToSpeechResponse(base64=WAV)), raw=False)
+        self.assertEqual(unpack_result(envelope).base64, WAV)
+
+    def test_json_keeps_base64(self):
+        response = json.loads(TextToSpeechResponse(base64=WAV).model_dump_json())
+        self.assertEqual(TextToSpeechResponse.model_validate(response).base64, WAV)
+
+
+class TestAttachments(unittest.TestCase):
+    def test_bytes_moved_to_attachments(self):
+        payload, attachments = split_attachments(TextToSpeechSpeakerRequest(worker_id="xtts_v2", id="virginie", sample=WAV))
+        self.assertEqual(json.loads(payload)["sample"], {ATTACHMENT_REF: 0})
+        self.assertEqual(attachments, [WAV])
+        request = TextToSpeechSpeakerRequest.model_validate(bind_attachments(json.loads(payload), attachments))
+        self.assertEqual(request.sample, WAV)
+
+    def test_binary_file_moved_to_attachments(self):
+        file = io.BytesIO(WAV)
+        payload, attachments = split_attachments(SpeechToTextRequest(worker_id="whisper", file=file, language="fr"))
+        self.assertEqual(json.loads(payload)["file"], {ATTACHMENT_REF: 0})
+        # the file itself, not read
+        self.assertIs(attachments[0], file)
+        request = SpeechToTextRequest.model_validate(bind_attachments(json.loads(payload), attachments))
+        self.assertIs(request.file, file)
+        self.assertEqual(request.language, "fr")
+
+    def test_base64_input(self):
+        request = SpeechToTextRequest.model_validate({"worker_id": "whisper", "file": "UklGRg=="})
+        self.assertEqual(request.file, b"RIFF")
+
+    def test_empty_bytes_and_plain_payload(self):
+        payload, attachments = split_attachments(SpeechToTextRequest(worker_id="whisper", file=b"", prompt="Bonjour"))
+        self.assertEqual(attachments, [b""])
+        self.assertEqual(bind_attachments({"prompt": ["a", {"b": 1}]}, []), {"prompt": ["a", {"b": 1}]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import asyncio
+import contextvars
+import threading
+import time
+from unittest.mock import patch
+from spt.services.executor import WorkerExecutor
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class TestWorkerExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executor = WorkerExecutor(threads=4)
+        self.addCleanup(self.executor.shutdown)
+
+    async def test_blocking_call_runs_off_the_loop(self):
+        loop_thread = threading.get_ident()
+        thread = await self.executor.run("piper", threading.get_ident)
+        self.assertNotEqual(thread, loop_thread)
+
+    async def test_coroutine_call(self):
+        async def work(value):
+            await asyncio.sleep(0)
+            return value * 2
+        self.assertEqual(await self.executor.run("piper", work, 21), 42)
+
+    async def test_calls_of_a_worker_are_limited(self):
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        with patch.object(self.executor, "concurrency", return_value=1):
+            await asyncio.gather(*[self.executor.run("piper", work) for _ in range(3)])
+        self.assertEqual(peak, 1)
+
+    async def test_workers_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=1)
+        with patch.object(self.executor, "concurrency", return_value=1):
+            # each call waits for the other one, they would time out if run one after the other
+            await asyncio.gather(self.executor.run("piper", barrier.wait), self.executor.run("xtts_v2", barrier.wait))
+
+    async def test_context_follows_the_call(self):
+        request_id.set("job")
+        self.assertEqual(await self.executor.run("piper", request_id.get), "job")
+
+    async def test_failed_call_gives_its_slot_back(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        with patch.object(self.executor, "concurrency", return_value=1):
+            with self.assertRaises(RuntimeError):
+                await self.executor.run("piper", fail)
+            self.assertEqual(await asyncio.wait_for(self.executor.run("piper", lambda: "done"), 1), "done")
+
+
+if __name__ == '__main__':
+    unittest.main()
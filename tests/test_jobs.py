@@ -0,0 +1,306 @@
+import unittest
+import asyncio
+import msgpack
+from unittest.mock import AsyncMock, MagicMock, patch
+from spt.jobs import Job, Jobs, JobsListener, JOBS_DONE_CHANNEL, get_redis, close_redis
+from spt.models.jobs import JobsTypes, JobStatuses, JobPriority
+from spt.queue import AsyncQueueMessageReceiver, Headers, Priority
+from spt.models.envelope import pack_result
+from spt.models.audio import TextToSpeechResponse
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_message(attempt: int = 0, priority: str = "NORMAL"):
+    """
+    A message of the image generation lane of realisticVision, as the receivers get it.
+    """
+    headers = Headers(job_id="job", job_type=JobsTypes.image_generation.value, job_worker_id="realisticVision",
+                      job_remote_class="spt.services.service.Service", job_remote_method="work",
+                      job_request_model_class="spt.models.image.TextToImageRequest",
+                      job_response_model_class="spt.models.image.TextToImageResponse",
+                      job_storage="local", job_keep_alive=15, job_attempt=attempt, job_priority=priority)
+    message = MagicMock()
+    message.headers = headers.model_dump()
+    message.body = msgpack.packb({"payload": '{"text_prompts": [{"text": "A lighthouse"}]}', "attachments": []})
+    message.routing_key = "IMAGE_GENERATION.realisticVision"
+    return message
+
+
+def make_jobs() -> Jobs:
+    jobs = Jobs(JobsTypes.image_generation)
+    jobs.consumer = AsyncQueueMessageReceiver()
+    jobs.publisher = MagicMock()
+    jobs.publisher.send_message = AsyncMock()
+    jobs.set_job_status = AsyncMock()
+    return jobs
+
+
+class TestJobsLanes(unittest.TestCase):
+    def test_one_lane_per_worker_of_the_type(self):
+        lanes = {lane.worker_id: lane for lane in Jobs.lanes(JobsTypes.image_generation)}
+        self.assertIn("realisticVision", lanes)
+        self.assertNotIn("piper", lanes)
+        self.assertEqual(lanes["realisticVision"].job_type, JobsTypes.image_generation.value)
+
+    def test_prefetch_covers_the_concurrency(self):
+        for lane in Jobs.lanes():
+            self.assertGreaterEqual(lane.prefetch, lane.concurrency)
+
+
+class TestSendJob(unittest.IsolatedAsyncioTestCase):
+    async def test_worker_of_another_job_type_is_refused(self):
+        jobs = Jobs(JobsTypes.llm_generation)
+        jobs.start_publisher = AsyncMock()
+        job = Job(payload="{}", type=JobsTypes.llm_generation, worker_id="piper")
+        with self.assertRaises(ValueError):
+            await jobs._send_job(job)
+        jobs.start_publisher.assert_not_awaited()
+
+    async def test_priority_is_the_message_priority(self):
+        jobs = make_jobs()
+        jobs.start_publisher = AsyncMock(return_value=jobs.publisher)
+        job = await Jobs.create_job(payload="{}", type=JobsTypes.image_generation, worker_id="realisticVision")
+        job.priority = JobPriority.high
+        await jobs._send_job(job)
+        kwargs = jobs.publisher.send_message.await_args.kwargs
+        self.assertEqual(kwargs["priority"], Priority.HIGH)
+        self.assertEqual(kwargs["headers"].job_priority, JobPriority.high.value)
+
+    async def test_priority_read_back_from_the_message(self):
+        job = make_jobs().message_to_job(make_message(priority=JobPriority.low.value))
+        self.assertEqual(job.priority, JobPriority.low)
+
+    async def test_add_job_fails_the_job_without_lane(self):
+        jobs = Jobs(JobsTypes.llm_generation)
+        jobs.start_publisher = AsyncMock()
+        jobs.set_job_status = AsyncMock()
+        job = Job(payload="{}", type=JobsTypes.llm_generation, worker_id="piper")
+        await jobs.add_job(job)
+        statuses = [call.args[1] for call in jobs.set_job_status.await_args_list]
+        self.assertEqual(statuses, [JobStatuses.pending, JobStatuses.failed])
+
+
+class TestRetryJob(unittest.IsolatedAsyncioTestCase):
+    async def test_deferred_to_the_retry_exchange_of_its_attempt(self):
+        jobs = make_jobs()
+        await jobs.retry_job(make_message(attempt=2))
+        kwargs = jobs.publisher.send_message.await_args.kwargs
+        self.assertEqual(kwargs["exchange_name"], "spt.retry.20")
+        # the message keeps its lane
+        self.assertEqual(kwargs["routing_key"], "IMAGE_GENERATION.realisticVision")
+        self.assertEqual(kwargs["headers"].job_attempt, 3)
+        self.assertEqual(jobs.set_job_status.await_args.args[1], JobStatuses.queued)
+
+    async def test_failed_after_the_max_attempts(self):
+        jobs = make_jobs()
+        await jobs.retry_job(make_message(attempt=30))
+        jobs.publisher.send_message.assert_not_awaited()
+        self.assertEqual(jobs.set_job_status.await_args.args[1], JobStatuses.failed)
+
+
+class TestRedisClient(unittest.TestCase):
+    async def clients(self):
+        first, second = get_redis(), get_redis()
+        await close_redis()
+        reopened = get_redis()
+        await close_redis()
+        return first, second, reopened
+
+    def test_one_client_per_event_loop(self):
+        first, second, reopened = asyncio.run(self.clients())
+        self.assertIs(first, second)
+        self.assertIsNot(first, reopened)
+        other, _, _ = asyncio.run(self.clients())
+        self.assertIsNot(other, first)
+
+
+class RedisTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Jobs on an in-memory Redis running the Lua scripts of the jobs.
+    """
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis()
+        patcher = patch("spt.jobs.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jobs = Jobs(JobsTypes.image_generation)
+        self.jobs._send_job = AsyncMock()
+        self.jobs.consumer = AsyncQueueMessageReceiver()
+
+    async def create_job(self, idempotency_key: str = "request"):
+        return await Jobs.create_job('{"text_prompts": [{"text": "A lighthouse"}]}', JobsTypes.image_generation,
+                                     "realisticVision", idempotency_key=idempotency_key)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestJobStatusTtl(RedisTestCase):
+    async def test_status_transition_refreshes_the_job_keys(self):
+        job = await self.create_job()
+        await self.jobs.add_job(job)
+        # time passed since the job was claimed
+        for key in [job.dedup_key, f"{job.id}:waiters", f"{job.id}:dedup"]:
+            await self.redis.expire(key, 10)
+        await self.jobs.set_job_status(job, JobStatuses.in_progress)
+        ttl = self.jobs._ttl(job)
+        for key in [job.dedup_key, f"{job.id}:status", f"{job.id}:waiters", f"{job.id}:dedup"]:
+            self.assertGreater(await self.redis.ttl(key), 10, key)
+            self.assertLessEqual(await self.redis.ttl(key), ttl, key)
+
+    async def test_dedup_key_of_another_job_is_not_refreshed(self):
+        job = await self.create_job()
+        await self.jobs.add_job(job)
+        # the key now points to a newer job
+        await self.redis.set(job.dedup_key, "other", ex=10)
+        await self.jobs.set_job_status(job, JobStatuses.in_progress)
+        self.assertLessEqual(await self.redis.ttl(job.dedup_key), 10)
+
+    async def test_status_without_dedup(self):
+        job = await self.create_job(idempotency_key=None)
+        await self.jobs.add_job(job)
+        await self.jobs.finish_job(job, JobStatuses.completed, None)
+        status = await self.jobs.get_job_status(job)
+        self.assertEqual(status.status, JobStatuses.completed)
+        self.assertFalse(await self.redis.exists(f"{job.id}:waiters"))
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestSingleFlight(RedisTestCase):
+    async def submit(self):
+        job = await self.create_job()
+        await self.jobs.add_job(job)
+        return job
+
+    async def test_identical_submission_attaches(self):
+        first, second = await self.submit(), await self.submit()
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(int(await self.redis.get(f"{first.id}:waiters")), 2)
+        self.assertEqual(self.jobs._send_job.await_count, 1)
+
+    async def test_failed_job_is_not_attached_to(self):
+        first = await self.submit()
+        await self.jobs.finish_job(first, JobStatuses.failed, None, "boom")
+        second = await self.submit()
+        self.assertNotEqual(second.id, first.id)
+
+    async def test_job_cleared_after_its_last_waiter(self):
+        first, second = await self.submit(), await self.submit()
+        await self.jobs.finish_job(first, JobStatuses.completed, pack_result(TextToSpeechResponse(base64=b"RIFF")))
+        self.assertEqual((await self.jobs.get_job_result(first)).base64, b"RIFF")
+        self.assertTrue(await self.redis.exists(f"{first.id}:result", first.dedup_key))
+        self.assertEqual((await self.jobs.get_job_result(second)).base64, b"RIFF")
+        self.assertFalse(await self.redis.exists(f"{first.id}:result", f"{first.id}:status", first.dedup_key))
+
+    async def test_offloaded_result_removed_for_the_last_waiter(self):
+        storage = MagicMock()
+        storage.upload_from_bytes.return_value = "etag"
+        storage.download_bytes.return_value = pack_result(TextToSpeechResponse(base64=b"RIFF"))
+        first, second = await self.submit(), await self.submit()
+        with patch("spt.jobs.get_results_storage", return_value=storage), \
+             patch("spt.jobs.JOBS_RESULT_MAX_INLINE_SIZE", 0):
+            await self.jobs.finish_job(first, JobStatuses.completed, storage.download_bytes.return_value)
+            await self.jobs.get_job_result(first)
+            storage.remove_object.assert_not_called()
+            self.assertEqual((await self.jobs.get_job_result(second)).base64, b"RIFF")
+            storage.remove_object.assert_called_once()
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestCancelJob(RedisTestCase):
+    async def test_queued_job_cancelled(self):
+        job = await self.create_job(idempotency_key=None)
+        await self.jobs.add_job(job)
+        response = await self.jobs.cancel_job(job.id)
+        self.assertEqual(response.status, JobStatuses.cancelled)
+        self.assertTrue(await self.jobs.is_cancelled(job))
+        # a status written by the running job afterwards does not undo it
+        await self.jobs.set_job_status(job, JobStatuses.in_progress)
+        self.assertEqual((await self.jobs.get_job_status(job)).status, JobStatuses.cancelled)
+
+    async def test_finished_job_not_cancelled(self):
+        job = await self.create_job(idempotency_key=None)
+        await self.jobs.add_job(job)
+        await self.jobs.finish_job(job, JobStatuses.completed, None)
+        self.assertEqual((await self.jobs.cancel_job(job.id)).status, JobStatuses.completed)
+        self.assertFalse(await self.jobs.is_cancelled(job))
+
+    async def test_unknown_job(self):
+        self.assertEqual((await self.jobs.cancel_job("unknown")).status, JobStatuses.unknown)
+
+    async def test_cancelled_job_received_releases_its_reservation(self):
+        dispatcher = MagicMock()
+        dispatcher.dispatch_job = AsyncMock()
+        message = make_message()
+        await self.redis.set("job:cancelled", 1)
+        with patch("spt.jobs.dispatcher", dispatcher):
+            await self.jobs.receive_job(message)
+        dispatcher.release_job.assert_called_once()
+        dispatcher.dispatch_job.assert_not_awaited()
+
+    async def test_failed_cancellation_check_releases_the_reservation(self):
+        dispatcher = MagicMock()
+        dispatcher.dispatch_job = AsyncMock()
+        self.jobs.is_cancelled = AsyncMock(side_effect=ConnectionError("redis down"))
+        with patch("spt.jobs.dispatcher", dispatcher), self.assertRaises(ConnectionError):
+            await self.jobs.receive_job(make_message())
+        dispatcher.release_job.assert_called_once()
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestAdmissionStatus(RedisTestCase):
+    async def test_refused_job_stays_queued(self):
+        dispatcher = MagicMock()
+        dispatcher.allow_run_job = AsyncMock(return_value=False)
+        self.jobs.set_job_status = AsyncMock()
+        with patch("spt.jobs.dispatcher", dispatcher):
+            self.assertFalse(await self.jobs.can_run_job(make_message()))
+        self.jobs.set_job_status.assert_not_awaited()
+
+    async def test_admitted_job_marked_in_progress_by_the_dispatch_only(self):
+        dispatcher = MagicMock()
+        dispatcher.allow_run_job = AsyncMock(return_value=True)
+        dispatcher.dispatch_job = AsyncMock()
+        self.jobs.set_job_status = AsyncMock()
+        message = make_message()
+        with patch("spt.jobs.dispatcher", dispatcher):
+            self.assertTrue(await self.jobs.can_run_job(message))
+            await self.jobs.receive_job(message)
+        self.jobs.set_job_status.assert_not_awaited()
+        dispatcher.dispatch_job.assert_awaited_once()
+
+
+class TestJobsListener(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_of_a_job_resolved(self):
+        listener = JobsListener()
+        first, second, other = listener.watch("job"), listener.watch("job"), listener.watch("other")
+        listener._resolve("job")
+        self.assertEqual((first.result(), second.result()), ("job", "job"))
+        self.assertFalse(other.done())
+        self.assertEqual(list(listener.waiters), ["other"])
+
+    async def test_unwatch(self):
+        listener = JobsListener()
+        waiter = listener.watch("job")
+        listener.unwatch("job", waiter)
+        self.assertEqual(listener.waiters, {})
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestJobCompletion(RedisTestCase):
+    async def test_finished_job_announced_to_its_waiters(self):
+        listener = JobsListener()
+        await listener.start()
+        self.addAsyncCleanup(listener.stop)
+        while not (await self.redis.pubsub_numsub(JOBS_DONE_CHANNEL))[0][1]:
+            await asyncio.sleep(0.01)
+        job = await self.create_job(idempotency_key=None)
+        waiter = listener.watch(job.id)
+        await self.jobs.finish_job(job, JobStatuses.completed, None)
+        self.assertEqual(await asyncio.wait_for(waiter, 1), job.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
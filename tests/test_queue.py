@@ -0,0 +1,219 @@
+import unittest
+import asyncio
+import msgpack
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+from spt.queue import AsyncQueueClient, AsyncQueueMessageSender, AsyncQueueMessageReceiver, QueuePublisherPool, QueueLane, PrioritySemaphore, Priority, Headers, retry_delays, retry_delay, retry_exchange_name
+
+
+def make_pool():
+    """
+    A publisher pool connected to a mocked broker, returning the exchange it publishes to.
+    """
+    pool = QueuePublisherPool()
+    pool.check_connection = AsyncMock()
+    exchange = MagicMock()
+    exchange.publish = AsyncMock()
+    channel = MagicMock()
+    channel.get_exchange = AsyncMock(return_value=exchange)
+
+    @asynccontextmanager
+    async def acquire():
+        yield channel
+
+    pool.channels = MagicMock()
+    pool.channels.acquire = acquire
+    return pool, exchange
+
+
+class TestAsyncQueueClient(unittest.IsolatedAsyncioTestCase):
+    async def test_connection_attempts_shared(self):
+        client = AsyncQueueClient()
+        connection = MagicMock()
+        connection.is_closed = False
+        connection.channel = AsyncMock()
+        with patch("aio_pika.connect_robust", AsyncMock(return_value=connection)) as connect:
+            await asyncio.gather(*[client.check_connection() for _ in range(3)])
+        connect.assert_awaited_once()
+        self.assertIs(client.connection, connection)
+
+    async def test_connection_retried_without_blocking(self):
+        client = AsyncQueueClient()
+        connection = MagicMock()
+        connection.channel = AsyncMock()
+        connect = AsyncMock(side_effect=[ConnectionError("refused"), connection])
+        with patch("aio_pika.connect_robust", connect), patch("spt.queue.asyncio.sleep", AsyncMock()) as sleep:
+            await client.check_connection()
+        self.assertEqual(connect.await_count, 2)
+        sleep.assert_awaited_once()
+
+    def test_message_encoding_round_trip(self):
+        body = {"payload": "{}", "attachments": [b"RIFF"]}
+        encoded = AsyncQueueMessageSender().encode_message(body)
+        self.assertEqual(AsyncQueueMessageReceiver().decode_message(encoded), body)
+        with self.assertRaises(NotImplementedError):
+            AsyncQueueMessageReceiver().decode_message("{}")
+
+
+class TestQueuePublisherPool(unittest.IsolatedAsyncioTestCase):
+    async def test_send_message_publishes_once(self):
+        pool, exchange = make_pool()
+        await pool.send_message("spt", "LLM_GENERATION.ollama_mistral", {"payload": "{}", "attachments": []},
+                                Priority.HIGH, None)
+        exchange.publish.assert_awaited_once()
+        message = exchange.publish.await_args.args[0]
+        self.assertEqual(exchange.publish.await_args.kwargs["routing_key"], "LLM_GENERATION.ollama_mistral")
+        self.assertEqual(message.priority, Priority.HIGH.value)
+        self.assertEqual(msgpack.unpackb(message.body), {"payload": "{}", "attachments": []})
+
+    async def test_send_message_headers(self):
+        pool, exchange = make_pool()
+        headers = Headers(job_id="1", job_type="LLM_GENERATION", job_worker_id="ollama_mistral",
+                          job_remote_class="spt.services.service.Service", job_remote_method="work",
+                          job_request_model_class="spt.models.llm.ChatRequest",
+                          job_response_model_class="spt.models.llm.ChatResponse",
+                          job_storage="local", job_keep_alive=15)
+        await pool.send_message("spt", "LLM_GENERATION.ollama_mistral", {}, Priority.NORMAL, headers)
+        message = exchange.publish.await_args.args[0]
+        self.assertEqual(message.headers["job_id"], "1")
+        self.assertEqual(message.headers["job_attempt"], 0)
+
+
+class TestQueueLane(unittest.TestCase):
+    def test_routing_key_and_queue_name(self):
+        lane = QueueLane(job_type="IMAGE_GENERATION", worker_id="realisticVision")
+        self.assertEqual(lane.routing_key, "IMAGE_GENERATION.realisticVision")
+        self.assertEqual(lane.queue_name, "smi-requests.IMAGE_GENERATION.realisticVision")
+        self.assertEqual(lane.routing_key, QueueLane.make_routing_key("IMAGE_GENERATION", "realisticVision"))
+
+
+class TestRetryBackoff(unittest.TestCase):
+    def test_delays_double_up_to_the_max(self):
+        self.assertEqual(retry_delays(), [5, 10, 20, 40, 80, 160, 300])
+
+    def test_delay_of_an_attempt(self):
+        self.assertEqual(retry_delay(0), 5)
+        self.assertEqual(retry_delay(3), 40)
+        # attempts beyond the last level wait the max delay
+        self.assertEqual(retry_delay(25), 300)
+
+    def test_exchange_name(self):
+        self.assertEqual(retry_exchange_name(retry_delay(1)), "spt.retry.10")
+
+
+class TestPrioritySemaphore(unittest.IsolatedAsyncioTestCase):
+    async def start(self, semaphore, order, name, priority):
+        async def run():
+            await semaphore.acquire(priority)
+            order.append(name)
+        task = asyncio.create_task(run())
+        # let the task queue up as a waiter
+        await asyncio.sleep(0)
+        return task
+
+    async def test_highest_priority_first_then_fifo(self):
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        order = []
+        tasks = [await self.start(semaphore, order, "low", Priority.LOW.value),
+                 await self.start(semaphore, order, "normal 1", Priority.NORMAL.value),
+                 await self.start(semaphore, order, "high", Priority.HIGH.value),
+                 await self.start(semaphore, order, "normal 2", Priority.NORMAL.value)]
+        for _ in tasks:
+            semaphore.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["high", "normal 1", "normal 2", "low"])
+
+    async def test_free_slots_are_taken_at_once(self):
+        semaphore = PrioritySemaphore(2)
+        await asyncio.wait_for(semaphore.acquire(), 1)
+        await asyncio.wait_for(semaphore.acquire(), 1)
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        semaphore.release()
+        await asyncio.wait_for(waiter, 1)
+
+    async def test_cancelled_waiter_gives_its_slot_back(self):
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        cancelled = asyncio.create_task(semaphore.acquire(Priority.HIGH.value))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(semaphore.acquire(Priority.LOW.value))
+        await asyncio.sleep(0)
+        # the slot is handed to the high priority waiter, cancelled before it runs
+        semaphore.release()
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.wait_for(waiting, 1)
+
+
+class TestConsumeConcurrency(unittest.IsolatedAsyncioTestCase):
+    async def consume(self, **kwargs):
+        """
+        Starts consuming a mocked queue, returning the consumer callback and the consuming task.
+        """
+        receiver = AsyncQueueMessageReceiver()
+        receiver.check_connection = AsyncMock()
+        queue = MagicMock()
+        queue.consume = AsyncMock(return_value="tag")
+        queue.cancel = AsyncMock()
+        receiver.channel = MagicMock()
+        receiver.channel.get_queue = AsyncMock(return_value=queue)
+        task = asyncio.create_task(receiver.consume_and_check_messages("smi-requests.test", auto_ack=False, **kwargs))
+        while not queue.consume.await_count:
+            await asyncio.sleep(0)
+        self.addAsyncCleanup(receiver.cancel_consumer)
+        return queue.consume.await_args.args[0], task
+
+    def message(self):
+        message = MagicMock()
+        message.priority = 0
+        message.ack = AsyncMock()
+        message.reject = AsyncMock()
+        return message
+
+    async def test_in_flight_messages_are_bounded(self):
+        running, peak = 0, 0
+        release = asyncio.Event()
+
+        async def process(message):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+
+        callback, _ = await self.consume(process_callback=process, concurrency=2)
+        messages = [self.message() for _ in range(5)]
+        handlers = [asyncio.create_task(callback(message)) for message in messages]
+        await asyncio.sleep(0.01)
+        self.assertEqual(running, 2)
+        release.set()
+        await asyncio.gather(*handlers)
+        self.assertEqual(peak, 2)
+        for message in messages:
+            message.ack.assert_awaited_once()
+
+    async def test_refused_message_handed_to_the_retry_path(self):
+        retry = AsyncMock()
+        process = AsyncMock()
+        callback, _ = await self.consume(process_callback=process, condition_callback=AsyncMock(return_value=False),
+                                         retry_callback=retry, concurrency=1)
+        message = self.message()
+        await callback(message)
+        retry.assert_awaited_once_with(message)
+        process.assert_not_awaited()
+        message.ack.assert_awaited_once()
+
+    async def test_failed_message_rejected_without_requeue(self):
+        callback, _ = await self.consume(process_callback=AsyncMock(side_effect=RuntimeError("boom")), concurrency=1)
+        message = self.message()
+        await callback(message)
+        message.reject.assert_awaited_once_with(requeue=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
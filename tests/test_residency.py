@@ -0,0 +1,141 @@
+import unittest
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from spt.services.devices import DeviceAllocator, FakeBackend
+from spt.services.residency import ResidencyManager, residency_infos
+
+
+def config(min_instances: int = 0, max_instances: int = 1):
+    return SimpleNamespace(min_instances=min_instances, max_instances=max_instances, memory_footprint_gb=None)
+
+
+class ResidencyTestCase(unittest.TestCase):
+    """
+    A residency manager on one 24GB GPU, its workers holding the memory they are loaded with.
+    """
+    def setUp(self):
+        self.used = 0.0
+        self.loads = 0
+        for target, value in [("gpu_available", lambda: False), ("memory_used_gb", lambda: self.used)]:
+            patcher = patch(f"spt.services.residency.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.residency = self.make_residency(budget_gb=10.0)
+
+    def make_residency(self, budget_gb: float, devices=((24.0, 24.0),)) -> ResidencyManager:
+        residency = ResidencyManager(budget_gb=budget_gb, devices=DeviceAllocator(backend=FakeBackend(list(devices))))
+        residency.worker_configs = {"a": config(), "b": config(), "c": config()}
+        return residency
+
+    def loader(self, footprint_gb: float):
+        def load():
+            self.used += footprint_gb
+            self.loads += 1
+            worker = MagicMock()
+            worker.cleanup.side_effect = lambda: setattr(self, "used", self.used - footprint_gb)
+            return worker
+        return load
+
+    def use(self, worker_id: str, footprint_gb: float = 4.0):
+        """Acquires and releases a worker, loading it when needed."""
+        worker = self.residency.acquire(worker_id, self.loader(footprint_gb))
+        self.residency.release(worker)
+        return worker
+
+    def resident(self):
+        return sorted(resident.worker_id for resident in self.residency.residents)
+
+
+class TestResidencyManager(ResidencyTestCase):
+    def test_instance_reused(self):
+        self.assertIs(self.use("a"), self.use("a"))
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.residency.used_gb, 4.0)
+
+    def test_busy_instance_waited_for_at_max_instances(self):
+        worker = self.residency.acquire("a", self.loader(4.0))
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(self.residency.acquire("a", self.loader(4.0))))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.residency.release(worker)
+        thread.join(1)
+        self.assertEqual(acquired, [worker])
+        self.assertEqual(self.loads, 1)
+
+    def test_more_instances_below_max_instances(self):
+        self.residency.worker_configs["a"] = config(max_instances=2)
+        first = self.residency.acquire("a", self.loader(4.0))
+        second = self.residency.acquire("a", self.loader(4.0))
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.residency.pool("a")), 2)
+
+    def test_least_recently_used_unloaded(self):
+        self.use("a")
+        self.use("b")
+        self.use("a")
+        self.use("c")
+        self.assertEqual(self.resident(), ["a", "c"])
+        self.assertEqual(self.residency.used_gb, 8.0)
+
+    def test_min_instances_kept(self):
+        self.residency.worker_configs["a"] = config(min_instances=1)
+        self.use("a")
+        self.use("b")
+        self.use("c")
+        self.assertEqual(self.resident(), ["a", "c"])
+
+    def test_busy_instances_kept(self):
+        worker = self.residency.acquire("a", self.loader(4.0))
+        self.use("b")
+        self.use("c")
+        self.assertEqual(self.resident(), ["a", "c"])
+        self.residency.release(worker)
+
+    def test_evictable(self):
+        self.residency.worker_configs["a"] = config(min_instances=1)
+        self.use("a")
+        worker = self.residency.acquire("b", self.loader(4.0))
+        self.assertEqual(self.residency.evictable(), [])
+        self.residency.release(worker)
+        self.assertEqual([resident.worker_id for resident in self.residency.evictable()], ["b"])
+
+    def test_fits(self):
+        self.use("a")
+        self.residency.footprints["b"] = 4.0
+        self.residency.footprints["c"] = 8.0
+        self.assertTrue(self.residency.fits("b"))
+        self.assertFalse(self.residency.fits("c"))
+
+
+class TestAvailableMemory(ResidencyTestCase):
+    def test_idle_instances_count_as_available(self):
+        self.residency = self.make_residency(budget_gb=30.0)
+        self.use("a")
+        self.assertEqual(self.residency.available_gb(), 24.0)
+        worker = self.residency.acquire("a", self.loader(4.0))
+        self.assertEqual(self.residency.available_gb(), 20.0)
+        self.residency.release(worker)
+
+    def test_capped_by_the_budget(self):
+        self.use("a")
+        worker = self.residency.acquire("b", self.loader(4.0))
+        self.assertEqual(self.residency.available_gb(), 6.0)
+        self.residency.release(worker)
+
+    def test_no_gpu(self):
+        self.residency = self.make_residency(budget_gb=10.0, devices=[])
+        self.assertIsNone(self.residency.available_gb())
+
+    def test_residency_infos(self):
+        self.use("a")
+        with patch("spt.services.residency._residency", self.residency):
+            infos = residency_infos()
+        self.assertEqual(infos.resident, ["a"])
+        self.assertEqual((infos.available_gb, infos.budget_gb, infos.used_gb), (10.0, 10.0, 4.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
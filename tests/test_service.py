@@ -1,55 +1,78 @@
 import unittest
-from unittest.mock import patch, MagicMock, AsyncMock
 import asyncio
-from spt.models.workers import WorkerStreamManageRequest, WorkerStreamManageResponse, WorkerStatus
-from spt.services.service import Service, GenericServiceServicer
+import logging
+from unittest.mock import patch, MagicMock, AsyncMock
+from spt.models.audio import TextToSpeechRequest
+from spt.models.workers import WorkerStreamManageRequest, WorkerStreamManageResponse
+from spt.services.executor import WorkerExecutor
+from spt.services.service import Service
 
 
-class TestService(unittest.TestCase):
+class TestService(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.servicer = GenericServiceServicer(type=MagicMock())
+        self.servicer = MagicMock()
+        self.servicer.executor = WorkerExecutor(threads=2)
+        self.addCleanup(self.servicer.executor.shutdown)
+        # the residency loads the worker on its first acquire
+        self.servicer.residency.acquire.side_effect = lambda worker_id, load: load()
         self.service = Service(self.servicer)
+        self.service.set_logger(logging.getLogger(__name__))
+        self.worker = MagicMock()
+        self.worker.work = AsyncMock(return_value="result")
+        patcher = patch.object(self.service, "create_worker", return_value=self.worker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
-    @patch('spt.services.service.Worker', new_callable=AsyncMock)
-    async def test_get_worker(self, MockWorker):
-        worker_instance = MockWorker.return_value
-        worker_instance.get_status.return_value = WorkerStatus.idle
-        worker = await self.service.get_worker('test_model')
-        self.assertEqual(worker, worker_instance)
-
-    @patch('spt.services.service.Worker', new_callable=AsyncMock)
-    async def test_work(self, MockWorker):
-        worker_instance = MockWorker.return_value
-        worker_instance.work = AsyncMock(return_value=MagicMock())
-        request = MagicMock(model='test_model')
-        result = await self.service.work(request)
-        worker_instance.work.assert_awaited_once_with(request)
-        worker_instance.stop.assert_called_once()
-        self.assertEqual(result, worker_instance.work.return_value)
-
-    def test_find_free_port(self):
-        port = self.service.find_free_port()
-        self.assertIsInstance(port, int)
-        self.assertGreater(port, 0)
-
-    @patch('asyncio.create_task', new_callable=MagicMock)
-    @patch('spt.services.service.Worker', new_callable=AsyncMock)
-    async def test_stream(self, MockWorker, mock_create_task):
-        worker_instance = MockWorker.return_value
-        worker_instance.start_stream = AsyncMock()
-        request = WorkerStreamManageRequest(model='test_model')
-        response = await self.service.stream(request)
-        worker_instance.start_stream.assert_awaited_once()
-        mock_create_task.assert_called_once()
-        self.assertIsInstance(response, WorkerStreamManageResponse)
+    def request(self) -> TextToSpeechRequest:
+        return TextToSpeechRequest(worker_id="piper", text="Bonjour.", speaker_id="default")
+
+    async def test_get_worker_from_the_residency(self):
+        worker = await self.service.get_worker("piper")
+        self.assertIs(worker, self.worker)
+        self.servicer.residency.acquire.assert_called_once()
+        self.worker.set_service.assert_called_once_with(self.service)
 
-    def run_async(self, coro):
-        asyncio.run(coro)
+    async def test_get_unknown_worker(self):
+        with self.assertRaises(ValueError):
+            await self.service.get_worker("unknown")
+        self.servicer.residency.acquire.assert_not_called()
 
-    def test_async_methods(self):
-        self.run_async(self.test_get_worker())
-        self.run_async(self.test_work())
-        self.run_async(self.test_stream())
+    async def test_work(self):
+        request = self.request()
+        self.assertEqual(await self.service.work(request), "result")
+        self.worker.work.assert_awaited_once_with(request)
+        self.servicer.warm_pool.record.assert_called_once_with("piper")
+        # the instance is given back to its pool
+        self.worker.stop.assert_called_once()
+        self.servicer.residency.release.assert_called_once_with(self.worker)
+
+    async def test_failed_work_releases_the_worker(self):
+        self.worker.work.side_effect = RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            await self.service.work(self.request())
+        self.servicer.residency.release.assert_called_once_with(self.worker)
+
+    async def test_warm_runs_the_warmup_request(self):
+        await self.service.warm("piper")
+        request = self.worker.work.await_args.args[0]
+        self.assertIsInstance(request, TextToSpeechRequest)
+        self.assertEqual((request.worker_id, request.text), ("piper", "Bonjour."))
+        self.servicer.residency.release.assert_called_once_with(self.worker)
+
+    @patch("spt.services.service.get_ip", return_value="127.0.0.1")
+    @patch("spt.services.service.find_free_port", return_value=5556)
+    async def test_stream(self, find_free_port, get_ip):
+        self.worker.start_stream = AsyncMock()
+        request = WorkerStreamManageRequest(worker_id="piper", action="start", intype="JSON", outtype="JSON",
+                                            timeout=30, ip_address="127.0.0.1", hostname="localhost", port=5555)
+        response = await self.service.stream(request)
+        self.assertIsInstance(response, WorkerStreamManageResponse)
+        self.assertEqual(response.port, 5556)
+        await self.worker.stream_task
+        await asyncio.sleep(0)
+        self.worker.start_stream.assert_awaited_once()
+        # the worker is released once its stream is over
+        self.servicer.residency.release.assert_called_once_with(self.worker)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,38 @@
+import unittest
+import asyncio
+from pydantic import BaseModel
+from spt.services.streaming import ResultStream, current_stream, emit_chunk
+
+
+class Chunk(BaseModel):
+    content: str
+
+
+def chunk(content: str) -> Chunk:
+    return Chunk(content=content)
+
+
+class TestResultStream(unittest.IsolatedAsyncioTestCase):
+    async def test_unary_request_does_not_stream(self):
+        self.assertFalse(emit_chunk(chunk("Hello")))
+
+    async def test_chunks_in_emission_order(self):
+        stream = ResultStream()
+        token = current_stream.set(stream)
+        try:
+            self.assertTrue(emit_chunk(chunk("Hello")))
+            # a blocking generator emits from its thread
+            await asyncio.to_thread(emit_chunk, chunk(" World"))
+        finally:
+            current_stream.reset(token)
+        stream.close()
+        self.assertEqual([chunk.content async for chunk in stream], ["Hello", " World"])
+
+    async def test_closed_stream_ends(self):
+        stream = ResultStream()
+        stream.close()
+        self.assertEqual([chunk async for chunk in stream], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
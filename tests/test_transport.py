@@ -0,0 +1,40 @@
+import unittest
+import io
+import grpc
+from unittest.mock import patch
+from spt.services.transport import attachment_size, should_upload, read_chunks, compression
+
+
+class TestTransport(unittest.TestCase):
+    def test_attachment_size_keeps_the_position(self):
+        file = io.BytesIO(b"0123456789")
+        file.seek(3)
+        self.assertEqual(attachment_size(file), 10)
+        self.assertEqual(file.tell(), 3)
+        self.assertEqual(attachment_size(b"0123"), 4)
+
+    def test_should_upload(self):
+        with patch("spt.services.transport.GRPC_UPLOAD_THRESHOLD", 8):
+            self.assertFalse(should_upload([b"0123", b"4567"]))
+            self.assertTrue(should_upload([b"0123", b"45678"]))
+            # files are always streamed
+            self.assertTrue(should_upload([io.BytesIO(b"0")]))
+            self.assertFalse(should_upload([]))
+
+    def test_read_chunks(self):
+        with patch("spt.services.transport.GRPC_UPLOAD_CHUNK_SIZE", 4):
+            self.assertEqual(list(read_chunks(b"0123456789")), [b"0123", b"4567", b"89"])
+            file = io.BytesIO(b"0123456789")
+            file.seek(5)
+            self.assertEqual(list(read_chunks(file)), [b"0123", b"4567", b"89"])
+            self.assertEqual(list(read_chunks(b"")), [])
+
+    def test_compression(self):
+        with patch("spt.services.transport.GRPC_COMPRESSION", "GZIP"):
+            self.assertEqual(compression(), grpc.Compression.Gzip)
+        with patch("spt.services.transport.GRPC_COMPRESSION", "zstd"), self.assertRaises(ValueError):
+            compression()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+from spt.services.warmup import WarmPool
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_pool(declared=(), top_n: int = 0) -> WarmPool:
+    servicer = MagicMock()
+    servicer.type = "IMAGE_GENERATION"
+    servicer.residency.is_resident.return_value = False
+    servicer.residency.fits.return_value = True
+    servicer.get_instance.return_value.warm = AsyncMock()
+    pool = WarmPool(servicer)
+    pool.declared = list(declared)
+    pool.top_n = top_n
+    return pool
+
+
+class TestWarmPool(unittest.IsolatedAsyncioTestCase):
+    async def test_unknown_workers_left_out(self):
+        pool = make_pool(["realisticVision", "unknown"])
+        self.assertEqual(await pool.warm_set(), ["realisticVision"])
+
+    async def test_declared_then_demanded(self):
+        pool = make_pool(["realisticVision"], top_n=2)
+        pool.demanded = AsyncMock(return_value=["disneyPixar", "realisticVision"])
+        self.assertEqual(await pool.warm_set(), ["realisticVision", "disneyPixar"])
+
+    async def test_refill_warms_what_is_missing_and_fits(self):
+        pool = make_pool(["realisticVision", "disneyPixar", "fluxDevCpp"])
+        residency = pool.servicer.residency
+        residency.is_resident.side_effect = lambda worker_id: worker_id == "realisticVision"
+        residency.fits.side_effect = lambda worker_id: worker_id != "fluxDevCpp"
+        await pool.refill()
+        service = pool.servicer.get_instance.return_value
+        service.warm.assert_awaited_once_with("disneyPixar")
+
+    async def test_failed_warmup_does_not_stop_the_refill(self):
+        pool = make_pool(["realisticVision", "disneyPixar"])
+        service = pool.servicer.get_instance.return_value
+        service.warm.side_effect = [RuntimeError("boom"), None]
+        await pool.refill()
+        self.assertEqual(service.warm.await_count, 2)
+
+    async def test_record_disabled_without_top_n(self):
+        pool = make_pool()
+        pool.record("realisticVision")
+        self.assertEqual(pool.tasks, set())
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestDemand(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis()
+        patcher = patch("spt.services.warmup.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_record_keeps_its_task_until_done(self):
+        pool = make_pool(top_n=1)
+        pool.record("realisticVision")
+        self.assertEqual(len(pool.tasks), 1)
+        await asyncio.gather(*pool.tasks)
+        self.assertEqual(pool.tasks, set())
+
+    async def test_most_requested_over_the_window(self):
+        pool = make_pool(top_n=2)
+        hour = int(time.time() // 3600)
+        await self.redis.zadd(pool.demand_key(hour), {"realisticVision": 1, "disneyPixar": 3})
+        await self.redis.zadd(pool.demand_key(hour - 1), {"realisticVision": 5, "fluxDevCpp": 2})
+        self.assertEqual(await pool.demanded(), ["realisticVision", "disneyPixar"])
+
+
+if __name__ == '__main__':
+    unittest.main()